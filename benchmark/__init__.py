@@ -0,0 +1,13 @@
+# benchmark of kicadpcb2dxf on synthetic boards:
+#
+#   python -m benchmark -s small medium -o results.json
+#   python -m benchmark --compare old.json results.json
+#   python -m benchmark --case classify tokenizer writer codecs
+#
+# boards: the .kicad_pcb generator, run: the runs, cases: micro benchmarks of
+# the classification, tokenizer, writer and codecs. The phase times come from
+# the stats option of convert(): the one phase timer is PhaseTimer in
+# kicadpcb2dxf.py, with the phases in kicadpcb2dxf.PHASES
+
+from .boards import SIZES, generate
+from .run import run, compare
@@ -0,0 +1,203 @@
+# synthetic .kicad_pcb boards: footprints with fp_* primitives, gr_*
+# primitives, gr_text, dimensions and the filler the converter skips (zones,
+# tracks, vias), in kicad 5 or kicad 6+ syntax; the same seed gives the
+# same board
+
+import io, math, random
+
+SIZES = {  # preset -> counts for generate()
+    'small': dict(footprints=200, fp_primitives=12, gr_primitives=2000, texts=100, dimensions=20,
+                  zones=4, zone_points=500, tracks=5000),
+    'medium': dict(footprints=2000, fp_primitives=16, gr_primitives=20000, texts=1000, dimensions=100,
+                   zones=20, zone_points=5000, tracks=50000),
+    'large': dict(footprints=10000, fp_primitives=20, gr_primitives=100000, texts=5000, dimensions=500,
+                  zones=50, zone_points=20000, tracks=250000),
+}
+
+FP_LAYERS = ('Fab', 'Fab', 'CrtYd', 'SilkS')  # F./B. prefix from the side; SilkS is not exported
+GR_LAYERS = ('Edge.Cuts', 'Edge.Cuts', 'Dwgs.User', 'Cmts.User', 'Eco1.User', 'Eco2.User', 'F.SilkS')
+WIDTH = 300.  # mm, board size
+HEIGHT = 200.
+
+
+def generate(dst, kicad=6, seed=0, footprints=0, fp_primitives=0, gr_primitives=0, texts=0, dimensions=0,
+             zones=0, zone_points=0, tracks=0):
+    # writes the board to dst (file name or text stream); returns the number
+    # of exported primitives by kind (what the dxf should hold)
+    if not hasattr(dst, 'write'):
+        with io.open(dst, 'w', encoding='utf-8', newline='\n') as stream:
+            return generate(stream, kicad, seed, footprints, fp_primitives, gr_primitives, texts, dimensions,
+                            zones, zone_points, tracks)
+    board = _Board(dst, kicad, random.Random(seed))
+    board.head()
+    for i in range(footprints):
+        board.footprint(i, fp_primitives)
+    for i in range(gr_primitives):
+        board.primitive('gr_', board.rnd.choice(GR_LAYERS), *board.point())
+    for i in range(texts):
+        board.text(i)
+    for i in range(dimensions):
+        board.dimension()
+    for i in range(tracks):
+        board.track(i)
+    for i in range(zones):
+        board.zone(zone_points)
+    dst.write(')\n')
+    return dict(board.exported)
+
+
+class _Board(object):
+    def __init__(self, stream, kicad, rnd):
+        self.write = stream.write
+        self.k6 = kicad >= 6
+        self.rnd = rnd
+        self.exported = {}
+        self.stamp = 0
+
+    def q(self, name):  # kicad 6 quotes names
+        return '"%s"' % name if self.k6 else name
+
+    def tstamp(self):
+        self.stamp += 1
+        return ' (tstamp %x)' % self.stamp if self.k6 else ''
+
+    def count(self, kind, layer):
+        if 'SilkS' not in layer:
+            self.exported[kind] = self.exported.get(kind, 0) + 1
+
+    def point(self, margin=10.):
+        return (round(self.rnd.uniform(margin, WIDTH - margin), 4),
+                round(self.rnd.uniform(margin, HEIGHT - margin), 4))
+
+    def head(self):
+        if self.k6:
+            self.write('(kicad_pcb (version 20211014) (generator pcbnew)\n')
+        else:
+            self.write('(kicad_pcb (version 20171130) (host pcbnew 5.1.9)\n')
+        self.write('  (general\n    (thickness 1.6)\n  )\n  (layers\n')
+        for number, name in ((0, 'F.Cu'), (31, 'B.Cu'), (44, 'Edge.Cuts')):
+            self.write('    (%d %s signal)\n' % (number, self.q(name)))
+        self.write('  )\n  (net 0 "")\n  (net 1 "GND")\n')
+
+    def footprint(self, i, primitives):
+        rnd = self.rnd
+        x, y = self.point()
+        side = 'B' if i % 4 == 3 else 'F'
+        rot = rnd.choice((0, 0, 90, 180, 270, 45))
+        at = '(at %s %s%s)' % (x, y, ' %s' % rot if rot else '')
+        if self.k6:
+            self.write('  (footprint "Synthetic:FP_%d" (layer "%s.Cu")\n    (tedit 5F68FEEE)%s\n    %s\n'
+                       % (i % 50, side, self.tstamp(), at))
+        else:
+            self.write('  (module Synthetic:FP_%d (layer %s.Cu) (tedit 5F68FEEE) (tstamp %x)\n    %s\n'
+                       % (i % 50, side, i, at))
+        self.write('    (fp_text reference "U%d" (at 0 -2%s) (layer %s)\n'
+                   '      (effects (font (size 1 1) (thickness 0.15)))\n    )\n'
+                   % (i + 1, ' %s' % rot if rot else '', self.q(side + '.SilkS')))
+        for j in range(primitives):
+            layer = '%s.%s' % (side, FP_LAYERS[j % len(FP_LAYERS)])
+            self.primitive('fp_', layer, round(rnd.uniform(-3, 3), 4), round(rnd.uniform(-3, 3), 4), 2.)
+        self.write('    (pad "1" smd rect (at -1 0%s) (size 1 1) (layers %s %s))\n'
+                   % (' %s' % rot if rot else '', self.q(side + '.Cu'), self.q(side + '.Mask')))
+        self.write('  )\n')
+
+    def primitive(self, prefix, layer, x, y, size=20.):
+        rnd = self.rnd
+        kind = rnd.random()
+        q_layer = self.q(layer)
+        indent = '    ' if prefix == 'fp_' else '  '  # gr_* are board level
+        width = 0.05 if 'Edge' in layer or 'CrtYd' in layer else 0.1
+        if kind < 0.6:
+            x2, y2 = round(x + rnd.uniform(-size, size), 4), round(y + rnd.uniform(-size, size), 4)
+            self.write('%s(%sline (start %s %s) (end %s %s) (layer %s) (width %s)%s)\n'
+                       % (indent, prefix, x, y, x2, y2, q_layer, width, self.tstamp()))
+            self.count('line', layer)
+        elif kind < 0.8:
+            r = round(rnd.uniform(0.1, size / 4), 4)
+            self.write('%s(%scircle (center %s %s) (end %s %s) (layer %s) (width %s)%s%s)\n'
+                       % (indent, prefix, x, y, round(x + r, 4), y, q_layer, width,
+                          ' (fill none)' if self.k6 else '', self.tstamp()))
+            self.count('circle', layer)
+        else:
+            r = rnd.uniform(0.1, size / 4)
+            a0 = rnd.uniform(0, 2 * math.pi)
+            angle = rnd.choice((90, -90, 180, 45, -135))
+            sx, sy = round(x + r * math.cos(a0), 4), round(y + r * math.sin(a0), 4)
+            if self.k6:  # (start) (mid) (end) on the arc
+                a1 = a0 + math.radians(angle) / 2
+                a2 = a0 + math.radians(angle)
+                self.write('%s(%sarc (start %s %s) (mid %s %s) (end %s %s) (layer %s) (width %s)%s)\n'
+                           % (indent, prefix, sx, sy, round(x + r * math.cos(a1), 4), round(y + r * math.sin(a1), 4),
+                              round(x + r * math.cos(a2), 4), round(y + r * math.sin(a2), 4), q_layer, width,
+                              self.tstamp()))
+            else:  # (start center) (end arc start) (angle)
+                self.write('%s(%sarc (start %s %s) (end %s %s) (angle %s) (layer %s) (width %s))\n'
+                           % (indent, prefix, x, y, sx, sy, angle, q_layer, width))
+            self.count('arc', layer)
+
+    def text(self, i):
+        x, y = self.point()
+        layer = self.rnd.choice(('Cmts.User', 'Dwgs.User', 'Eco1.User'))
+        value = 'REV_%d\\nline 2' % i if i % 5 == 0 else 'NOTE_%d' % i
+        self.write('  (gr_text "%s" (at %s %s%s) (layer %s)%s\n'
+                   '    (effects (font (size 1.5 1.5) (thickness 0.3)))\n  )\n'
+                   % (value, x, y, ' 90' if i % 3 == 0 else '', self.q(layer), self.tstamp()))
+        self.count('text', layer)
+
+    def dimension(self):
+        x, y = self.point(margin=40.)
+        length = round(self.rnd.uniform(5, 30), 4)
+        x2, ty = round(x + length, 4), round(y - 5, 4)
+        text = ('    (gr_text "%s mm" (at %s %s) (layer %s)%s\n'
+                '      (effects (font (size 1.5 1.5) (thickness 0.3)))\n    )\n'
+                % (length, round(x + length / 2, 4), round(ty - 0.65, 4), self.q('Dwgs.User'), self.tstamp()))
+        if self.k6:
+            self.write('  (dimension (type aligned) (layer "Dwgs.User")%s\n    (pts (xy %s %s) (xy %s %s))\n'
+                       '    (height -5)\n' % (self.tstamp(), x, y, x2, y))
+            self.write(text)
+            self.write('    (format (units 2) (units_format 1) (precision 4))\n'
+                       '    (style (thickness 0.3) (arrow_length 1.27) (text_position_mode 0)'
+                       ' (extension_height 0.58642) (extension_offset 0) keep_text_aligned)\n  )\n')
+        else:
+            self.write('  (dimension %s (width 0.3) (layer Dwgs.User)\n' % length)
+            self.write(text)
+            self.write('    (feature1 (pts (xy %s %s) (xy %s %s)))\n' % (x2, y, x2, ty - 0.7))
+            self.write('    (feature2 (pts (xy %s %s) (xy %s %s)))\n' % (x, y, x, ty - 0.7))
+            self.write('    (crossbar (pts (xy %s %s) (xy %s %s)))\n' % (x, ty, x2, ty))
+            for name, tip, dx in (('arrow1a', x2, -1.13), ('arrow1b', x2, -1.13),
+                                  ('arrow2a', x, 1.13), ('arrow2b', x, 1.13)):
+                dy = 0.59 if name.endswith('a') else -0.59
+                self.write('    (%s (pts (xy %s %s) (xy %s %s)))\n'
+                           % (name, tip, ty, round(tip + dx, 4), round(ty + dy, 4)))
+            self.write('  )\n')
+        self.count('dimension', 'Dwgs.User')
+
+    def track(self, i):
+        x, y = self.point()
+        x2, y2 = round(x + self.rnd.uniform(-5, 5), 4), round(y + self.rnd.uniform(-5, 5), 4)
+        layer = self.q('F.Cu' if i % 2 else 'B.Cu')
+        self.write('  (segment (start %s %s) (end %s %s) (width 0.25) (layer %s) (net 1)%s)\n'
+                   % (x, y, x2, y2, layer, self.tstamp()))
+        if i % 10 == 0:
+            self.write('  (via (at %s %s) (size 0.8) (drill 0.4) (layers %s %s) (net 1)%s)\n'
+                       % (x2, y2, self.q('F.Cu'), self.q('B.Cu'), self.tstamp()))
+
+    def zone(self, points):
+        cx, cy = self.point(margin=50.)
+        r = self.rnd.uniform(10, 40)
+        layer = self.q(self.rnd.choice(('F.Cu', 'B.Cu')))
+        self.write('  (zone (net 1) (net_name "GND") (layer %s)%s (hatch edge 0.508)\n'
+                   '    (connect_pads (clearance 0.508))\n    (min_thickness 0.254)\n'
+                   '    (fill yes (thermal_gap 0.508) (thermal_bridge_width 0.508))\n'
+                   % (layer, self.tstamp() or ' (tstamp 0)'))
+        for head, n, radius in (('polygon', 4, r), ('filled_polygon', points, r - 0.5)):
+            self.write('    (%s\n      (pts\n' % head)
+            for j in range(0, n, 8):
+                xys = []
+                for k in range(j, min(n, j + 8)):
+                    a = 2 * math.pi * k / n
+                    xys.append('(xy %s %s)' % (round(cx + radius * math.cos(a), 4),
+                                               round(cy + radius * math.sin(a), 4)))
+                self.write('        %s\n' % ' '.join(xys))
+            self.write('      )\n    )\n')
+        self.write('  )\n')
@@ -0,0 +1,176 @@
+# micro benchmarks behind the numbers of single changes, each a function
+# returning its rows (label, value, unit):
+#   classify   cost of the layer classification of one primitive, against
+#              the nine substring tests it replaced
+#   tokenizer  MB/s of the s-expression tokenizer and of the node events
+#   writer     MB/s of the writer output: to binary files and descriptors
+#              one write per entity (buffer_size 0, the path before the
+#              chunked buffer) against chunks, to a text file against bare
+#              stream.write() calls, and of a full writer run
+#   codecs     wall time and bytes on disk of the dxf of a board per codec
+
+import io, os, sys, tempfile, time, timeit
+from collections import OrderedDict
+
+from . import boards
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # the folder of kicadpcb2dxf.py
+REPEAT = 3  # runs per row, the fastest is kept
+LAYER_NAMES = ('Edge.Cuts', 'F.Fab', 'B.CrtYd', 'Dwgs.User', 'User.Comments', 'F.SilkS', 'F.Cu', 'Eco2.User')
+LINE_ENTITY = "0\nLINE\n8\nEdge\n62\n2\n10\n12.345678\n20\n-23.456789\n11\n34.567891\n21\n-45.678912\n"
+CODECS = ((None, None), ('gzip', 1), ('gzip', 6), ('gzip', 9), ('xz', 0), ('xz', 6), ('zstd', 3))
+
+
+def _module():
+    sys.path.insert(0, ROOT)
+    import kicadpcb2dxf
+    return kicadpcb2dxf
+
+
+def substring_layer(name):
+    # the classification before the exact layer map: nine substring tests
+    cls = None
+    if "Dwgs" in name:
+        cls = (0, None)
+    if "Cmts" in name:
+        cls = ("Cmts", 1)
+    if "Edge" in name:
+        cls = ("Edge", 2)
+    if "Eco1" in name:
+        cls = ("Eco1", 3)
+    if "Eco2" in name:
+        cls = ("Eco2", 4)
+    if "F.Fab" in name:
+        cls = ("FFab", 5)
+    if "B.Fab" in name:
+        cls = ("BFab", 6)
+    if "F.CrtYd" in name:
+        cls = ("FCrtYd", 7)
+    if "B.CrtYd" in name:
+        cls = ("BCrtYd", 8)
+    return cls
+
+
+def _best(function, repeat=REPEAT):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def _board_bytes(size):
+    out = io.StringIO()
+    boards.generate(out, 6, 0, **boards.SIZES[size])
+    return out.getvalue().encode('utf-8')
+
+
+def classify(number=200000, repeat=REPEAT):
+    kicadpcb2dxf = _module()
+    converter = kicadpcb2dxf.PcbDxfConverter(io.StringIO())
+    lines = ['  (gr_line (start 1 2) (end 3 4) (layer "%s") (width 0.1) (tstamp 5e2f))' % name
+             for name in LAYER_NAMES]
+    cases = (
+        ('nine substring tests on the source line', substring_layer, lines),
+        ('nine substring tests on the layer name', substring_layer, LAYER_NAMES),
+        ('classify_layer() exact map', kicadpcb2dxf.classify_layer, LAYER_NAMES),
+        ('converter.classify() dict lookup', converter.classify, LAYER_NAMES),
+    )
+    rows = []
+    for label, function, items in cases:
+        seconds = min(timeit.repeat(lambda: [function(item) for item in items], number=number // len(items),
+                                    repeat=repeat))
+        rows.append((label, seconds / (number // len(items) * len(items)) * 1e9, 'ns/primitive'))
+    return rows
+
+
+def tokenizer(size='small', repeat=REPEAT):
+    kicadpcb2dxf = _module()
+    data = _board_bytes(size)
+    mb = len(data) / float(1 << 20)
+
+    def tokens():
+        for chunk in kicadpcb2dxf.iter_token_chunks(io.BytesIO(data)):
+            pass
+
+    def events():
+        for event in kicadpcb2dxf.iter_events(io.BytesIO(data)):
+            pass
+    return [('board', mb, 'MB'),
+            ('iter_token_chunks()', mb / _best(tokens, repeat), 'MB/s'),
+            ('iter_events()', mb / _best(events, repeat), 'MB/s')]
+
+
+def writer(entities=1000000, repeat=REPEAT, folder=None):
+    kicadpcb2dxf = _module()
+    mb = entities * len(LINE_ENTITY) / float(1 << 20)
+    rows = []
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        path = os.path.join(tmp, 'out.dxf')
+
+        def write(opener, buffer_size):
+            def run():
+                stream = opener()
+                try:
+                    w = kicadpcb2dxf.R12FastStreamWriter(stream, buffer_size=buffer_size)
+                    write = w.write
+                    for i in range(entities):
+                        write(LINE_ENTITY)
+                    w.close()
+                finally:
+                    os.close(stream) if isinstance(stream, int) else stream.close()
+            return mb / _best(run, repeat)
+        for label, opener in (('unbuffered file', lambda: open(path, 'wb', buffering=0)),
+                              ('raw file descriptor', lambda: os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC))):
+            rows.append((label + ', one write per entity', write(opener, 0), 'MB/s'))
+            rows.append((label + ', chunked', write(opener, kicadpcb2dxf.WRITE_BUFFER_SIZE), 'MB/s'))
+
+        def bare():
+            with open(path, 'w') as stream:
+                write = stream.write
+                for i in range(entities):
+                    write(LINE_ENTITY)
+        rows.append(('buffered text file, stream.write()', mb / _best(bare, repeat), 'MB/s'))
+        rows.append(('buffered text file, writer', write(lambda: open(path, 'w'), kicadpcb2dxf.WRITE_BUFFER_SIZE),
+                     'MB/s'))
+
+        def full():
+            with kicadpcb2dxf.r12writer(path) as dxf:
+                for i in range(entities * 2 // 5):
+                    dxf.add_line((i * 0.001, 1.5), (2.5, i * 0.002), 'Edge', 2)
+                for i in range(entities // 10):
+                    dxf.add_arc((i * 0.001, 1.5), 2.25, 10., 100. + i % 90, 'Edge', 2)
+        seconds = _best(full, repeat)
+        rows.append(('full writer run (%d LINE, %d ARC)' % (entities * 2 // 5, entities // 10),
+                     os.path.getsize(path) / float(1 << 20) / seconds, 'MB/s'))
+    return rows
+
+
+def codecs(size='medium', repeat=1, folder=None):
+    kicadpcb2dxf = _module()
+    rows = []
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        board = os.path.join(tmp, 'board.kicad_pcb')
+        boards.generate(board, 6, 0, **boards.SIZES[size])
+        for codec, level in CODECS:
+            if codec == 'zstd':
+                try:
+                    import zstandard
+                except ImportError:  # optional
+                    continue
+            dst = os.path.join(tmp, 'board.dxf' + kicadpcb2dxf.COMPRESSIONS.get(codec, ''))
+            options = {'compress': codec, 'compress_level': level}
+            seconds = _best(lambda: kicadpcb2dxf.convert(board, dst, options=options), repeat)
+            label = '%s %s' % (codec or 'none', '-' if level is None else level)
+            rows.append((label + ' wall', seconds, 's'))
+            rows.append((label + ' bytes on disk', os.path.getsize(dst), 'B'))
+    return rows
+
+
+CASES = OrderedDict((('classify', classify), ('tokenizer', tokenizer), ('writer', writer), ('codecs', codecs)))
+
+
+def format_rows(name, rows):
+    return ['%s:' % name] + [('  %-48s %14d %s' if isinstance(row[1], int) else '  %-48s %14.1f %s') % tuple(row)
+                             for row in rows]
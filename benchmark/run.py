@@ -0,0 +1,184 @@
+# benchmark runs: each case (size preset x kicad syntax) is generated once
+# and converted in a child process of its own, so the peak RSS is the one of
+# that conversion; the results are saved as JSON for compare()
+
+import argparse, io, json, os, platform, subprocess, sys, tempfile, time
+
+from . import boards, cases
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)  # the folder of kicadpcb2dxf.py
+REPEAT = 3  # plain runs per case, the fastest is kept
+
+
+def measure(board, dst, options=None, repeat=REPEAT):
+    # converts board repeat times, plus once with the stats option for the
+    # phases (slower: its time is not used), in this process
+    sys.path.insert(0, ROOT)
+    import kicadpcb2dxf
+    options = dict(options or {})
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        stats = kicadpcb2dxf.convert(board, dst, options=options)
+        times.append(time.perf_counter() - t0)
+    options['stats'] = True
+    instrumented = kicadpcb2dxf.convert(board, dst, options=options)
+    seconds = min(times)
+    size = os.path.getsize(board)
+    return {
+        'seconds': seconds,
+        'runs': times,
+        'entities': stats.total,
+        'by_type': dict(stats.entities),
+        'footprints': stats.footprints,
+        'bytes_in': size,
+        'bytes_out': os.path.getsize(dst) if os.path.isfile(dst) else None,
+        'entities_per_s': stats.total / seconds if seconds else None,
+        'mb_per_s': size / float(1 << 20) / seconds if seconds else None,
+        'phases': instrumented.phases,
+        'instrumented_seconds': instrumented.elapsed,
+        'by_layer': dict(('%s %s' % key, n) for key, n in instrumented.layers.items()),
+        'skipped': dict(instrumented.skipped),
+        'peak_rss': kicadpcb2dxf.peak_memory(),
+    }
+
+
+def run_case(size, kicad, folder, options=None, repeat=REPEAT, seed=0):
+    counts = boards.SIZES[size]
+    board = os.path.join(folder, 'synthetic_%s_k%d.kicad_pcb' % (size, kicad))
+    t0 = time.perf_counter()
+    expected = boards.generate(board, kicad, seed, **counts)
+    generated = time.perf_counter() - t0
+    child = [sys.executable, '-m', 'benchmark', '--measure', board, os.path.join(folder, 'out.dxf'),
+             json.dumps(options or {}), str(repeat)]
+    out = subprocess.check_output(child, cwd=ROOT)
+    result = json.loads(out.decode('utf-8'))
+    result.update({'size': size, 'kicad': kicad, 'counts': counts, 'expected': expected,
+                   'generate_seconds': generated})
+    os.remove(board)
+    return result
+
+
+def _version():
+    sys.path.insert(0, ROOT)
+    import kicadpcb2dxf
+    try:
+        commit = subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                                         stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return kicadpcb2dxf.___version___, commit
+
+
+def _environment():
+    version, commit = _version()
+    return {'version': version, 'commit': commit, 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run(sizes=('small',), kicads=(5, 6), options=None, repeat=REPEAT, folder=None, log=None):
+    log = log or (lambda line: None)
+    results = _environment()
+    results.update({'options': options or {}, 'cases': []})
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        for size in sizes:
+            for kicad in kicads:
+                case = run_case(size, kicad, tmp, options, repeat)
+                results['cases'].append(case)
+                log(format_case(case))
+    return results
+
+
+def run_micro(names, repeat=REPEAT, log=None):
+    # the micro benchmarks of cases.py, in this process
+    log = log or (lambda line: None)
+    results = _environment()
+    results['micro'] = {}
+    for name in names:
+        rows = cases.CASES[name](repeat=repeat)
+        results['micro'][name] = rows
+        for line in cases.format_rows(name, rows):
+            log(line)
+    return results
+
+
+def format_case(case):
+    # the phases are the ones of kicadpcb2dxf.PHASES, timed by its stats option
+    sys.path.insert(0, ROOT)
+    import kicadpcb2dxf
+    phases = ' '.join('%s %.2f' % (phase, case['phases'][phase]) for phase in kicadpcb2dxf.PHASES
+                      if phase in case['phases'])
+    rss = '%.0f MB' % (case['peak_rss'] / float(1 << 20)) if case['peak_rss'] else '-'
+    return ('%-6s k%d  %7.3fs  %9d entities  %10.0f entities/s  %6.2f MB/s  peak %s  | %s' % (
+        case['size'], case['kicad'], case['seconds'], case['entities'], case['entities_per_s'],
+        case['mb_per_s'], rss, phases))
+
+
+def compare(old, new):
+    # lines of new against old (results or JSON file names), by case
+    if not isinstance(old, dict):
+        with io.open(old) as f:
+            old = json.load(f)
+    if not isinstance(new, dict):
+        with io.open(new) as f:
+            new = json.load(f)
+    before = dict(((c['size'], c['kicad']), c) for c in old['cases'])
+    lines = ['%s (%s) -> %s (%s)' % (old['version'], old['commit'], new['version'], new['commit'])]
+    for case in new['cases']:
+        was = before.get((case['size'], case['kicad']))
+        if was is None:
+            continue
+        lines.append('%-6s k%d  %7.3fs -> %7.3fs  x%.2f  entities/s %10.0f -> %10.0f' % (
+            case['size'], case['kicad'], was['seconds'], case['seconds'], was['seconds'] / case['seconds'],
+            was['entities_per_s'], case['entities_per_s']))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='kicadpcb2dxf benchmark on synthetic boards')
+    parser.add_argument('-s', '--size', nargs='+', default=['small'], choices=sorted(boards.SIZES),
+                        help='board size presets (default: small)')
+    parser.add_argument('-k', '--kicad', nargs='+', type=int, default=[5, 6], choices=[5, 6],
+                        help='board syntax (default: 5 6)')
+    parser.add_argument('-n', '--repeat', type=int, default=REPEAT, help='runs per case (default: %d)' % REPEAT)
+    parser.add_argument('-o', '--output', help='JSON file of the results')
+    parser.add_argument('--option', action='append', default=[], metavar='NAME=VALUE',
+                        help='convert() option, VALUE as JSON (mmap=true, binary=true...)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two JSON results')
+    parser.add_argument('--case', nargs='+', choices=list(cases.CASES),
+                        help='only run these micro benchmarks (%s)' % ' '.join(cases.CASES))
+    parser.add_argument('--generate', metavar='BOARD', help='only write a synthetic board of --size and --kicad')
+    parser.add_argument('--measure', nargs=4, help=argparse.SUPPRESS)  # child process of run_case()
+    args = parser.parse_args(argv)
+    if args.measure:
+        board, dst, options, repeat = args.measure
+        print(json.dumps(measure(board, dst, json.loads(options), int(repeat))))
+        return 0
+    if args.compare:
+        for line in compare(*args.compare):
+            print(line)
+        return 0
+    if args.generate:
+        print(boards.generate(args.generate, args.kicad[0], **boards.SIZES[args.size[0]]))
+        return 0
+    options = {}
+    for option in args.option:
+        name, _, value = option.partition('=')
+        try:
+            options[name] = json.loads(value)
+        except ValueError:
+            options[name] = value
+    if args.case:
+        results = run_micro(args.case, args.repeat, log=print)
+    else:
+        results = run(args.size, args.kicad, options, args.repeat, log=print)
+    if args.output:
+        with io.open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print('--> %s written' % args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
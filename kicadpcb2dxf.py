@@ -12,11 +12,9 @@
 ## done:
 # gr_line, gr_circle, gr_arc
 # add footprint support fp_line, fp_circle, fp_arc
-# add text support (mirror & alignement not supported)
+# add text support (alignement; mirror with --stroke-text)
 # add multiline text support
-
-## todo:
-# add quote support
+# add quote support (dimensions)
 
 # Purpose: fast & simple but restricted DXF R12 writer, with no in-memory drawing, and without dependencies to other
 # ezdxf modules. The created DXF file contains no HEADER, TABLES or BLOCKS section only the ENTITIES section is present.
@@ -31,11 +29,147 @@ script_name="kicadpcb2dxf"
 __author_script__="easyw Maurice"
 ___version___=3.7
 
+import re, os, sys, io, time, glob, codecs, mmap, hashlib, pickle, struct, tempfile, threading
+import argparse
+from array import array
 from contextlib import contextmanager
+from functools import partial
+from math import sqrt, atan2, degrees, hypot, cos, sin, tan, radians, floor, ceil, acos, asin, pi
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from itertools import chain, repeat
+from operator import sub, itemgetter
+try:
+    import numpy
+except ImportError:  # bulk methods format with pure python
+    numpy = None
 
 def rnd(x):  # adjust output precision of floats by changing 'ndigits'
     return round(x, ndigits=6)
 
+
+def _number_function(precision, low, high, fixed_point):
+    # a closure: no attribute lookups for the values written most
+    fmt = '%%.%df' % precision
+    scale = 10 ** precision
+    if fixed_point:
+        def number(x):
+            if type(x) is not float or not -high < x < high:
+                return str(round(x, precision))
+            n = int(round(x * scale))
+            sign = ''
+            if n < 0:
+                sign = '-'
+                n = -n
+            whole, frac = divmod(n, scale)
+            if not frac:
+                return '%s%d.0' % (sign, whole)
+            return '%s%d.%s' % (sign, whole, ('%0*d' % (precision, frac)).rstrip('0'))
+    elif precision:
+        def number(x):
+            if type(x) is float and (low <= x < high or -high < x <= -low or x == 0.):
+                s = (fmt % x).rstrip('0')
+                if s[-1] == '.':
+                    return s + '0'
+                return s
+            return str(round(x, precision))
+    else:
+        def number(x):
+            if type(x) is float and -high < x < high:
+                return (fmt % x) + '.0'
+            return str(round(x, precision))
+    return number
+
+
+def _fraction_tables(precision):
+    # the fraction digits of a number split in a high and a low (at most 3)
+    # part: '.' + high digits, low digits without trailing zeros, and '.' +
+    # high digits without trailing zeros for a zero low part
+    low = min(precision, 3)
+    high = precision - low
+    high_digits = ['%0*d' % (high, i) for i in range(10 ** high)] if high else ['']
+    return (numpy.array(['.' + d for d in high_digits], dtype=object), 10 ** low,
+            numpy.array([('%0*d' % (low, i)).rstrip('0') for i in range(10 ** low)], dtype=object),
+            numpy.array(['.' + (d.rstrip('0') or '0') for d in high_digits], dtype=object))
+
+
+class NumberFormat(object):
+    # float -> dxf text, the same text as str(round(x, precision)) but most
+    # values take a single '%.Nf' format instead of round() and repr();
+    # fixed_point=True rounds to integer units of 10**-precision (nanometres
+    # by default) and formats the integer: exact decimal rounding, which may
+    # differ from round() on the last digit of half way values
+    def __init__(self, precision=6, fixed_point=False):
+        if not 0 <= precision <= 15:
+            raise ValueError("precision has to be an integer in the range from 0 to 15.")
+        self.precision = precision
+        self.fixed_point = fixed_point
+        self._scale = 10 ** precision
+        # fixed notation of repr() and at most 15 significant digits
+        self._high = 10. ** (15 - precision)
+        self.number = _number_function(precision, 1e-4, self._high, fixed_point)
+        self._tables = None
+        if numpy is not None and 0 < precision <= 6 and not fixed_point:
+            self._tables = _fraction_tables(precision)
+
+    def units(self, n):
+        # integer count of 10**-precision units (nanometres) -> dxf text
+        sign = ''
+        if n < 0:
+            sign = '-'
+            n = -n
+        whole, frac = divmod(n, self._scale)
+        if not frac:
+            return '%s%d.0' % (sign, whole)
+        return '%s%d.%s' % (sign, whole, ('%0*d' % (self.precision, frac)).rstrip('0'))
+
+    def numbers(self, values):
+        return list(map(self.number, values))
+
+    def table(self, rows):
+        # rows of numbers, a (n, k) float array or equal length sequences ->
+        # (placeholder, args) with (placeholder * n * k) % tuple(args) the
+        # text of all numbers; numpy float arrays are formatted vectorized
+        if self._tables is not None and isinstance(rows, numpy.ndarray) and rows.dtype == numpy.float64:
+            return '%s%s%s', self._vector_args(rows)
+        return '%s', self.numbers([float(x) for x in chain.from_iterable(rows)])
+
+    def _vector_args(self, a):
+        # every number as (sign, whole, '.' + fraction) built from the integer
+        # units rounded by numpy and tables of fraction digits; values where
+        # that can differ from number() go through number()
+        dot_high, low_scale, low_digits, dot_high_end = self._tables
+        mag = numpy.abs(a)
+        scaled = mag * self._scale
+        with numpy.errstate(invalid='ignore', over='ignore'):  # nan, inf
+            near_tie = numpy.abs(scaled - numpy.floor(scaled) - 0.5) <= numpy.spacing(scaled)
+        exact = (((mag >= 1e-4) & (mag < self._high)) | (a == 0)) & ~near_tie
+        units = numpy.where(exact, numpy.rint(scaled), 0.).astype(numpy.int64)
+        whole, frac = numpy.divmod(units, self._scale)
+        hi, lo = numpy.divmod(frac, low_scale)
+        args = numpy.empty(a.shape + (3,), dtype=object)
+        args[..., 0] = numpy.where(numpy.signbit(a), '-', '')
+        args[..., 1] = whole
+        args[..., 2] = numpy.where(lo == 0, dot_high_end[hi], dot_high[hi] + low_digits[lo])
+        for index in zip(*numpy.nonzero(~exact)):
+            args[index] = (self.number(float(a[index])), '', '')
+        return args.reshape(-1).tolist()
+
+    def vertex(self, vertex, code=10):
+        number = self.number
+        if len(vertex) == 2:
+            return "%d\n%s\n%d\n%s\n" % (code, number(vertex[0]), code + 10, number(vertex[1]))
+        return "".join("%d\n%s\n" % (code + 10 * i, number(c)) for i, c in enumerate(vertex))
+
+    def segment(self, start, end):
+        # group codes 10/20[/30] and 11/21[/31] of a line in one format
+        if len(start) == 2 and len(end) == 2:
+            number = self.number
+            return "10\n%s\n20\n%s\n11\n%s\n21\n%s\n" % (
+                number(start[0]), number(start[1]), number(end[0]), number(end[1]))
+        return self.vertex(start, 10) + self.vertex(end, 11)
+
+
 TEXT_ALIGN_FLAGS = {
     'LEFT': (0, 0),
     'CENTER': (1, 0),
@@ -52,57 +186,390 @@ TEXT_ALIGN_FLAGS = {
 }
 
 
+WRITE_BUFFER_SIZE = 1 << 18  # characters collected before a write
+DXF_ENCODING = 'utf-8'  # of bytes written to binary streams and descriptors
+BULK_ROWS = 1 << 14  # entities formatted at once by the bulk methods
+SPOOL_SIZE = 1 << 24  # bytes of spooled entities kept in memory with blocks
+
+
 @contextmanager
-def r12writer(stream, fixed_tables=False):
-    if hasattr(stream, 'write'):
-        writer = R12FastStreamWriter(stream, fixed_tables)
+def r12writer(stream, fixed_tables=False, buffer_size=WRITE_BUFFER_SIZE, raw=False, number_format=None,
+              binary=False, blocks=False, compress=None, level=None):
+    # stream: text or binary file object, file name or file descriptor (int);
+    # raw=True writes file names as bytes without a text layer;
+    # binary=True writes a binary DXF (number_format is not used);
+    # blocks=True allows begin_block()/end_block() and add_insert();
+    # compress: 'gzip', 'xz' or 'zstd' at level, compressed as it is written
+    # (by a second thread for file names), from the extension of file names
+    # (.dxf.gz, .dxf.xz, .dxf.zst) when None; a file name is removed again
+    # when the conversion fails
+    writer_class = R12BinaryStreamWriter if binary else R12FastStreamWriter
+    if hasattr(stream, 'write') or isinstance(stream, int):
+        if compress:
+            stream = _CompressedStream(stream, compress, level)
+        writer = writer_class(stream, fixed_tables, buffer_size, number_format, blocks)
         yield writer
         writer.close()
-    else:
-        with open(stream, 'wt') as stream:
-            writer = R12FastStreamWriter(stream, fixed_tables)
-            yield writer
-            writer.close()
+        if compress:
+            stream.close()
+        return
+    path = stream
+    try:
+        if compress or compression_of(path):
+            pool = ThreadPoolExecutor(1)
+            try:
+                stream = _QueuedFile(path, pool, binary, compress or compression_of(path), level)
+                try:
+                    writer = writer_class(stream, fixed_tables, buffer_size, number_format, blocks)
+                    yield writer
+                    writer.close()
+                finally:
+                    stream.close()
+            finally:
+                pool.shutdown()
+        else:
+            raw = raw or binary
+            with open(path, 'wb' if raw else 'wt', buffering=0 if raw else -1) as stream:
+                writer = writer_class(stream.fileno() if raw else stream, fixed_tables, buffer_size,
+                                      number_format, blocks)
+                yield writer
+                writer.close()
+    except BaseException:
+        _remove_files([path])
+        raise
+
+
+def _remove_files(paths):
+    # the partial output of a failed conversion
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _is_binary(stream):
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    return 'b' in getattr(stream, 'mode', '')
+
+
+def _fd_writer(fd, encoding=DXF_ENCODING):
+    def write(data):
+        if encoding is not None:
+            data = data.encode(encoding)
+        data = memoryview(data)
+        while data:
+            data = data[os.write(fd, data):]
+    return write
+
+
+COMPRESSIONS = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}  # codec -> file extension
+QUEUE_CHUNKS = 16  # chunks waiting for a queued file before the writer waits
+
+
+def compression_of(path):
+    # codec of a file name from its extension (board.dxf.gz -> gzip), or None
+    path = os.fspath(path) if hasattr(path, '__fspath__') else path
+    if isinstance(path, bytes):
+        path = path.decode(DXF_ENCODING, 'replace')
+    for codec, extension in COMPRESSIONS.items():
+        if path.lower().endswith(extension):
+            return codec
+    return None
+
+
+def compressor(codec, level=None):
+    # object with compress(data) and flush() for codec; level None is the
+    # codec default (gzip 6, xz 6, zstd 3)
+    if codec == 'gzip':
+        import zlib
+        return zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if codec == 'xz':
+        import lzma
+        return lzma.LZMACompressor(preset=6 if level is None else level)
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd output needs the zstandard module.")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+    raise ValueError("unknown compression: %s (%s)" % (codec, ", ".join(sorted(COMPRESSIONS))))
+
+
+class _QueuedFile(object):
+    # file descriptor whose writes are handed to a thread pool, one task at
+    # a time per file so the chunks keep their order; the pool threads
+    # encode and compress (codec) the chunks, zlib and lzma without the GIL
+    def __init__(self, path, pool, binary=False, codec=None, level=None):
+        self.compressor = compressor(codec, level) if codec else None
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        self.mode = 'wb' if binary else 'w'
+        self._pool = pool
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self._task = None
+        self._error = None
+
+    def write(self, data):
+        with self._ready:
+            while self._task is not None and len(self._queue) >= QUEUE_CHUNKS:
+                self._ready.wait()
+            if self._error is not None:
+                raise self._error
+            self._queue.append(data)
+            if self._task is None:
+                self._task = self._pool.submit(self._drain)
+
+    def _drain(self):
+        try:
+            while True:
+                with self._ready:
+                    if not self._queue:
+                        self._task = None
+                        self._ready.notify_all()
+                        return
+                    data = self._queue.popleft()
+                    self._ready.notify_all()
+                self._write(data)
+        except BaseException as e:
+            with self._ready:
+                self._error = e
+                self._queue.clear()
+                self._task = None
+                self._ready.notify_all()
+
+    def _write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode(DXF_ENCODING)
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        data = memoryview(data)
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        try:
+            with self._ready:
+                while self._task is not None:
+                    self._ready.wait()
+                if self._error is not None:
+                    raise self._error
+            if self.compressor is not None:
+                self.compressor, compressor = None, self.compressor
+                self._write(compressor.flush())
+        finally:
+            os.close(self.fd)
+
+
+class _CompressedStream(object):
+    # binary file-like compressing into a stream or descriptor (int)
+    mode = 'wb'
+
+    def __init__(self, stream, codec, level=None):
+        self.compressor = compressor(codec, level)
+        if isinstance(stream, int):
+            self._write = _fd_writer(stream, None)
+        elif _is_binary(stream):
+            self._write = stream.write
+        elif hasattr(stream, 'buffer'):  # sys.stdout
+            stream.flush()
+            self._write = stream.buffer.write
+        else:
+            raise TypeError("compressed DXF needs a binary stream.")
+        self.stream = stream
+
+    def write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode(DXF_ENCODING)
+        data = self.compressor.compress(data)
+        if data:
+            self._write(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self._write(self.compressor.flush())
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
 
 
 class R12FastStreamWriter(object):
-    def __init__(self, stream, fixed_tables=False):
+    # entities are collected as text and written in chunks of about
+    # buffer_size characters (0 writes every entity at once); text streams
+    # buffer already and get every entity directly; with
+    # blocks=True the ENTITIES section is spooled to a temporary file, block
+    # definitions are kept and close() writes BLOCKS before ENTITIES
+    EMPTY = ''
+    ENTITIES = "0\nSECTION\n2\nENTITIES\n"
+    BLOCKS = "0\nSECTION\n2\nBLOCKS\n"
+    ENDSEC = "0\nENDSEC\n"
+    EOF = "0\nEOF\n"
+    SPOOL_MODE = 'w+'
+    bulk_lines = True  # add_lines() takes the line runs of PcbDxfConverter.flush
+
+    def __init__(self, stream, fixed_tables=False, buffer_size=WRITE_BUFFER_SIZE, number_format=None,
+                 blocks=False):
         self.stream = stream
+        self.fmt = number_format or NumberFormat()  # precision of the coordinates
+        self._write = self._write_function(stream)
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self.counts = Counter()  # entities written by dxf type
+        self.blocks = None  # block name -> definition, with blocks=True
+        self._redirects = []  # write functions replaced by open blocks and captures
+        if not blocks and isinstance(stream, io.TextIOBase):
+            self.write = self._write  # no second buffer on the one of the stream
+        self._preface(fixed_tables)
+        if blocks:
+            self.flush()
+            self.blocks = {}
+            self._output = self._write
+            self._spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE, self.SPOOL_MODE)
+            self._write = self._spool.write
+        self.write(self.ENTITIES)  # write header
+
+    def _write_function(self, stream):
+        if isinstance(stream, int):
+            return _fd_writer(stream)
+        if _is_binary(stream):
+            return lambda data: stream.write(data.encode(DXF_ENCODING))
+        return stream.write
+
+    def _preface(self, fixed_tables):
         if fixed_tables:
-            stream.write(PREFACE)
-        stream.write("0\nSECTION\n2\nENTITIES\n")  # write header
+            self.write(PREFACE)
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write(self.EMPTY.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
 
     def close(self):
-        self.stream.write("0\nENDSEC\n0\nEOF\n")  # write tail
+        if self.blocks is None:
+            self.write(self.ENDSEC + self.EOF)  # write tail
+            self.flush()
+            return
+        self.write(self.ENDSEC)
+        self.flush()
+        self._output(self.EMPTY.join([self.BLOCKS] + list(self.blocks.values()) + [self.ENDSEC]))
+        self._spool.seek(0)
+        while True:
+            data = self._spool.read(SPOOL_SIZE)
+            if not data:
+                break
+            self._output(data)
+        self._spool.close()
+        self._output(self.EOF)
+
+    def begin_block(self, name, base=(0, 0)):
+        # entities written until end_block() define the block name
+        if self.blocks is None:
+            raise ValueError("blocks need r12writer(..., blocks=True).")
+        if name in self.blocks:
+            raise ValueError("block %s is already defined." % name)
+        block = [self._block_head(name, base)]
+        self._redirect(block.append, (name, block))
+
+    def end_block(self):
+        # back to the ENTITIES section, or to the block or capture around
+        name, block = self._restore()
+        block.append(self._block_tail())
+        self.blocks[name] = self.EMPTY.join(block)
+
+    def begin_capture(self):
+        # entities written until end_capture() are also returned by it
+        captured = []
+        self._redirect(captured.append, captured)
+
+    def end_capture(self):
+        data = self.EMPTY.join(self._restore())
+        self.write(data)
+        return data
+
+    def _redirect(self, write, state):
+        # blocks and captures nest: each one keeps the write it replaces
+        self._redirects.append((self.__dict__.get('write'), state))
+        self.write = write
+
+    def _restore(self):
+        write, state = self._redirects.pop()
+        if write is None:
+            del self.write
+        else:
+            self.write = write
+        return state
+
+    def _block_head(self, name, base):
+        return "0\nBLOCK\n8\n0\n2\n%s\n70\n0\n%s3\n%s\n" % (name, self.fmt.vertex(base), name)
+
+    def _block_tail(self):
+        return "0\nENDBLK\n8\n0\n"
+
+    def add_insert(self, name, insert=(0, 0), rotation=0., xscale=1., yscale=1., layer="0", color=None,
+                   columns=1, rows=1, column_spacing=0., row_spacing=0.):
+        # a placement of block name; xscale=-1 mirrors it; columns x rows
+        # copies make it an array (MINSERT), spaced along x and y
+        self.counts['INSERT'] += 1
+        number = self.fmt.number
+        dxf = ["0\nINSERT\n"]
+        dxf.append(dxf_attribs(layer, color))
+        dxf.append(dxf_tag(2, name))
+        dxf.append(self.fmt.vertex(insert))
+        if xscale != 1.:
+            dxf.append(dxf_tag(41, number(xscale)))
+        if yscale != 1.:
+            dxf.append(dxf_tag(42, number(yscale)))
+        if rotation != 0.:
+            dxf.append(dxf_tag(50, number(rotation)))
+        if columns != 1 or rows != 1:
+            dxf.append("70\n%d\n71\n%d\n" % (columns, rows))
+            dxf.append(dxf_tag(44, number(column_spacing)))
+            dxf.append(dxf_tag(45, number(row_spacing)))
+        self.write(''.join(dxf))
 
     def add_line(self, start, end, layer="0", color=None, linetype=None):
+        self.counts['LINE'] += 1
         dxf = ["0\nLINE\n"]
         dxf.append(dxf_attribs(layer, color, linetype))
-        dxf.append(dxf_vertex(start, code=10))
-        dxf.append(dxf_vertex(end, code=11))
-        self.stream.write(''.join(dxf))
+        dxf.append(self.fmt.segment(start, end))
+        self.write(''.join(dxf))
 
     def add_circle(self, center, radius, layer="0", color=None, linetype=None):
+        self.counts['CIRCLE'] += 1
         dxf = ["0\nCIRCLE\n"]
         dxf.append(dxf_attribs(layer, color, linetype))
-        dxf.append(dxf_vertex(center))
-        dxf.append(dxf_tag(40, str(rnd(radius))))
-        self.stream.write(''.join(dxf))
+        dxf.append(self.fmt.vertex(center))
+        dxf.append(dxf_tag(40, self.fmt.number(radius)))
+        self.write(''.join(dxf))
 
     def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        self.counts['ARC'] += 1
         dxf = ["0\nARC\n"]
         dxf.append(dxf_attribs(layer, color, linetype))
-        dxf.append(dxf_vertex(center))
-        dxf.append(dxf_tag(40, str(rnd(radius))))
-        dxf.append(dxf_tag(50, str(rnd(start))))
-        dxf.append(dxf_tag(51, str(rnd(end))))
-        self.stream.write(''.join(dxf))
+        number = self.fmt.number
+        dxf.append(self.fmt.vertex(center))
+        dxf.append("40\n%s\n50\n%s\n51\n%s\n" % (number(radius), number(start), number(end)))
+        self.write(''.join(dxf))
 
     def add_point(self, location, layer="0", color=None, linetype=None):
+        self.counts['POINT'] += 1
         dxf = ["0\nPOINT\n"]
         dxf.append(dxf_attribs(layer, color, linetype))
-        dxf.append(dxf_vertex(location))
-        self.stream.write(''.join(dxf))
+        dxf.append(self.fmt.vertex(location))
+        self.write(''.join(dxf))
 
     def add_3dface(self, vertices, invisible=0, layer="0", color=None, linetype=None):
         self._add_quadrilateral('3DFACE', vertices, invisible, layer, color, linetype)
@@ -111,6 +578,7 @@ class R12FastStreamWriter(object):
         self._add_quadrilateral('SOLID', vertices, 0, layer, color, linetype)
 
     def _add_quadrilateral(self, dxftype, vertices, flags, layer, color, linetype):
+        self.counts[dxftype] += 1
         dxf = ["0\n%s\n" % dxftype]
         dxf.append(dxf_attribs(layer, color, linetype))
         vertices = list(vertices)
@@ -118,57 +586,108 @@ class R12FastStreamWriter(object):
             raise ValueError("%s needs 3 ot 4 vertices." % dxftype)
         elif len(vertices) == 3:
             vertices.append(vertices[-1])  # double last vertex
-        dxf.extend(dxf_vertex(vertex, code) for code, vertex in enumerate(vertices, start=10))
+        dxf.extend(self.fmt.vertex(vertex, code) for code, vertex in enumerate(vertices, start=10))
         if flags:
             dxf.append(dxf_tag(70, str(flags)))
-        self.stream.write(''.join(dxf))
-
-    def add_polyline(self, vertices, layer="0", color=None, linetype=None):
-        def write_polyline(flags):
-            dxf = ["0\nPOLYLINE\n"]
-            dxf.append(dxf_attribs(layer, color, linetype))
-            dxf.append(dxf_tag(66, "1"))  # entities follow
-            dxf.append(dxf_tag(70, flags))
-            self.stream.write(''.join(dxf))
-
-        polyline_flags, vertex_flags = None, None
-        for vertex in vertices:
-            if polyline_flags is None:  # first vertex
-                if len(vertex) == 3:  # 3d polyline
-                    polyline_flags, vertex_flags = ('8', '32')
-                else:  # 2d polyline
-                    polyline_flags, vertex_flags = ('0', '0')
-                write_polyline(polyline_flags)
-
-            dxf = ["0\nVERTEX\n"]
-            dxf.append(dxf_attribs(layer))
-            dxf.append(dxf_tag(70, vertex_flags))
-            dxf.append(dxf_vertex(vertex))
-            self.stream.write(''.join(dxf))
-        if polyline_flags is not None:
-            self.stream.write("0\nSEQEND\n")
+        self.write(''.join(dxf))
+
+    def add_polyline(self, vertices, layer="0", color=None, linetype=None, closed=False, bulges=None):
+        # bulges: one per vertex, of the segment starting at the vertex; the
+        # polyline is written in one piece, the vertices of a numpy array
+        # formatted as one table
+        if numpy is None or not isinstance(vertices, numpy.ndarray):
+            vertices = list(vertices)
+        if not len(vertices):
+            return
+        dim = len(vertices[0])
+        polyline_flags, vertex_flags = (8, 32) if dim == 3 else (0, 0)  # 3d or 2d polyline
+        if closed:
+            polyline_flags += 1
+        self.counts['POLYLINE'] += 1
+        dxf = ["0\nPOLYLINE\n"]
+        dxf.append(dxf_attribs(layer, color, linetype))
+        dxf.append(dxf_tag(66, "1"))  # entities follow
+        dxf.append(dxf_tag(70, polyline_flags))
+        vertex_head = "0\nVERTEX\n" + dxf_attribs(layer) + dxf_tag(70, vertex_flags)
+        if bulges is None and not isinstance(vertices, list):
+            placeholder, args = self.fmt.table(vertices)
+            template = vertex_head.replace('%', '%%') + ''.join(
+                dxf_tag(code, placeholder) for code in range(10, 10 * dim + 10, 10))
+            dxf.append((template * len(vertices)) % tuple(args))
+        else:
+            for vertex, bulge in zip(vertices, repeat(0) if bulges is None else bulges):
+                dxf.append(vertex_head)
+                dxf.append(self.fmt.vertex(vertex))
+                if bulge:
+                    dxf.append(dxf_tag(42, self.fmt.number(bulge)))
+        dxf.append("0\nSEQEND\n")
+        self.write(''.join(dxf))
 
     def add_text(self, text, insert=(0, 0), height=1., width=1., align="LEFT", rotation=0., oblique=0., style='STANDARD',
                  layer="0", color=None):
         # text style is always STANDARD without a TABLES section
+        self.counts['TEXT'] += 1
         dxf = ["0\nTEXT\n"]
         dxf.append(dxf_attribs(layer, color))
-        dxf.append(dxf_vertex(insert, code=10))
+        dxf.append(self.fmt.vertex(insert, code=10))
         dxf.append(dxf_tag(1, str(text)))
-        dxf.append(dxf_tag(40, str(rnd(height))))
+        dxf.append(dxf_tag(40, self.fmt.number(height)))
         if width != 1.:
-            dxf.append(dxf_tag(41, str(rnd(width))))
+            dxf.append(dxf_tag(41, self.fmt.number(width)))
         if rotation != 0.:
-            dxf.append(dxf_tag(50, str(rnd(rotation))))
+            dxf.append(dxf_tag(50, self.fmt.number(rotation)))
         if oblique != 0.:
-            dxf.append(dxf_tag(51, str(rnd(oblique))))
+            dxf.append(dxf_tag(51, self.fmt.number(oblique)))
         if style != "STANDARD":
             dxf.append(dxf_tag(7, str(style)))
         halign, valign = TEXT_ALIGN_FLAGS[align.upper()]
         dxf.append(dxf_tag(72, str(halign)))
         dxf.append(dxf_tag(73, str(valign)))
-        dxf.append(dxf_vertex(insert, code=11))  # align point
-        self.stream.write(''.join(dxf))
+        dxf.append(self.fmt.vertex(insert, code=11))  # align point
+        self.write(''.join(dxf))
+
+    # bulk methods: arrays of points (n, 2) or (n, 3) and of numbers (n,),
+    # numpy arrays or sequences, numbers are written as floats
+
+    def add_lines(self, starts, ends, layer="0", color=None, linetype=None):
+        self._add_bulk('LINE', ((10, starts), (11, ends)), layer, color, linetype)
+
+    def add_circles(self, centers, radii, layer="0", color=None, linetype=None):
+        self._add_bulk('CIRCLE', ((10, centers), (40, radii)), layer, color, linetype)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, layer="0", color=None, linetype=None):
+        self._add_bulk('ARC', ((10, centers), (40, radii), (50, start_angles), (51, end_angles)),
+                       layer, color, linetype)
+
+    def _add_bulk(self, dxftype, fields, layer, color, linetype):
+        # fields: (group code, points or numbers) in entity order; one text
+        # template per block of BULK_ROWS entities, filled with one format
+        codes = []
+        if numpy is not None:
+            columns = []
+            for code, values in fields:
+                values = numpy.asarray(values, dtype=numpy.float64)
+                if values.ndim == 1:
+                    values = values.reshape(-1, 1)
+                codes.extend(code + 10 * i for i in range(values.shape[1]))
+                columns.append(values)
+            rows = numpy.hstack(columns)
+        else:
+            columns = []
+            for code, values in fields:
+                values = [tuple(v) if hasattr(v, '__len__') else (v,) for v in values]
+                codes.extend(code + 10 * i for i in range(len(values[0]) if values else 1))
+                columns.append(values)
+            if len(set(len(column) for column in columns)) > 1:
+                raise ValueError("%s arrays have different lengths." % dxftype)
+            rows = [tuple(chain.from_iterable(parts)) for parts in zip(*columns)]
+        head = ("0\n%s\n%s" % (dxftype, dxf_attribs(layer, color, linetype))).replace('%', '%%')
+        for start in range(0, len(rows), BULK_ROWS):
+            block = rows[start:start + BULK_ROWS]
+            placeholder, args = self.fmt.table(block)
+            template = head + ''.join("%d\n%s\n" % (code, placeholder) for code in codes)
+            self.write((template * len(block)) % tuple(args))
+        self.counts[dxftype] += len(rows)
 
 
 def dxf_attribs(layer, color=None, linetype=None):
@@ -824,354 +1343,3951 @@ ENDTAB
 ENDSEC
 """
 
+# binary DXF R12: the sentinel, then tags as a 1 byte group code (255 and an
+# int16 for codes above 254) and a value typed by the code: zero terminated
+# string, little endian IEEE double, int16 or int32
+BINARY_SENTINEL = b'AutoCAD Binary DXF\r\n\x1a\x00'
+
+_STRING, _DOUBLE, _INT16, _INT32 = 's', 'd', 'h', 'i'
+_BINARY_TYPES = ((0, 9, _STRING), (10, 59, _DOUBLE), (60, 79, _INT16), (90, 99, _INT32),
+                 (100, 109, _STRING), (140, 147, _DOUBLE), (170, 175, _INT16),
+                 (210, 239, _DOUBLE), (999, 1009, _STRING), (1010, 1059, _DOUBLE),
+                 (1060, 1070, _INT16), (1071, 1071, _INT32))
+
+
+def binary_tag_type(code):
+    for first, last, typ in _BINARY_TYPES:
+        if first <= code <= last:
+            return typ
+    raise ValueError("group code %d has no binary DXF type." % code)
+
+
+def binary_code(code):
+    if code < 255:
+        return struct.pack('<B', code)
+    return struct.pack('<Bh', 255, code)
+
+
+def binary_tag(code, value):
+    typ = binary_tag_type(code)
+    if typ is _STRING:
+        return binary_code(code) + str(value).encode(DXF_ENCODING) + b'\x00'
+    if typ is _DOUBLE:
+        return binary_code(code) + struct.pack('<d', float(value))
+    return binary_code(code) + struct.pack('<' + typ, int(value))
+
+
+def binary_ascii_tags(text):
+    # ascii DXF text -> the same tags in binary
+    lines = text.splitlines()
+    return b''.join(binary_tag(int(lines[i]), lines[i + 1]) for i in range(0, len(lines) - 1, 2))
+
+
+def iter_binary_tags(data):
+    # binary DXF bytes -> (group code, value) tags
+    if not data.startswith(BINARY_SENTINEL):
+        raise ValueError("not a binary DXF.")
+    pos = len(BINARY_SENTINEL)
+    while pos < len(data):
+        code = data[pos]
+        pos += 1
+        if code == 255:
+            code = struct.unpack_from('<h', data, pos)[0]
+            pos += 2
+        typ = binary_tag_type(code)
+        if typ is _STRING:
+            end = data.index(b'\x00', pos)
+            yield code, data[pos:end].decode(DXF_ENCODING)
+            pos = end + 1
+        else:
+            value = struct.unpack_from('<' + typ, data, pos)[0]
+            pos += struct.calcsize(typ)
+            yield code, value
+
+
+_XY = struct.Struct('<BdBd')
+_XYZ = struct.Struct('<BdBdBd')
+_LINE_XY = struct.Struct('<BdBdBdBd')
+_ARC_VALUES = struct.Struct('<BdBdBd')
+_DOUBLE_TAG = struct.Struct('<Bd')
+_INT16_TAG = struct.Struct('<Bh')
+
+
+def binary_attribs(layer, color=None, linetype=None):
+    dxf = [b'\x08' + str(layer).encode(DXF_ENCODING) + b'\x00']  # layer is required
+    if linetype is not None:
+        dxf.append(b'\x06' + str(linetype).encode(DXF_ENCODING) + b'\x00')
+    if color is not None:
+        if 0 <= int(color) < 257:
+            dxf.append(_INT16_TAG.pack(62, int(color)))
+        else:
+            raise ValueError("color has to be an integer in the range from 0 to 256.")
+    return b''.join(dxf)
+
+
+def binary_vertex(vertex, code=10):
+    if len(vertex) == 2:
+        return _XY.pack(code, vertex[0], code + 10, vertex[1])
+    if len(vertex) == 3:
+        return _XYZ.pack(code, vertex[0], code + 10, vertex[1], code + 20, vertex[2])
+    return b''.join(_DOUBLE_TAG.pack(code + 10 * i, c) for i, c in enumerate(vertex))
+
+
+class R12BinaryStreamWriter(R12FastStreamWriter):
+    # the same entities as a binary DXF; coordinates keep the full double
+    # precision, the output has to go to a binary stream or descriptor
+    EMPTY = b''
+
+    def _write_function(self, stream):
+        if isinstance(stream, int):
+            return _fd_writer(stream, None)
+        if not _is_binary(stream):
+            if not hasattr(stream, 'buffer'):  # io.StringIO...
+                raise TypeError("binary DXF needs a binary stream.")
+            stream.flush()
+            stream = stream.buffer  # sys.stdout
+        return stream.write
+
+    ENTITIES = b'\x00SECTION\x00\x02ENTITIES\x00'
+    BLOCKS = b'\x00SECTION\x00\x02BLOCKS\x00'
+    ENDSEC = b'\x00ENDSEC\x00'
+    EOF = b'\x00EOF\x00'
+    SPOOL_MODE = 'w+b'
+
+    def _preface(self, fixed_tables):
+        self.write(BINARY_SENTINEL)
+        if fixed_tables:
+            self.write(binary_ascii_tags(PREFACE))
+
+    def close(self):
+        R12FastStreamWriter.close(self)
+        if not isinstance(self.stream, int) and not _is_binary(self.stream):
+            self.stream.buffer.flush()
+
+    def _block_head(self, name, base):
+        name = str(name).encode(DXF_ENCODING) + b'\x00'
+        return (b'\x00BLOCK\x00\x080\x00\x02' + name + _INT16_TAG.pack(70, 0) + binary_vertex(base) +
+                b'\x03' + name)
+
+    def _block_tail(self):
+        return b'\x00ENDBLK\x00\x080\x00'
+
+    def add_insert(self, name, insert=(0, 0), rotation=0., xscale=1., yscale=1., layer="0", color=None,
+                   columns=1, rows=1, column_spacing=0., row_spacing=0.):
+        self.counts['INSERT'] += 1
+        dxf = [b'\x00INSERT\x00', binary_attribs(layer, color), binary_tag(2, name), binary_vertex(insert)]
+        if xscale != 1.:
+            dxf.append(_DOUBLE_TAG.pack(41, xscale))
+        if yscale != 1.:
+            dxf.append(_DOUBLE_TAG.pack(42, yscale))
+        if rotation != 0.:
+            dxf.append(_DOUBLE_TAG.pack(50, rotation))
+        if columns != 1 or rows != 1:
+            dxf.append(_INT16_TAG.pack(70, columns) + _INT16_TAG.pack(71, rows))
+            dxf.append(_DOUBLE_TAG.pack(44, column_spacing) + _DOUBLE_TAG.pack(45, row_spacing))
+        self.write(b''.join(dxf))
+
+    def add_line(self, start, end, layer="0", color=None, linetype=None):
+        self.counts['LINE'] += 1
+        if len(start) == 2 and len(end) == 2:
+            points = _LINE_XY.pack(10, start[0], 20, start[1], 11, end[0], 21, end[1])
+        else:
+            points = binary_vertex(start, 10) + binary_vertex(end, 11)
+        self.write(b'\x00LINE\x00' + binary_attribs(layer, color, linetype) + points)
+
+    def add_circle(self, center, radius, layer="0", color=None, linetype=None):
+        self.counts['CIRCLE'] += 1
+        self.write(b'\x00CIRCLE\x00' + binary_attribs(layer, color, linetype) + binary_vertex(center) +
+                   _DOUBLE_TAG.pack(40, radius))
+
+    def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        self.counts['ARC'] += 1
+        self.write(b'\x00ARC\x00' + binary_attribs(layer, color, linetype) + binary_vertex(center) +
+                   _ARC_VALUES.pack(40, radius, 50, start, 51, end))
+
+    def add_point(self, location, layer="0", color=None, linetype=None):
+        self.counts['POINT'] += 1
+        self.write(b'\x00POINT\x00' + binary_attribs(layer, color, linetype) + binary_vertex(location))
+
+    def _add_quadrilateral(self, dxftype, vertices, flags, layer, color, linetype):
+        self.counts[dxftype] += 1
+        dxf = [binary_tag(0, dxftype), binary_attribs(layer, color, linetype)]
+        vertices = list(vertices)
+        if len(vertices) < 3:
+            raise ValueError("%s needs 3 ot 4 vertices." % dxftype)
+        elif len(vertices) == 3:
+            vertices.append(vertices[-1])  # double last vertex
+        dxf.extend(binary_vertex(vertex, code) for code, vertex in enumerate(vertices, start=10))
+        if flags:
+            dxf.append(_INT16_TAG.pack(70, flags))
+        self.write(b''.join(dxf))
+
+    def add_polyline(self, vertices, layer="0", color=None, linetype=None, closed=False, bulges=None):
+        if numpy is not None and isinstance(vertices, numpy.ndarray):
+            vertices = vertices.tolist()
+        else:
+            vertices = list(vertices)
+        if not vertices:
+            return
+        polyline_flags, vertex_flags = (8, 32) if len(vertices[0]) == 3 else (0, 0)  # 3d or 2d polyline
+        if closed:
+            polyline_flags += 1
+        self.counts['POLYLINE'] += 1
+        dxf = [b'\x00POLYLINE\x00' + binary_attribs(layer, color, linetype) +
+               _INT16_TAG.pack(66, 1) + _INT16_TAG.pack(70, polyline_flags)]
+        vertex_head = b'\x00VERTEX\x00' + binary_attribs(layer) + _INT16_TAG.pack(70, vertex_flags)
+        for vertex, bulge in zip(vertices, repeat(0) if bulges is None else bulges):
+            dxf.append(vertex_head)
+            dxf.append(binary_vertex(vertex))
+            if bulge:
+                dxf.append(_DOUBLE_TAG.pack(42, bulge))
+        dxf.append(b'\x00SEQEND\x00')
+        self.write(b''.join(dxf))
+
+    def add_text(self, text, insert=(0, 0), height=1., width=1., align="LEFT", rotation=0., oblique=0., style='STANDARD',
+                 layer="0", color=None):
+        self.counts['TEXT'] += 1
+        dxf = [b'\x00TEXT\x00', binary_attribs(layer, color), binary_vertex(insert, code=10),
+               binary_tag(1, text), _DOUBLE_TAG.pack(40, height)]
+        if width != 1.:
+            dxf.append(_DOUBLE_TAG.pack(41, width))
+        if rotation != 0.:
+            dxf.append(_DOUBLE_TAG.pack(50, rotation))
+        if oblique != 0.:
+            dxf.append(_DOUBLE_TAG.pack(51, oblique))
+        if style != "STANDARD":
+            dxf.append(binary_tag(7, style))
+        halign, valign = TEXT_ALIGN_FLAGS[align.upper()]
+        dxf.append(_INT16_TAG.pack(72, halign))
+        dxf.append(_INT16_TAG.pack(73, valign))
+        dxf.append(binary_vertex(insert, code=11))  # align point
+        self.write(b''.join(dxf))
+
+    def _add_bulk(self, dxftype, fields, layer, color, linetype):
+        # fields: (group code, points or numbers) in entity order; numpy
+        # writes every block as one record array of (code, double) pairs
+        head = b'\x00' + dxftype.encode('ascii') + b'\x00' + binary_attribs(layer, color, linetype)
+        if numpy is None:
+            columns = []
+            codes = []
+            for code, values in fields:
+                values = [tuple(v) if hasattr(v, '__len__') else (v,) for v in values]
+                codes.extend(code + 10 * i for i in range(len(values[0]) if values else 1))
+                columns.append(values)
+            if len(set(len(column) for column in columns)) > 1:
+                raise ValueError("%s arrays have different lengths." % dxftype)
+            values = struct.Struct('<' + 'Bd' * len(codes))
+            for parts in zip(*columns):
+                row = chain.from_iterable(parts)
+                self.write(head + values.pack(*chain.from_iterable(zip(codes, row))))
+            self.counts[dxftype] += len(columns[0])
+            return
+        codes = []
+        columns = []
+        for code, values in fields:
+            values = numpy.asarray(values, dtype=numpy.float64)
+            if values.ndim == 1:
+                values = values.reshape(-1, 1)
+            codes.extend(code + 10 * i for i in range(values.shape[1]))
+            columns.append(values)
+        rows = numpy.hstack(columns)
+        record = [('head', 'V%d' % len(head))]
+        for i, code in enumerate(codes):
+            record += [('c%d' % i, 'u1'), ('v%d' % i, '<f8')]
+        for start in range(0, len(rows), BULK_ROWS):
+            block = rows[start:start + BULK_ROWS]
+            out = numpy.empty(len(block), dtype=record)
+            out['head'] = numpy.void(head)
+            for i, code in enumerate(codes):
+                out['c%d' % i] = code
+                out['v%d' % i] = block[:, i]
+            self.write(out.tobytes())
+        self.counts[dxftype] += len(rows)
+
 ###################################################################
 ##real python code easyw
 
-import re, os
-from math import sqrt, atan2, degrees
-import argparse
 #import FreeCAD,FreeCADGui
 # from dxfwrite import DXFEngine as dxf
 #from r12writer import *
 
-parser = argparse.ArgumentParser(description='kicadpcb2dxf converter')
-parser.add_argument('-f','--file', help='.kicad_pcb file name', required=False)
-#parser.add_argument('-c','--color', help='--color blue', required=False)
+###################################################################
+## streaming s-expression tokenizer
+# the board is read in chunks cut at the last newline, so a token never spans
+# two chunks; memory depends on the nesting depth and on the size of the
+# element being collected, not on the size of the file.
+# a list without nested lists, like (xy 1 2) or (layer F.Cu), is a single
+# "leaf" token: matching it whole in the regex keeps the per token python
+# work low.
+# kicad writes every top level element on its own line with the same
+# indentation, so top level elements that are not exported (zones, tracks,
+# vias, nets...) are skipped with str.find/str.count on that line prefix and
+# never tokenized; a candidate line is a real top level start only if the
+# paren balance up to it is 1, so a file without that layout is still read
+# correctly, just tokenized in full.
 
-args = vars(parser.parse_args())
-def say(msg):
-    #FreeCAD.Console.PrintMessage(msg)
-    #FreeCAD.Console.PrintMessage('\n')
-    print(msg)
+READ_CHUNK_SIZE = 1 << 16
 
-#say(len(args))
-#if len(args) == 1:
-#    #filename="C:/Cad/Progetti_K/test/test2-dxf.kicad_pcb"  
-#    #path, fname = os.path.splitext(os.path.abspath(filename))
-#    #say(fname)
-#    say ("use kicadpcb3dxf pcbfile_name.kicad_pcb")
-#    exit
-if args['file'] == None:
-    #filename="C:/Cad/Progetti_K/test/test2-dxf.kicad_pcb"  
-    #path, fname = os.path.splitext(os.path.abspath(filename))
-    #say(fname)
-    say ("...\n   launch:\n          kicadpcb3dxf -f pcbfile_name.kicad_pcb")
-    say("version "+str(___version___))
-    quit()
-else:
-    filename=args['file']
-    say(args['file'])
-    dirpath = os.path.abspath(os.path.expanduser(filename))
-    path, fname = os.path.split(dirpath)
-    ext = os.path.splitext(os.path.basename(filename))[1]
-    name = os.path.splitext(os.path.basename(filename))[0]
-
-say ("reading from "+ dirpath)
-#say ("path= "+ path)
-#say("fname "+fname)
-out_filename=path+os.sep+name+".dxf"
-say("writing to "+out_filename)
-content=[]
-txtFile = open(filename,"r")
-content = txtFile.readlines()
-content.append(" ")
-txtFile.close()
-#say(content)
-
-# quote_layer True to move all quote on special layer
-quote_layer=False
-align="LEFT"
-
-with r12writer(out_filename) as dxf:
-    data=[];createTxt=0;quote_color=127;dimension=0
-    for line in content:
-        if line.strip().startswith("(at ") and not "(at (xyz" in line:
-            pos=line.split('(at ',1)[-1]
-            plcmt=pos.split(" ")
-            plcmt[1]=plcmt[1].split(')')[0] 
-            #say("getting fp offset")
-            #say (plcmt)
-            #say (plcmt[0]+" x off");say (plcmt[1]+" y off")
-        create=0
-        if "fp_line" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; create=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; create=1
-            if "Edge" in line:
-                layer="Edge"; color=2; create=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; create=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; create=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; create=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; create=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; create=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; create=1
-            if create==1:
-                coords=line.split('(',1)[-1]
-                coords=coords.split(" ")
-                #say(coords[4]+";"+coords[5][:-1]+" "+layer)
-                #say(coords)
-                xs=float(coords[2])+float(plcmt[0]);ys=-float(coords[3].split(')')[0])-float(plcmt[1])
-                xe=float(coords[5])+float(plcmt[0]);ye=-float(coords[6].split(')')[0])-float(plcmt[1])
-                #xs=float(coords[4]);ys=-float(coords[5][:-1])
-                #xe=float(coords[7]);ye=-float(coords[8][:-1])
-                #say (plcmt[0]+" x off")
-                #say (str(float(plcmt[0]))+" x off")
-                #say(str(xs)+";"+str(ys)+" module")
-                #data.append(str(xs)+";"+str(ys))
-                dxf.add_line((xs,ys), (xe,ye), layer, color, linetype=None)
-        create=0
-        if "fp_circle" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; create=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; create=1
-            if "Edge" in line:
-                layer="Edge"; color=2; create=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; create=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; create=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; create=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; create=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; create=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; create=1
-            if create==1:
-                coords=line.split('(',1)[-1]
-                coords=coords.split(" ")
-                #say(coords[4]+";"+coords[5][:-1])
-                cx=float(coords[2])+float(plcmt[0]);cy=-float(coords[3].split(')')[0])-float(plcmt[1])
-                xe=float(coords[5])+float(plcmt[0]);ye=-float(coords[6].split(')')[0])-float(plcmt[1])
-                #cx=float(coords[4]);cy=-float(coords[5][:-1])
-                #xe=float(coords[7]);ye=-float(coords[8][:-1])
-                data.append(str(cx)+";"+str(cy))
-                r=sqrt((cx-xe)**2+(cy-ye)**2)
-                dxf.add_circle((cx, cy), r, layer, color, linetype=None)
-        create=0
-        if "fp_arc" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; create=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; create=1
-            if "Edge" in line:
-                layer="Edge"; color=2; create=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; create=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; create=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; create=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; create=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; create=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; create=1
-            if create==1:
-                coords=line.split('(',1)[-1]
-                coords=coords.split(" ")
-                #say(coords[4]+";"+coords[5][:-1])
-                cx=float(coords[2])+float(plcmt[0]);cy=-float(coords[3].split(')')[0])-float(plcmt[1])
-                xe=float(coords[5])+float(plcmt[0]);ye=-float(coords[6].split(')')[0])-float(plcmt[1])
-                #cx=float(coords[4]);cy=-float(coords[5][:-1])
-                #xe=float(coords[7]);ye=-float(coords[8][:-1])
-                arc_angle=float(coords[8].split(')')[0])
-                #arc_angle=float(coords[10][:-1])
-                data.append(str(cx)+";"+str(cy))
-                #endAngle = degrees(atan2(ye-cy, xe-cx))
-                #startAngle = (endAngle-arc_angle)
-                if arc_angle<0:
-                    startAngle = degrees(atan2(ye-cy, xe-cx))
-                    endAngle = (startAngle-arc_angle)
-                else:
-                    endAngle = degrees(atan2(ye-cy, xe-cx))
-                    startAngle = (endAngle-arc_angle)
-                center = (cx, cy, 0) # int or float
-                r = sqrt((cx-xe)**2+(cy-ye)**2)
-                #say(str(startAngle)+";"+str(endAngle))
-                dxf.add_arc(center, r, startAngle, endAngle, layer, color, linetype=None)
-        create=0
-        if "gr_line" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; create=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; create=1
-            if "Edge" in line:
-                layer="Edge"; color=2; create=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; create=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; create=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; create=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; create=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; create=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; create=1
-            if create==1:
-                coords=line.split('(',1)[-1]
-                coords=coords.split(" ")
-                #say(coords[4]+";"+coords[5][:-1]+" "+layer)
-                #say(coords)
-                xs=float(coords[2]);ys=-float(coords[3].split(')')[0])
-                xe=float(coords[5]);ye=-float(coords[6].split(')')[0])
-                #xs=float(coords[4]);ys=-float(coords[5][:-1])
-                #xe=float(coords[7]);ye=-float(coords[8][:-1])
-                #data.append(str(xs)+";"+str(ys))
-                dxf.add_line((xs,ys), (xe,ye), layer, color, linetype=None)
-        create=0
-        if "gr_circle" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; create=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; create=1
-            if "Edge" in line:
-                layer="Edge"; color=2; create=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; create=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; create=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; create=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; create=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; create=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; create=1
-            if create==1:
-                coords=line.split('(',1)[-1]
-                coords=coords.split(" ")
-                #say(coords[4]+";"+coords[5][:-1])
-                cx=float(coords[2]);cy=-float(coords[3].split(')')[0])
-                xe=float(coords[5]);ye=-float(coords[6].split(')')[0])
-                #cx=float(coords[4]);cy=-float(coords[5][:-1])
-                #xe=float(coords[7]);ye=-float(coords[8][:-1])
-                data.append(str(cx)+";"+str(cy))
-                r=sqrt((cx-xe)**2+(cy-ye)**2)
-                dxf.add_circle((cx, cy), r, layer, color, linetype=None)
-        create=0
-        if "gr_arc" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; create=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; create=1
-            if "Edge" in line:
-                layer="Edge"; color=2; create=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; create=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; create=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; create=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; create=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; create=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; create=1
-            if create==1:
-                coords=line.split('(',1)[-1]
-                coords=coords.split(" ")
-                #say(coords[4]+";"+coords[5][:-1])
-                cx=float(coords[2]);cy=-float(coords[3].split(')')[0])
-                xe=float(coords[5]);ye=-float(coords[6].split(')')[0])
-                #cx=float(coords[4]);cy=-float(coords[5][:-1])
-                #xe=float(coords[7]);ye=-float(coords[8][:-1])
-                arc_angle=float(coords[8].split(')')[0])
-                #say(arc_angle)
-                #arc_angle=float(coords[10][:-1])
-                data.append(str(cx)+";"+str(cy))
-                #endAngle = degrees(atan2(ye-cy, xe-cx))
-                #startAngle = (endAngle-arc_angle)
-                if arc_angle<0:
-                    startAngle = degrees(atan2(ye-cy, xe-cx))
-                    endAngle = (startAngle-arc_angle)
-                else:
-                    endAngle = degrees(atan2(ye-cy, xe-cx))
-                    startAngle = (endAngle-arc_angle)
-                center = (cx, cy, 0) # int or float
-                r = sqrt((cx-xe)**2+(cy-ye)**2)
-                #say(str(startAngle)+";"+str(endAngle))
-                dxf.add_arc(center, r, startAngle, endAngle, layer, color, linetype=None)
-        #createTxt=0
-        if "gr_text" in line:
-            if "Dwgs" in line:
-                layer=0; color=None; createTxt=1
-            if "Cmts" in line:
-                layer="Cmts"; color=1; createTxt=1
-            if "Edge" in line:
-                layer="Edge"; color=2; createTxt=1
-            if "Eco1" in line:
-                layer="Eco1"; color=3; createTxt=1
-            if "Eco2" in line:
-                layer="Eco2"; color=4; createTxt=1
-            if "F.Fab" in line:
-                layer="FFab"; color=5; createTxt=1
-            if "B.Fab" in line:
-                layer="BFab"; color=6; createTxt=1
-            if "F.CrtYd" in line:
-                layer="FCrtYd"; color=7; createTxt=1
-            if "B.CrtYd" in line:
-                layer="BCrtYd"; color=8; createTxt=1
-            if createTxt==1:        
-                #(gr_text Rotate (at 325.374 52.705 15) (layer Eco2.User)
-                line=line.strip().split("(gr_text ")[1].split("(at")
-                text=line[0].replace("\"", "").replace("\'", "")
-                #say(line[1].split(" "))
-                px=line[1].split(" ")[1];py=line[1].split(" ")[2].replace(")", "")
-                if "layer" not in line[1].split(" ")[3]:
-                    rot=line[1].split(" ")[3].replace(")", "")
+_QUOTED = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_TOKEN_RE = re.compile(r'\([^()"]*(?:%s[^()"]*)*\)|\(|\)|%s|[^\s()"]+' % (_QUOTED, _QUOTED))
+_INDENT_RE = re.compile(r'\n([ \t]*)\(')
+_HEAD_RE = re.compile(r'[^\s()"]+')
+
+
+def iter_text_chunks(stream, chunk_size=READ_CHUNK_SIZE):
+    # text chunks of a file object (text or binary, utf-8) or of an iterable
+    # of str/bytes chunks; never more than one chunk in memory
+    if hasattr(stream, 'read'):
+        chunks = iter(lambda: stream.read(chunk_size), stream.read(0))
+    else:
+        chunks = iter(stream)
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            chunk = decoder.decode(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    if decoder is not None:
+        chunk = decoder.decode(b'', True)
+        if chunk:
+            yield chunk
+
+
+def _safe_cut(buf):
+    # end of the last ')' that is not inside a quoted string, 0 if none
+    end = buf.rfind(')') + 1
+    while end > 0 and (buf.count('"', 0, end) - buf.count('\\"', 0, end)) % 2:
+        end = buf.rfind(')', 0, end - 1) + 1
+    return end
+
+
+def _line_head(buf, pos):
+    m = _HEAD_RE.match(buf, pos)
+    return m.group() if m is not None else None
+
+
+def iter_token_chunks(stream, chunk_size=READ_CHUNK_SIZE, board_heads=None, footprint_heads=None):
+    # yields token lists; with board_heads, top level elements whose head is
+    # not in board_heads are skipped, and with footprint_heads the same is
+    # done for the children of a footprint
+    findall = _TOKEN_RE.findall
+    tail = ''
+    marker = None  # '\n' + indentation of top level elements + '('
+    depth = 0  # paren balance up to `done`
+    keep = True  # tokenize the current region
+    in_footprint = False
+    region_depth = 0  # paren balance at the start of the current region
+    for chunk in iter_text_chunks(stream, chunk_size):
+        buf = tail + chunk
+        # the last newline stays in the tail so that an element starting
+        # right after it is found again in the next chunk
+        end = buf.rfind('\n')
+        if end < 0:  # a long line: cut after a paren outside of strings
+            end = _safe_cut(buf)
+            if end <= 0:
+                tail = buf
+                continue
+        tail = buf[end:]
+        if board_heads is None:
+            yield findall(buf, 0, end)
+            continue
+        start = done = 0
+        tokens = []
+        if marker is None:
+            for m in _INDENT_RE.finditer(buf, 0, end):
+                line = m.start() + 1
+                depth += buf.count('(', done, line) - buf.count(')', done, line)
+                done = line
+                if depth == 1:
+                    marker = '\n' + m.group(1) + '('
+                    child_marker = '\n' + m.group(1) * 2 + '('
+                    break
+            if marker is None:
+                depth += buf.count('(', done, end) - buf.count(')', done, end)
+                yield findall(buf, 0, end)
+                continue
+            done = buf.rfind('\n', 0, done)
+        head_at = len(marker) - 1
+        child_head_at = len(child_marker) - 1
+        pos = buf.find(marker, done, end)
+        child_pos = buf.find(child_marker, done, end) if in_footprint else -1
+        while pos >= 0 or child_pos >= 0:
+            is_child = child_pos >= 0 and (pos < 0 or child_pos < pos)
+            line = (child_pos if is_child else pos) + 1
+            depth += buf.count('(', done, line) - buf.count(')', done, line)
+            done = line
+            if depth == (2 if is_child else 1):  # an element starts on this line
+                if keep:
+                    tokens += findall(buf, start, line)
+                elif depth < region_depth:  # a skipped region closed its parent
+                    tokens += [')'] * (region_depth - depth)
+                start = line
+                region_depth = depth
+                if is_child:
+                    head = _line_head(buf, line + child_head_at)
+                    keep = head is None or head in footprint_heads
                 else:
-                    rot="0"
-                #say(line);say(text);say(px+";"+py+";"+rot)
-        if "(effects" in line and createTxt==1:
-            createTxt=0
-            size=(line.split("(size ")[1].split(" "))
-            #say (line)
-            #sizeX=int(round(float(size[0])))
-            #sizeY=int(round(float(size[1].replace(")", ""))))
-            sizeX=(float(size[0]))
-            sizeY=(float(size[1].replace(")", "")))
-            #say(sizeX);say(sizeY)
-            text1=text.split("\\n")
-            #say (text1)
-            #say (len(text1))
-            posY=-float(py)
-            # multiline support
-            if dimension==1 and quote_layer:
-                color=quote_color
-                layer="Quote"
-                dimension=0
-            for txt in text1:
-                dxf.add_text(txt,(float(px),posY),sizeX,sizeY,align,float(rot),0.,'SIMPLEX',layer,color)
-                posY=posY-sizeY*1.3
-            align="LEFT"
-            # dxf.add_text(text,(float(px),-float(py)),sizeX,sizeY,"LEFT",float(rot),0.,'STANDARD',layer,color)
-        if "(dimension" in line:
-            dimension=1;align="MIDDLE_CENTER"
-        if "(feature" in line or "(crossbar" in line or "(arrow" in line:
-            dimension_bar=line.split("(xy")
-            #say(dimension_bar)
-            dsx=float(dimension_bar[1].split(" ")[1])
-            dsy=float(dimension_bar[1].split(" ")[2].replace(")",""))
-            dex=float(dimension_bar[2].split(" ")[1])
-            dey=float(dimension_bar[2].split(" ")[2].replace(")",""))
-            #say(str(dsx)+";"+str(dsy)+";;"+str(dex)+";"+str(dey))
-            dxf.add_line((dsx,-dsy), (dex,-dey), layer, color, linetype=None)
-    #say (data)
-    
-say("--> "+out_filename+" written")
+                    head = _line_head(buf, line + head_at)
+                    keep = head is None or head in board_heads
+                    in_footprint = head in FOOTPRINT_HEADS and footprint_heads is not None
+            if is_child:
+                child_pos = buf.find(child_marker, line, end)
+            else:
+                pos = buf.find(marker, line, end)
+                child_pos = buf.find(child_marker, line, end) if in_footprint else -1
+        depth += buf.count('(', done, end) - buf.count(')', done, end)
+        if keep:
+            tokens += findall(buf, start, end)
+        elif depth < region_depth:
+            tokens += [')'] * (region_depth - depth)
+            region_depth = depth
+        yield tokens
+    if tail and keep:
+        yield findall(tail)
+
+
+def _unquote(tok):
+    tok = tok[1:-1]
+    if '\\"' in tok:
+        tok = tok.replace('\\"', '"')
+    return tok
+
+
+def parse_leaf(tok):
+    # '(xy 1 2)' -> ['xy', '1', '2']
+    inner = tok[1:-1]
+    if '"' not in inner:
+        return inner.split()
+    return [_unquote(t) if t[0] == '"' else t for t in _TOKEN_RE.findall(inner)]
+
+# node events produced by SexprEventParser, each one is (kind, node) where node
+# is a nested list ['head', 'atom', ['child', ...], ...]
+EV_FOOTPRINT_ENTER = 'footprint_enter'
+EV_FOOTPRINT_EXIT = 'footprint_exit'
+EV_PRIMITIVE = 'primitive'
+EV_TEXT = 'text'
+EV_DIMENSION = 'dimension'
+_EV_FOOTPRINT_ATTR = 'footprint_attr'
+
+FOOTPRINT_HEADS = frozenset(('module', 'footprint'))
+# elements collected at board level (direct children of kicad_pcb)
+BOARD_EVENT_HEADS = {
+    'gr_line': EV_PRIMITIVE,
+    'gr_circle': EV_PRIMITIVE,
+    'gr_arc': EV_PRIMITIVE,
+    'gr_text': EV_TEXT,
+    'dimension': EV_DIMENSION,
+}
+# top level elements the tokenizer does not skip
+BOARD_HEADS = FOOTPRINT_HEADS | frozenset(BOARD_EVENT_HEADS)
+# elements collected as direct children of a footprint
+FOOTPRINT_EVENT_HEADS = {
+    'fp_line': EV_PRIMITIVE,
+    'fp_circle': EV_PRIMITIVE,
+    'fp_arc': EV_PRIMITIVE,
+    'at': _EV_FOOTPRINT_ATTR,
+    'layer': _EV_FOOTPRINT_ATTR,
+}
+
+
+class SexprEventParser(object):
+    # incremental parser: feed() token lists as they come from
+    # iter_token_chunks() and get back the completed node events
+    def __init__(self):
+        self.depth = 0
+        self._head = False
+        self._stack = []  # nodes of the element being collected
+        self._kind = None
+        self._footprint = None  # header node of the open footprint
+        self._entered = False
+
+    def feed(self, tokens):
+        events = []
+        emit = events.append
+        stack = self._stack
+        depth = self.depth
+        head = self._head
+        kind = self._kind
+        footprint = self._footprint
+        for tok in tokens:
+            if head:
+                head = False
+                if stack:
+                    node = [tok]
+                    stack[-1].append(node)
+                    stack.append(node)
+                elif depth == 2:
+                    kind = BOARD_EVENT_HEADS.get(tok)
+                    if kind is not None:
+                        stack.append([tok])
+                    elif tok in FOOTPRINT_HEADS:
+                        footprint = [tok]
+                        self._entered = False
+                elif depth == 3 and footprint is not None:
+                    kind = FOOTPRINT_EVENT_HEADS.get(tok)
+                    if kind is not None:
+                        stack.append([tok])
+            elif tok == '(':
+                depth += 1
+                head = True
+            elif tok == ')':
+                if stack:
+                    node = stack.pop()
+                    if not stack:
+                        if kind is _EV_FOOTPRINT_ATTR:
+                            footprint.append(node)
+                        else:
+                            if footprint is not None and not self._entered:
+                                emit((EV_FOOTPRINT_ENTER, footprint))
+                                self._entered = True
+                            emit((kind, node))
+                elif depth == 2 and footprint is not None:
+                    if self._entered:
+                        emit((EV_FOOTPRINT_EXIT, footprint))
+                    footprint = None
+                depth -= 1
+            elif tok[0] == '(':  # leaf
+                if stack:
+                    inner = tok[1:-1]
+                    stack[-1].append(inner.split() if '"' not in inner else parse_leaf(tok))
+                elif depth == 2 and footprint is not None:
+                    node = parse_leaf(tok)
+                    if FOOTPRINT_EVENT_HEADS.get(node[0]) is _EV_FOOTPRINT_ATTR:
+                        footprint.append(node)
+            elif stack:
+                if tok[0] == '"':
+                    tok = _unquote(tok)
+                stack[-1].append(tok)
+            elif depth == 2 and footprint is not None and len(footprint) == 1:
+                footprint.append(_unquote(tok) if tok[0] == '"' else tok)  # footprint name
+        self.depth = depth
+        self._head = head
+        self._kind = kind
+        self._footprint = footprint
+        return events
+
+
+def iter_events(stream, chunk_size=READ_CHUNK_SIZE):
+    parser = SexprEventParser()
+    for tokens in iter_token_chunks(stream, chunk_size, BOARD_HEADS, FOOTPRINT_EVENT_HEADS):
+        for event in parser.feed(tokens):
+            yield event
+
+###################################################################
+## memory mapped skip-ahead scanner
+# works on the bytes of a memory mapped board. A regex finds the next line
+# that starts an element we want, at kicad's indentation for top level
+# elements (or for the children of a footprint), and everything before it
+# is jumped over: zones, tracks, vias, pads... are never decoded nor
+# tokenized, only their parens are counted (bytes.count) to check that the
+# candidate is really a sibling and not a line nested deeper.
+# Primitives on layers that are not exported are dropped here too, from
+# their (layer ...) before being decoded.
+
+_INDENT_RE_B = re.compile(br'\n([ \t]*)\(')
+_LAYER_RE_B = re.compile(br'\(layer\s+"?([^\s()"]+)')
+_LAYERED_HEADS = frozenset(('gr_line', 'gr_circle', 'gr_arc', 'gr_text', 'dimension',
+                            'fp_line', 'fp_circle', 'fp_arc'))
+_TOKEN_BATCH = 1 << 14
+
+
+def _balance(mm, start, stop):
+    chunk = mm[start:stop]
+    return chunk.count(b'(') - chunk.count(b')')
+
+
+def _heads_re(marker, heads):
+    return re.compile(re.escape(marker) + b'(' + b'|'.join(
+        re.escape(head.encode('ascii')) for head in sorted(heads)) + br')(?=[\s()])')
+
+
+def _element_end(mm, marker, line, stop):
+    # end of the element starting on line: the next marker line where its
+    # parens are balanced, or stop
+    bal = 0
+    done = line
+    pos = mm.find(marker, line, stop)
+    while pos >= 0:
+        bal += _balance(mm, done, pos + 1)
+        done = pos + 1
+        if bal == 0:
+            return done
+        pos = mm.find(marker, done, stop)
+    return stop
+
+
+def _iter_wanted(mm, marker, heads_re, start, stop):
+    # (begin, end, head) of the sibling elements in mm[start:stop] whose head
+    # matches heads_re; start must be a sibling line start
+    pos = done = start
+    bal = 0
+    while True:
+        m = heads_re.search(mm, pos - 1, stop)  # the marker starts on the '\n'
+        if m is None:
+            return
+        line = m.start() + 1
+        bal += _balance(mm, done, line)
+        done = pos = line
+        if bal != 0:  # nested deeper than the siblings, keep looking
+            pos += 2
+            continue
+        end = _element_end(mm, marker, line, stop)
+        yield line, end, m.group(1).decode('ascii')
+        pos = done = end
+
+
+def _layer_wanted(mm, head, start, stop, layer_filter):
+    if layer_filter is None or head not in _LAYERED_HEADS:
+        return True
+    m = _LAYER_RE_B.search(mm, start, stop)
+    return m is None or bool(layer_filter(m.group(1).decode('utf-8', 'replace')))
+
+
+def iter_mmap_elements(mm, layer_filter=None, board_heads=BOARD_HEADS,
+                       footprint_heads=FOOTPRINT_EVENT_HEADS):
+    # (start, stop, tokens) of the top level elements of the mapped board mm
+    # that can produce entities, mm[start:stop] their source and tokens() the
+    # token list, built on call; start is None for tokens that are not a
+    # whole element (the root line, a board without kicad's layout).
+    # layer_filter(kicad layer name) -> bool drops primitives on layers that
+    # are not exported
+    findall = _TOKEN_RE.findall
+    size = len(mm)
+    depth = done = 0
+    marker = None
+    for m in _INDENT_RE_B.finditer(mm):
+        line = m.start() + 1
+        depth += _balance(mm, done, line)
+        done = line
+        if depth == 1:
+            marker = b'\n' + m.group(1) + b'('
+            break
+    if marker is None:  # no kicad layout, tokenize everything
+        mm.seek(0)
+        for tokens in iter_token_chunks(mm, READ_CHUNK_SIZE, board_heads, footprint_heads):
+            yield None, None, partial(list, tokens)
+        return
+    child_marker = b'\n' + marker[1:-1] * 2 + b'('
+    board_re = _heads_re(marker, board_heads)
+    footprint_re = _heads_re(child_marker, footprint_heads)
+
+    def element_tokens(start, stop, head):
+        if head not in FOOTPRINT_HEADS:
+            return findall(mm[start:stop].decode('utf-8', 'replace'))
+        header = mm.find(child_marker, start, stop) + 1
+        if header == 0 or _balance(mm, start, header) != 1:  # unusual layout
+            return findall(mm[start:stop].decode('utf-8', 'replace'))
+        tokens = findall(mm[start:header].decode('utf-8', 'replace'))
+        done = header
+        for cstart, cstop, chead in _iter_wanted(mm, child_marker, footprint_re, header, stop):
+            if _layer_wanted(mm, chead, cstart, cstop, layer_filter):
+                tokens += findall(mm[cstart:cstop].decode('utf-8', 'replace'))
+                done = cstop
+        if done < stop:  # the skipped children and the footprint end
+            bal = _balance(mm, done, stop)
+            if bal < 0:
+                tokens += [')'] * -bal
+        return tokens
+
+    root = findall(mm[0:done].decode('utf-8', 'replace'))
+    yield None, None, partial(list, root)
+    for start, stop, head in _iter_wanted(mm, marker, board_re, done, size):
+        if _layer_wanted(mm, head, start, stop, layer_filter):
+            yield start, stop, partial(element_tokens, start, stop, head)
+
+
+def iter_mmap_token_chunks(mm, layer_filter=None, board_heads=BOARD_HEADS,
+                           footprint_heads=FOOTPRINT_EVENT_HEADS):
+    # the tokens of iter_mmap_elements() in lists of about _TOKEN_BATCH
+    tokens = []
+    for start, stop, element in iter_mmap_elements(mm, layer_filter, board_heads, footprint_heads):
+        tokens += element()
+        if len(tokens) > _TOKEN_BATCH:
+            yield tokens
+            tokens = []
+    if tokens:
+        yield tokens
+
+
+def iter_mmap_events(mm, layer_filter=None):
+    parser = SexprEventParser()
+    for tokens in iter_mmap_token_chunks(mm, layer_filter):
+        for event in parser.feed(tokens):
+            yield event
+
+###################################################################
+## node helpers
+
+
+def node_children(node):
+    # head -> child list, for nodes read many times
+    return {child[0]: child for child in node if type(child) is list}
+
+
+def node_child(node, head):
+    for child in node:
+        if type(child) is list and child[0] == head:
+            return child
+    return None
+
+
+def node_layer(node):
+    child = node_child(node, 'layer')
+    if child is None:
+        return None
+    return child[1]
+
+
+def node_at(node):
+    # (at x y [rot]) -> x, y, rot
+    child = node_child(node, 'at')
+    if child is None:
+        return 0., 0., 0.
+    rot = 0.
+    if len(child) > 3 and type(child[3]) is not list:
+        try:
+            rot = float(child[3])
+        except ValueError:  # (at x y unlocked)
+            pass
+    return float(child[1]), float(child[2]), rot
+
+###################################################################
+## mechanical layers
+
+# kicad layer -> (dxf layer, color), kicad 5 and kicad 6+ names
+LAYER_MAP = {
+    'Dwgs.User': (0, None),
+    'User.Drawings': (0, None),
+    'Cmts.User': ('Cmts', 1),
+    'User.Comments': ('Cmts', 1),
+    'Edge.Cuts': ('Edge', 2),
+    'Eco1.User': ('Eco1', 3),
+    'User.Eco1': ('Eco1', 3),
+    'Eco2.User': ('Eco2', 4),
+    'User.Eco2': ('Eco2', 4),
+    'F.Fab': ('FFab', 5),
+    'B.Fab': ('BFab', 6),
+    'F.CrtYd': ('FCrtYd', 7),
+    'F.Courtyard': ('FCrtYd', 7),
+    'B.CrtYd': ('BCrtYd', 8),
+    'B.Courtyard': ('BCrtYd', 8),
+}
+
+# other names of dxf layers accepted in layers=[...]
+LAYER_ALIASES = {'Dwgs': 0}
+
+
+def classify_layer(name, layer_map=None):
+    # kicad layer name -> (dxf layer, color) or None if not exported
+    if layer_map is None:
+        layer_map = LAYER_MAP
+    return layer_map.get(name)
+
+
+def load_layer_map(path, base=None):
+    # reads a layer map file, one kicad layer per line:
+    #   # kicad layer   dxf layer   [color]
+    #   Edge.Cuts       Outline     2
+    #   User.1          Extra
+    #   F.Fab           -
+    # entries are added to base (default LAYER_MAP), a - dxf layer stops
+    # exporting the kicad layer
+    layer_map = dict(LAYER_MAP if base is None else base)
+    with io.open(os.path.expanduser(path), encoding='utf-8') as f:
+        for n, line in enumerate(f, 1):
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) not in (2, 3):
+                raise ValueError("%s:%d: expected 'kicad_layer dxf_layer [color]'" % (path, n))
+            if fields[1] == '-':
+                layer_map.pop(fields[0], None)
+                continue
+            color = None
+            if len(fields) == 3:
+                try:
+                    color = int(fields[2])
+                except ValueError:
+                    color = -1
+                if not 0 <= color < 257:
+                    raise ValueError("%s:%d: color has to be an integer in the range from 0 to 256." % (path, n))
+            layer_map[fields[0]] = (fields[1], color)
+    return layer_map
+
+
+def resolve_layers(names, layer_map=None):
+    # kicad layer names, dxf layer names or aliases -> set of dxf layers
+    if layer_map is None:
+        layer_map = LAYER_MAP
+    layers_of_map = set(cls[0] for cls in layer_map.values())
+    dxf_layers = dict((str(layer), layer) for layer in layers_of_map)
+    layers = set()
+    for name in names:
+        if name in layer_map:
+            layers.add(layer_map[name][0])
+        elif name in dxf_layers:
+            layers.add(dxf_layers[name])
+        elif name in LAYER_ALIASES and LAYER_ALIASES[name] in layers_of_map:
+            layers.add(LAYER_ALIASES[name])
+        else:
+            raise ValueError("%s is not a mechanical layer." % name)
+    return layers
+
+
+def arc_from_3_points(start, mid, end):
+    # kicad 6+ arcs: (start)(mid)(end) -> center, radius, start and end angle
+    # of the counter clockwise dxf arc; None for collinear points
+    ax, ay = start
+    bx, by = mid
+    cx, cy = end
+    d = 2. * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if d == 0:
+        return None
+    a2 = ax * ax + ay * ay
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    ux = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d
+    uy = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d
+    startAngle = degrees(atan2(ay - uy, ax - ux))
+    endAngle = degrees(atan2(cy - uy, cx - ux))
+    if d < 0:  # clockwise
+        startAngle, endAngle = endAngle, startAngle
+    return (ux, uy, 0), hypot(ax - ux, ay - uy), startAngle, endAngle
+
+###################################################################
+## placement transforms
+# one 2d affine matrix per footprint maps its local kicad coordinates (y down)
+# straight to dxf (y up), placement and rotation folded in; the points of all
+# the footprint primitives go through it in one pass.
+
+TRANSFORM_NUMPY_POINTS = 4096  # batches from this size transformed with numpy
+
+
+def _cos_sin(angle):
+    # exact for multiples of 90 degrees, so placed points keep their digits
+    q, rest = divmod(angle, 90.)
+    if rest == 0:
+        return ((1., 0.), (0., 1.), (-1., 0.), (0., -1.))[int(q) % 4]
+    a = radians(angle)
+    return cos(a), sin(a)
+
+
+class Affine(object):
+    # x' = a x + b y + c, y' = d x + e y + f
+    __slots__ = ('a', 'b', 'c', 'd', 'e', 'f')
+
+    def __init__(self, a=1., b=0., c=0., d=0., e=1., f=0.):
+        self.a = a; self.b = b; self.c = c
+        self.d = d; self.e = e; self.f = f
+
+    @classmethod
+    def translation(cls, x, y):
+        return cls(1., 0., x, 0., 1., y)
+
+    @classmethod
+    def rotation(cls, angle):
+        # counter clockwise, in degrees
+        c, s = _cos_sin(angle)
+        return cls(c, -s, 0., s, c, 0.)
+
+    @classmethod
+    def scale(cls, sx, sy):
+        return cls(sx, 0., 0., 0., sy, 0.)
+
+    @classmethod
+    def placement(cls, x, y, rot=0., mirror=False):
+        # kicad local coordinates of an item at (at x y rot) -> dxf; mirror
+        # flips the local x first (footprint seen from the back)
+        c, s = _cos_sin(rot)
+        m = -1. if mirror else 1.
+        return cls(m * c, s, x, m * s, -c, -y)
+
+    def __mul__(self, other):
+        # self after other
+        return Affine(self.a * other.a + self.b * other.d,
+                      self.a * other.b + self.b * other.e,
+                      self.a * other.c + self.b * other.f + self.c,
+                      self.d * other.a + self.e * other.d,
+                      self.d * other.b + self.e * other.e,
+                      self.d * other.c + self.e * other.f + self.f)
+
+    def __repr__(self):
+        return 'Affine(%r, %r, %r, %r, %r, %r)' % (self.a, self.b, self.c, self.d, self.e, self.f)
+
+    @property
+    def det(self):
+        # < 0 when the transform mirrors (y flip of kicad -> dxf included)
+        return self.a * self.e - self.b * self.d
+
+    def apply(self, x, y):
+        return self.a * x + self.b * y + self.c, self.d * x + self.e * y + self.f
+
+    def points(self, coords):
+        # flat [x0, y0, x1, y1, ...] -> transformed flat list; zero terms of
+        # axis aligned placements are skipped, that also keeps x + ox exact
+        a, b, c, d, e, f = self.a, self.b, self.c, self.d, self.e, self.f
+        if numpy is not None and len(coords) >= TRANSFORM_NUMPY_POINTS:
+            xy = numpy.array(coords, dtype=float).reshape(-1, 2)
+            xs, ys = xy[:, 0], xy[:, 1]
+            out = numpy.empty_like(xy)
+            if b == 0 and d == 0:
+                out[:, 0] = a * xs + c
+                out[:, 1] = e * ys + f
+            elif a == 0 and e == 0:
+                out[:, 0] = b * ys + c
+                out[:, 1] = d * xs + f
+            else:
+                out[:, 0] = a * xs + b * ys + c
+                out[:, 1] = d * xs + e * ys + f
+            return out.ravel().tolist()
+        xs = coords[0::2]
+        ys = coords[1::2]
+        out = coords[:]
+        if b == 0 and d == 0:
+            out[0::2] = [a * x + c for x in xs]
+            out[1::2] = [e * y + f for y in ys]
+        elif a == 0 and e == 0:
+            out[0::2] = [b * y + c for y in ys]
+            out[1::2] = [d * x + f for x in xs]
+        else:
+            out[0::2] = [a * x + b * y + c for x, y in zip(xs, ys)]
+            out[1::2] = [d * x + e * y + f for x, y in zip(xs, ys)]
+        return out
+
+
+IDENTITY = Affine()
+BOARD_TRANSFORM = Affine.placement(0., 0.)  # board coordinates -> dxf
+
+###################################################################
+## conversion
+
+# kicad 5 dimensions store the drawn lines
+DIMENSION_LINE_HEADS = frozenset(('feature1', 'feature2', 'crossbar',
+                                  'arrow1a', 'arrow1b', 'arrow2a', 'arrow2b'))
+
+
+class EntityRecorder(object):
+    # writer stand-in keeping the add_* calls, to compare and replay them
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if not name.startswith('add_'):
+            raise AttributeError(name)
+
+        def record(*args, **kwargs):
+            self.calls.append((name, args, tuple(sorted(kwargs.items()))))
+        return record
+
+    @staticmethod
+    def replay(calls, dxf):
+        for name, args, kwargs in calls:
+            getattr(dxf, name)(*args, **dict(kwargs))
+
+
+_BLOCK_NAME_RE = re.compile(r'[^A-Za-z0-9_$-]')
+
+
+def block_name(name, taken):
+    # footprint name -> dxf block name not in taken
+    name = _BLOCK_NAME_RE.sub('_', name) or 'FP'
+    unique = name
+    n = 1
+    while unique in taken:
+        n += 1
+        unique = '%s_%d' % (name, n)
+    return unique
+
+
+# primitive head -> (drawing method, placed in a footprint)
+PRIMITIVES = {
+    'gr_line': ('line', False),
+    'gr_circle': ('circle', False),
+    'gr_arc': ('arc', False),
+    'fp_line': ('line', True),
+    'fp_circle': ('circle', True),
+    'fp_arc': ('arc', True),
+}
+
+LINE_RUN = 64  # consecutive lines of a layer written with add_lines
+
+# drawing method -> children holding its points, in transform order
+PRIMITIVE_POINTS = {
+    'line': ('start', 'end'),
+    'circle': ('center', 'end'),
+    'arc': ('start', 'end', 'mid'),  # no mid in kicad 5
+}
+
+
+class PcbDxfConverter(object):
+    # consumes node events and writes the mechanical layers to a dxf writer
+    def __init__(self, dxf, quote_layer=False, quote_color=127, layers=None, layer_map=None, blocks=False):
+        self.dxf = dxf
+        self.writer = dxf  # the dxf writer, under any wrapper set as dxf
+        # blocks True to write every footprint as an INSERT of a block shared
+        # by the footprints with the same local geometry
+        self.blocks = {} if blocks else None  # recorded calls -> block name
+        self.font = None  # StrokeFont drawing the texts, None for TEXT entities
+        self._block_names = set()
+        self._placed = None
+        # quote_layer True to move all quote on special layer
+        self.quote_layer = quote_layer
+        self.quote_color = quote_color
+        # layers: kicad or dxf names of the layers to export, None for all
+        if layer_map is None:
+            layer_map = LAYER_MAP
+        self.classes = dict(layer_map)
+        if layers is not None:
+            dxf_layers = resolve_layers(layers, layer_map)
+            self.classes = dict((name, cls) for name, cls in layer_map.items() if cls[0] in dxf_layers)
+        self.handlers = {
+            EV_PRIMITIVE: self.primitive,
+            EV_FOOTPRINT_ENTER: self.footprint_enter,
+            EV_FOOTPRINT_EXIT: self.footprint_exit,
+            EV_TEXT: self.text,
+            EV_DIMENSION: self.dimension,
+        }
+        self.drawers = dict((head, (method, placed, PRIMITIVE_POINTS[method]))
+                            for head, (method, placed) in PRIMITIVES.items())
+        self.draws = dict((method, getattr(self, method)) for method in PRIMITIVE_POINTS)
+        # transform stack: dxf placement of the board being converted
+        self.transforms = [IDENTITY]
+        self.transform = BOARD_TRANSFORM  # board coordinates -> dxf
+        self.placed = BOARD_TRANSFORM  # footprint coordinates -> dxf
+        # run of primitives under the same transform: (transform, local
+        # points, items), drawn in order by flush
+        self.run = (None, [], [])
+        self.footprints = 0
+        self.skipped = Counter()  # head -> elements on layers not exported
+        self.timer = None  # PhaseTimer of the transforms, with the stats option
+
+    def classify(self, name):
+        # kicad layer name -> (dxf layer, color), None if not exported
+        return self.classes.get(name)
+
+    def convert(self, events):
+        handlers = self.handlers
+        for kind, node in events:
+            handlers[kind](node)
+        self.flush()
+
+    def placement(self, x, y, rot=0.):
+        # kicad coordinates at x, y, rot -> dxf, under the transform stack
+        t = Affine.placement(x, y, rot)
+        parent = self.transforms[-1]
+        return t if parent is IDENTITY else parent * t
+
+    def push_transform(self, t):
+        self.transforms.append(t if self.transforms[-1] is IDENTITY else self.transforms[-1] * t)
+        self.transform = self.placement(0., 0.)
+
+    def pop_transform(self):
+        self.transforms.pop()
+        self.transform = self.placement(0., 0.)
+
+    def footprint_enter(self, node):
+        x, y, rot = node_at(node)
+        self.footprints += 1
+        self.flush()
+        if self.blocks is None:
+            self.placed = self.placement(x, y, rot)
+            self.run = (self.placed, [], [])
+            return
+        # block mode: record the local geometry, placed on exit
+        self._placed = (self.dxf, node, x, y, rot)
+        self.dxf = EntityRecorder()
+
+    def footprint_exit(self, node):
+        self.flush()
+        self.placed = BOARD_TRANSFORM
+        if self._placed is not None:
+            recorder = self.dxf
+            self.dxf, node, x, y, rot = self._placed
+            self._placed = None
+            self.insert_footprint(node, recorder.calls, x, y, rot)
+
+    def insert_footprint(self, node, calls, x, y, rot):
+        # one INSERT of the block of this local geometry, defined on first use
+        if not calls:
+            return
+        key = tuple(calls)
+        name = self.blocks.get(key)
+        if name is None:
+            name = block_name(node[1] if len(node) > 1 and type(node[1]) is not list else node[0],
+                              self._block_names)
+            self._block_names.add(name)
+            self.writer.begin_block(name)
+            EntityRecorder.replay(calls, self.writer)
+            self.writer.end_block()
+            self.blocks[key] = name
+        self.dxf.add_insert(name, (x, -y), rot)
+
+    def primitive(self, node):
+        children = node_children(node)
+        layer_node = children.get('layer')
+        if layer_node is None:
+            return
+        cls = self.classes.get(layer_node[1])
+        if cls is None:
+            self.skipped[node[0]] += 1
+            return
+        method, placed, heads = self.drawers[node[0]]
+        t = self.placed if placed else self.transform
+        t_run, coords, items = self.run
+        if t_run is not t or len(items) >= BULK_ROWS:
+            if items:
+                self.flush()
+            t_run, coords, items = self.run = (t, [], [])
+        for head in heads:
+            point = children.get(head)
+            if point is not None:
+                coords += (float(point[1]), float(point[2]))
+        items.append((method, children, cls[0], cls[1]))
+
+    def flush(self):
+        # draw the pending run: all its points transformed in one pass
+        t, coords, items = self.run
+        if not items:
+            return
+        self.run = (None, [], [])
+        pts = t.points(coords) if self.timer is None else self.timer.call('transform', t.points, coords)
+        if numpy is not None and len(items) >= LINE_RUN and getattr(type(self.dxf), 'bulk_lines', False):
+            self.draw_line_runs(items, pts, t)
+            return
+        draws = self.draws
+        add_line = self.dxf.add_line
+        i = 0
+        for method, children, layer, color in items:
+            if method == 'line':  # most of them, drawn here
+                add_line((pts[i], pts[i + 1]), (pts[i + 2], pts[i + 3]), layer, color, linetype=None)
+                i += 4
+            else:
+                i = draws[method](children, pts, i, layer, color, t)
+
+    def draw_line_runs(self, items, pts, t):
+        # as flush, with LINE_RUN or more consecutive lines of a layer given
+        # to the bulk writer, formatted vectorized
+        draws = self.draws
+        n = len(items)
+        i = j = 0
+        while j < n:
+            method, children, layer, color = items[j]
+            k = j + 1
+            if method == 'line':
+                while k < n and items[k][0] == 'line' and items[k][2] == layer and items[k][3] == color:
+                    k += 1
+                if k - j >= LINE_RUN:
+                    ends = numpy.array(pts[i:i + 4 * (k - j)], dtype=float).reshape(-1, 4)
+                    self.dxf.add_lines(ends[:, :2], ends[:, 2:], layer, color)
+                    i += 4 * (k - j)
+                    j = k
+                    continue
+            for method, children, layer, color in items[j:k]:
+                i = draws[method](children, pts, i, layer, color, t)
+            j = k
+
+    # drawers: children and transformed points from index i -> next index
+
+    def line(self, children, pts, i, layer, color, t):
+        self.dxf.add_line((pts[i], pts[i + 1]), (pts[i + 2], pts[i + 3]), layer, color, linetype=None)
+        return i + 4
+
+    def circle(self, children, pts, i, layer, color, t):
+        cx, cy, xe, ye = pts[i:i + 4]
+        r = sqrt((cx - xe) ** 2 + (cy - ye) ** 2)
+        self.dxf.add_circle((cx, cy), r, layer, color, linetype=None)
+        return i + 4
+
+    def arc(self, children, pts, i, layer, color, t):
+        if 'mid' not in children:  # kicad 5: (start center) (end arc start) (angle a)
+            cx, cy, xe, ye = pts[i:i + 4]
+            arc_angle = float(children['angle'][1])
+            if t.det > 0:  # mirrored placement, the y flip undone
+                arc_angle = -arc_angle
+            if arc_angle < 0:
+                startAngle = degrees(atan2(ye - cy, xe - cx))
+                endAngle = (startAngle - arc_angle)
+            else:
+                endAngle = degrees(atan2(ye - cy, xe - cx))
+                startAngle = (endAngle - arc_angle)
+            center = (cx, cy, 0)  # int or float
+            r = sqrt((cx - xe) ** 2 + (cy - ye) ** 2)
+            self.dxf.add_arc(center, r, startAngle, endAngle, layer, color, linetype=None)
+            return i + 4
+        # kicad 6+: start, end, mid
+        xs, ys, xe, ye, xm, ym = pts[i:i + 6]
+        arc = arc_from_3_points((xs, ys), (xm, ym), (xe, ye))
+        if arc is None:
+            self.dxf.add_line((xs, ys), (xe, ye), layer, color, linetype=None)
+        else:
+            center, r, startAngle, endAngle = arc
+            self.dxf.add_arc(center, r, startAngle, endAngle, layer, color, linetype=None)
+        return i + 6
+
+    def text(self, node, align="LEFT", dimension=False):
+        cls = self.classify(node_layer(node))
+        if cls is None:
+            if not dimension:
+                self.skipped[node[0]] += 1
+            return
+        self.flush()
+        layer, color = cls
+        #(gr_text Rotate (at 325.374 52.705 15) (layer Eco2.User)
+        text = node[1].replace("\"", "").replace("\'", "")
+        px, py, rot = node_at(node)
+        size = node_child(node_child(node_child(node, 'effects'), 'font'), 'size')
+        sizeX = float(size[1])
+        sizeY = float(size[2])
+        if dimension and self.quote_layer:
+            color = self.quote_color
+            layer = "Quote"
+        mirror = False
+        if self.font is not None:  # (justify [left|right] [mirror])
+            justify = node_child(node_child(node, 'effects'), 'justify')
+            mirror = justify is not None and 'mirror' in justify[1:]
+        # multiline support
+        posY = -py
+        for txt in text.split("\\n"):
+            if self.font is None:
+                self.dxf.add_text(txt, (px, posY), sizeX, sizeY, align, rot, 0., 'SIMPLEX', layer, color)
+            else:
+                self.font.add_text(self.dxf, txt, (px, posY), sizeX, sizeY, align, rot, mirror, layer, color)
+            posY = posY - sizeY * 1.3
+
+    def dimension(self, node):
+        cls = self.classify(node_layer(node))
+        if cls is None:
+            self.skipped[node[0]] += 1
+            return
+        self.flush()
+        layer, color = cls
+        text = node_child(node, 'gr_text')
+        if text is not None:
+            self.text(text, "MIDDLE_CENTER", dimension=True)
+        if node_child(node, 'crossbar') is not None:
+            for child in node[1:]:
+                if type(child) is list and child[0] in DIMENSION_LINE_HEADS:
+                    pts = node_child(child, 'pts')
+                    dsx, dsy = float(pts[1][1]), float(pts[1][2])
+                    dex, dey = float(pts[2][1]), float(pts[2][2])
+                    self.dxf.add_line((dsx, -dsy), (dex, -dey), layer, color, linetype=None)
+        else:
+            for start, end in aligned_dimension_lines(node):
+                self.dxf.add_line((start[0], -start[1]), (end[0], -end[1]), layer, color, linetype=None)
+
+
+def _style_value(style, head, default):
+    child = node_child(style, head) if style is not None else None
+    if child is None:
+        return default
+    return float(child[1])
+
+
+def aligned_dimension_lines(node):
+    # kicad 6+ dimensions only store the measured points, rebuild the aligned
+    # dimension drawing (extension lines, crossbar, arrows) in board coords
+    pts = node_child(node, 'pts')
+    height = node_child(node, 'height')
+    if pts is None or height is None or len(pts) < 3:
+        return []
+    typ = node_child(node, 'type')
+    if typ is not None and typ[1] != 'aligned':
+        return []
+    (x0, y0), (x1, y1) = [(float(p[1]), float(p[2])) for p in pts[1:3]]
+    height = float(height[1])
+    style = node_child(node, 'style')
+    ext_offset = _style_value(style, 'extension_offset', 0.)
+    ext_height = _style_value(style, 'extension_height', 0.58642)
+    arrow_length = _style_value(style, 'arrow_length', 1.27)
+    dx, dy = x1 - x0, y1 - y0
+    length = hypot(dx, dy)
+    if length == 0:
+        return []
+    nx, ny = (-dy / length, dx / length) if height > 0 else (dy / length, -dx / length)
+    h = abs(height)
+    lines = []
+    for x, y in ((x0, y0), (x1, y1)):
+        lines.append(((x + nx * ext_offset, y + ny * ext_offset),
+                      (x + nx * (h + ext_height), y + ny * (h + ext_height))))
+    c0 = (x0 + nx * h, y0 + ny * h)
+    c1 = (x1 + nx * h, y1 + ny * h)
+    lines.append((c0, c1))
+    ux, uy = dx / length, dy / length
+    for (px, py), sign in ((c0, 1.), (c1, -1.)):
+        for angle in (27.5, -27.5):
+            a = radians(angle)
+            ax = sign * (ux * cos(a) - uy * sin(a))
+            ay = sign * (ux * sin(a) + uy * cos(a))
+            lines.append(((px, py), (px + ax * arrow_length, py + ay * arrow_length)))
+    return lines
+
+###################################################################
+## stroke font
+# texts drawn with lines, for the tools that drop TEXT entities (laser and
+# CAM software) and to look the same in every CAD: the Hershey simplex
+# font, the roman glyphs the KiCad stroke font comes from, 21 units from
+# the baseline to the top of the capitals. A glyph is parsed once into its
+# strokes; its strokes scaled, mirrored and turned for a (height, width,
+# rotation, mirror) are kept in a bounded cache, so the thousandth
+# reference in the same size and angle is only moved to its place.
+
+STROKE_CAP = 21.  # font units from the baseline to the top of the capitals
+STROKE_DESCENT = 7.  # font units below the baseline
+STROKE_CACHE = 1 << 12  # transformed glyphs kept
+STROKE_MISSING = '?'  # drawn for the characters the font has not
+
+STROKE_GLYPHS = (  # ascii 32 to 126: advance, then x, y pairs; -1, -1 lifts the pen
+    (16, ()),  # space
+    (10, (5, 21, 5, 7, -1, -1, 5, 2, 4, 1, 5, 0, 6, 1, 5, 2)),  # !
+    (16, (4, 21, 4, 14, -1, -1, 12, 21, 12, 14)),  # "
+    (21, (11, 25, 4, -7, -1, -1, 17, 25, 10, -7, -1, -1, 4, 12, 18, 12, -1, -1, 3, 6, 17, 6)),  # #
+    (20, (8, 25, 8, -4, -1, -1, 12, 25, 12, -4, -1, -1, 17, 18, 15, 20, 12, 21, 8, 21, 5, 20, 3, 18, 3, 16,
+         4, 14, 5, 13, 7, 12, 13, 10, 15, 9, 16, 8, 17, 6, 17, 3, 15, 1, 12, 0, 8, 0, 5, 1, 3, 3)),  # $
+    (24, (21, 21, 3, 0, -1, -1, 8, 21, 10, 19, 10, 17, 9, 15, 7, 14, 5, 14, 3, 16, 3, 18, 4, 20, 6, 21, 8,
+         21, 10, 20, 13, 19, 16, 19, 19, 20, 21, 21, -1, -1, 17, 7, 15, 6, 14, 4, 14, 2, 16, 0, 18, 0,
+         20, 1, 21, 3, 21, 5, 19, 7, 17, 7)),  # %
+    (26, (23, 12, 23, 13, 22, 14, 21, 14, 20, 13, 19, 11, 17, 6, 15, 3, 13, 1, 11, 0, 7, 0, 5, 1, 4, 2, 3,
+         4, 3, 6, 4, 8, 5, 9, 12, 13, 13, 14, 14, 16, 14, 18, 13, 20, 11, 21, 9, 20, 8, 18, 8, 16, 9,
+         13, 11, 10, 16, 3, 18, 1, 20, 0, 22, 0, 23, 1, 23, 2)),  # &
+    (10, (5, 19, 4, 20, 5, 21, 6, 20, 6, 18, 5, 16, 4, 15)),  # '
+    (14, (11, 25, 9, 23, 7, 20, 5, 16, 4, 11, 4, 7, 5, 2, 7, -2, 9, -5, 11, -7)),  # (
+    (14, (3, 25, 5, 23, 7, 20, 9, 16, 10, 11, 10, 7, 9, 2, 7, -2, 5, -5, 3, -7)),  # )
+    (16, (8, 21, 8, 9, -1, -1, 3, 18, 13, 12, -1, -1, 13, 18, 3, 12)),  # *
+    (26, (13, 18, 13, 0, -1, -1, 4, 9, 22, 9)),  # +
+    (10, (6, 1, 5, 0, 4, 1, 5, 2, 6, 1, 6, -1, 5, -3, 4, -4)),  # ,
+    (26, (4, 9, 22, 9)),  # -
+    (10, (5, 2, 4, 1, 5, 0, 6, 1, 5, 2)),  # .
+    (22, (20, 25, 2, -7)),  # /
+    (20, (9, 21, 6, 20, 4, 17, 3, 12, 3, 9, 4, 4, 6, 1, 9, 0, 11, 0, 14, 1, 16, 4, 17, 9, 17, 12, 16, 17,
+         14, 20, 11, 21, 9, 21)),  # 0
+    (20, (6, 17, 8, 18, 11, 21, 11, 0)),  # 1
+    (20, (4, 16, 4, 17, 5, 19, 6, 20, 8, 21, 12, 21, 14, 20, 15, 19, 16, 17, 16, 15, 15, 13, 13, 10, 3, 0,
+         17, 0)),  # 2
+    (20, (5, 21, 16, 21, 10, 13, 13, 13, 15, 12, 16, 11, 17, 8, 17, 6, 16, 3, 14, 1, 11, 0, 8, 0, 5, 1, 4,
+         2, 3, 4)),  # 3
+    (20, (13, 21, 3, 7, 18, 7, -1, -1, 13, 21, 13, 0)),  # 4
+    (20, (15, 21, 5, 21, 4, 12, 5, 13, 8, 14, 11, 14, 14, 13, 16, 11, 17, 8, 17, 6, 16, 3, 14, 1, 11, 0, 8,
+         0, 5, 1, 4, 2, 3, 4)),  # 5
+    (20, (16, 18, 15, 20, 12, 21, 10, 21, 7, 20, 5, 17, 4, 12, 4, 7, 5, 3, 7, 1, 10, 0, 11, 0, 14, 1, 16, 3,
+         17, 6, 17, 7, 16, 10, 14, 12, 11, 13, 10, 13, 7, 12, 5, 10, 4, 7)),  # 6
+    (20, (17, 21, 7, 0, -1, -1, 3, 21, 17, 21)),  # 7
+    (20, (8, 21, 5, 20, 4, 18, 4, 16, 5, 14, 7, 13, 11, 12, 14, 11, 16, 9, 17, 7, 17, 4, 16, 2, 15, 1, 12,
+         0, 8, 0, 5, 1, 4, 2, 3, 4, 3, 7, 4, 9, 6, 11, 9, 12, 13, 13, 15, 14, 16, 16, 16, 18, 15, 20,
+         12, 21, 8, 21)),  # 8
+    (20, (16, 14, 15, 11, 13, 9, 10, 8, 9, 8, 6, 9, 4, 11, 3, 14, 3, 15, 4, 18, 6, 20, 9, 21, 10, 21, 13,
+         20, 15, 18, 16, 14, 16, 9, 15, 4, 13, 1, 10, 0, 8, 0, 5, 1, 4, 3)),  # 9
+    (10, (5, 14, 4, 13, 5, 12, 6, 13, 5, 14, -1, -1, 5, 2, 4, 1, 5, 0, 6, 1, 5, 2)),  # :
+    (10, (5, 14, 4, 13, 5, 12, 6, 13, 5, 14, -1, -1, 6, 1, 5, 0, 4, 1, 5, 2, 6, 1, 6, -1, 5, -3, 4, -4)),  # ;
+    (24, (20, 18, 4, 9, 20, 0)),  # <
+    (26, (4, 12, 22, 12, -1, -1, 4, 6, 22, 6)),  # =
+    (24, (4, 18, 20, 9, 4, 0)),  # >
+    (18, (3, 16, 3, 17, 4, 19, 5, 20, 7, 21, 11, 21, 13, 20, 14, 19, 15, 17, 15, 15, 14, 13, 13, 12, 9, 10,
+         9, 7, -1, -1, 9, 2, 8, 1, 9, 0, 10, 1, 9, 2)),  # ?
+    (27, (18, 13, 17, 15, 15, 16, 12, 16, 10, 15, 9, 14, 8, 11, 8, 8, 9, 6, 11, 5, 14, 5, 16, 6, 17, 8, -1,
+         -1, 12, 16, 10, 14, 9, 11, 9, 8, 10, 6, 11, 5, -1, -1, 18, 16, 17, 8, 17, 6, 19, 5, 21, 5, 23,
+         7, 24, 10, 24, 12, 23, 15, 22, 17, 20, 19, 18, 20, 15, 21, 12, 21, 9, 20, 7, 19, 5, 17, 4, 15,
+         3, 12, 3, 9, 4, 6, 5, 4, 7, 2, 9, 1, 12, 0, 15, 0, 18, 1, 20, 2, 21, 3, -1, -1, 19, 16, 18, 8,
+         18, 6, 19, 5)),  # @
+    (18, (9, 21, 1, 0, -1, -1, 9, 21, 17, 0, -1, -1, 4, 7, 14, 7)),  # A
+    (21, (4, 21, 4, 0, -1, -1, 4, 21, 13, 21, 16, 20, 17, 19, 18, 17, 18, 15, 17, 13, 16, 12, 13, 11, -1,
+         -1, 4, 11, 13, 11, 16, 10, 17, 9, 18, 7, 18, 4, 17, 2, 16, 1, 13, 0, 4, 0)),  # B
+    (21, (18, 16, 17, 18, 15, 20, 13, 21, 9, 21, 7, 20, 5, 18, 4, 16, 3, 13, 3, 8, 4, 5, 5, 3, 7, 1, 9, 0,
+         13, 0, 15, 1, 17, 3, 18, 5)),  # C
+    (21, (4, 21, 4, 0, -1, -1, 4, 21, 11, 21, 14, 20, 16, 18, 17, 16, 18, 13, 18, 8, 17, 5, 16, 3, 14, 1,
+         11, 0, 4, 0)),  # D
+    (19, (4, 21, 4, 0, -1, -1, 4, 21, 17, 21, -1, -1, 4, 11, 12, 11, -1, -1, 4, 0, 17, 0)),  # E
+    (18, (4, 21, 4, 0, -1, -1, 4, 21, 17, 21, -1, -1, 4, 11, 12, 11)),  # F
+    (21, (18, 16, 17, 18, 15, 20, 13, 21, 9, 21, 7, 20, 5, 18, 4, 16, 3, 13, 3, 8, 4, 5, 5, 3, 7, 1, 9, 0,
+         13, 0, 15, 1, 17, 3, 18, 5, 18, 8, -1, -1, 13, 8, 18, 8)),  # G
+    (22, (4, 21, 4, 0, -1, -1, 18, 21, 18, 0, -1, -1, 4, 11, 18, 11)),  # H
+    (8, (4, 21, 4, 0)),  # I
+    (16, (12, 21, 12, 5, 11, 2, 10, 1, 8, 0, 6, 0, 4, 1, 3, 2, 2, 5, 2, 7)),  # J
+    (21, (4, 21, 4, 0, -1, -1, 18, 21, 4, 7, -1, -1, 9, 12, 18, 0)),  # K
+    (17, (4, 21, 4, 0, -1, -1, 4, 0, 16, 0)),  # L
+    (24, (4, 21, 4, 0, -1, -1, 4, 21, 12, 0, -1, -1, 20, 21, 12, 0, -1, -1, 20, 21, 20, 0)),  # M
+    (22, (4, 21, 4, 0, -1, -1, 4, 21, 18, 0, -1, -1, 18, 21, 18, 0)),  # N
+    (22, (9, 21, 7, 20, 5, 18, 4, 16, 3, 13, 3, 8, 4, 5, 5, 3, 7, 1, 9, 0, 13, 0, 15, 1, 17, 3, 18, 5, 19,
+         8, 19, 13, 18, 16, 17, 18, 15, 20, 13, 21, 9, 21)),  # O
+    (21, (4, 21, 4, 0, -1, -1, 4, 21, 13, 21, 16, 20, 17, 19, 18, 17, 18, 14, 17, 12, 16, 11, 13, 10, 4,
+         10)),  # P
+    (22, (9, 21, 7, 20, 5, 18, 4, 16, 3, 13, 3, 8, 4, 5, 5, 3, 7, 1, 9, 0, 13, 0, 15, 1, 17, 3, 18, 5, 19,
+         8, 19, 13, 18, 16, 17, 18, 15, 20, 13, 21, 9, 21, -1, -1, 12, 4, 18, -2)),  # Q
+    (21, (4, 21, 4, 0, -1, -1, 4, 21, 13, 21, 16, 20, 17, 19, 18, 17, 18, 15, 17, 13, 16, 12, 13, 11, 4, 11,
+         -1, -1, 11, 11, 18, 0)),  # R
+    (20, (17, 18, 15, 20, 12, 21, 8, 21, 5, 20, 3, 18, 3, 16, 4, 14, 5, 13, 7, 12, 13, 10, 15, 9, 16, 8, 17,
+         6, 17, 3, 15, 1, 12, 0, 8, 0, 5, 1, 3, 3)),  # S
+    (16, (8, 21, 8, 0, -1, -1, 1, 21, 15, 21)),  # T
+    (22, (4, 21, 4, 6, 5, 3, 7, 1, 10, 0, 12, 0, 15, 1, 17, 3, 18, 6, 18, 21)),  # U
+    (18, (1, 21, 9, 0, -1, -1, 17, 21, 9, 0)),  # V
+    (24, (2, 21, 7, 0, -1, -1, 12, 21, 7, 0, -1, -1, 12, 21, 17, 0, -1, -1, 22, 21, 17, 0)),  # W
+    (20, (3, 21, 17, 0, -1, -1, 17, 21, 3, 0)),  # X
+    (18, (1, 21, 9, 11, 9, 0, -1, -1, 17, 21, 9, 11)),  # Y
+    (20, (17, 21, 3, 0, -1, -1, 3, 21, 17, 21, -1, -1, 3, 0, 17, 0)),  # Z
+    (14, (4, 25, 4, -7, -1, -1, 5, 25, 5, -7, -1, -1, 4, 25, 11, 25, -1, -1, 4, -7, 11, -7)),  # [
+    (14, (0, 21, 14, -3)),  # backslash
+    (14, (9, 25, 9, -7, -1, -1, 10, 25, 10, -7, -1, -1, 3, 25, 10, 25, -1, -1, 3, -7, 10, -7)),  # ]
+    (16, (6, 15, 8, 18, 10, 15, -1, -1, 3, 12, 8, 17, 13, 12, -1, -1, 8, 17, 8, 0)),  # ^
+    (16, (0, -2, 16, -2)),  # _
+    (10, (6, 21, 5, 20, 4, 18, 4, 16, 5, 15, 6, 16, 5, 17)),  # `
+    (19, (15, 14, 15, 0, -1, -1, 15, 11, 13, 13, 11, 14, 8, 14, 6, 13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0,
+         11, 0, 13, 1, 15, 3)),  # a
+    (19, (4, 21, 4, 0, -1, -1, 4, 11, 6, 13, 8, 14, 11, 14, 13, 13, 15, 11, 16, 8, 16, 6, 15, 3, 13, 1, 11,
+         0, 8, 0, 6, 1, 4, 3)),  # b
+    (18, (15, 11, 13, 13, 11, 14, 8, 14, 6, 13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0, 11, 0, 13, 1, 15, 3)),  # c
+    (19, (15, 21, 15, 0, -1, -1, 15, 11, 13, 13, 11, 14, 8, 14, 6, 13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0,
+         11, 0, 13, 1, 15, 3)),  # d
+    (18, (3, 8, 15, 8, 15, 10, 14, 12, 13, 13, 11, 14, 8, 14, 6, 13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0,
+         11, 0, 13, 1, 15, 3)),  # e
+    (12, (10, 21, 8, 21, 6, 20, 5, 17, 5, 0, -1, -1, 2, 14, 9, 14)),  # f
+    (19, (15, 14, 15, -2, 14, -5, 13, -6, 11, -7, 8, -7, 6, -6, -1, -1, 15, 11, 13, 13, 11, 14, 8, 14, 6,
+         13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0, 11, 0, 13, 1, 15, 3)),  # g
+    (19, (4, 21, 4, 0, -1, -1, 4, 10, 7, 13, 9, 14, 12, 14, 14, 13, 15, 10, 15, 0)),  # h
+    (8, (3, 21, 4, 20, 5, 21, 4, 22, 3, 21, -1, -1, 4, 14, 4, 0)),  # i
+    (10, (5, 21, 6, 20, 7, 21, 6, 22, 5, 21, -1, -1, 6, 14, 6, -3, 5, -6, 3, -7, 1, -7)),  # j
+    (17, (4, 21, 4, 0, -1, -1, 14, 14, 4, 4, -1, -1, 8, 8, 15, 0)),  # k
+    (8, (4, 21, 4, 0)),  # l
+    (30, (4, 14, 4, 0, -1, -1, 4, 10, 7, 13, 9, 14, 12, 14, 14, 13, 15, 10, 15, 0, -1, -1, 15, 10, 18, 13,
+         20, 14, 23, 14, 25, 13, 26, 10, 26, 0)),  # m
+    (19, (4, 14, 4, 0, -1, -1, 4, 10, 7, 13, 9, 14, 12, 14, 14, 13, 15, 10, 15, 0)),  # n
+    (19, (8, 14, 6, 13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0, 11, 0, 13, 1, 15, 3, 16, 6, 16, 8, 15, 11, 13,
+         13, 11, 14, 8, 14)),  # o
+    (19, (4, 14, 4, -7, -1, -1, 4, 11, 6, 13, 8, 14, 11, 14, 13, 13, 15, 11, 16, 8, 16, 6, 15, 3, 13, 1, 11,
+         0, 8, 0, 6, 1, 4, 3)),  # p
+    (19, (15, 14, 15, -7, -1, -1, 15, 11, 13, 13, 11, 14, 8, 14, 6, 13, 4, 11, 3, 8, 3, 6, 4, 3, 6, 1, 8, 0,
+         11, 0, 13, 1, 15, 3)),  # q
+    (13, (4, 14, 4, 0, -1, -1, 4, 8, 5, 11, 7, 13, 9, 14, 12, 14)),  # r
+    (17, (14, 11, 13, 13, 10, 14, 7, 14, 4, 13, 3, 11, 4, 9, 6, 8, 11, 7, 13, 6, 14, 4, 14, 3, 13, 1, 10, 0,
+         7, 0, 4, 1, 3, 3)),  # s
+    (12, (5, 21, 5, 4, 6, 1, 8, 0, 10, 0, -1, -1, 2, 14, 9, 14)),  # t
+    (19, (4, 14, 4, 4, 5, 1, 7, 0, 10, 0, 12, 1, 15, 4, -1, -1, 15, 14, 15, 0)),  # u
+    (16, (2, 14, 8, 0, -1, -1, 14, 14, 8, 0)),  # v
+    (22, (3, 14, 7, 0, -1, -1, 11, 14, 7, 0, -1, -1, 11, 14, 15, 0, -1, -1, 19, 14, 15, 0)),  # w
+    (17, (3, 14, 14, 0, -1, -1, 14, 14, 3, 0)),  # x
+    (16, (2, 14, 8, 0, -1, -1, 14, 14, 8, 0, 6, -4, 4, -6, 2, -7, 1, -7)),  # y
+    (17, (14, 14, 3, 0, -1, -1, 3, 14, 14, 14, -1, -1, 3, 0, 14, 0)),  # z
+    (14, (9, 25, 7, 24, 6, 23, 5, 21, 5, 19, 6, 17, 7, 16, 8, 14, 8, 12, 6, 10, -1, -1, 7, 24, 6, 22, 6, 20,
+         7, 18, 8, 17, 9, 15, 9, 13, 8, 11, 4, 9, 8, 7, 9, 5, 9, 3, 8, 1, 7, 0, 6, -2, 6, -4, 7, -6, -1,
+         -1, 6, 8, 8, 6, 8, 4, 7, 2, 6, 1, 5, -1, 5, -3, 6, -5, 7, -6, 9, -7)),  # {
+    (8, (4, 25, 4, -7)),  # |
+    (14, (5, 25, 7, 24, 8, 23, 9, 21, 9, 19, 8, 17, 7, 16, 6, 14, 6, 12, 8, 10, -1, -1, 7, 24, 8, 22, 8, 20,
+         7, 18, 6, 17, 5, 15, 5, 13, 6, 11, 10, 9, 6, 7, 5, 5, 5, 3, 6, 1, 7, 0, 8, -2, 8, -4, 7, -6,
+         -1, -1, 8, 8, 6, 6, 6, 4, 7, 2, 8, 1, 9, -1, 9, -3, 8, -5, 7, -6, 5, -7)),  # }
+    (24, (3, 6, 3, 8, 4, 11, 6, 12, 8, 12, 10, 11, 14, 8, 16, 7, 18, 7, 20, 8, 21, 10, -1, -1, 3, 8, 4, 10,
+         6, 11, 8, 11, 10, 10, 14, 7, 16, 6, 18, 6, 20, 7, 21, 10, 21, 12)),  # ~
+)
+
+
+class StrokeFont(object):
+    # text lines -> LINE (one segment strokes) and POLYLINE entities, placed
+    # like the TEXT entity of the same insert, align and rotation
+    def __init__(self, cache_size=STROKE_CACHE):
+        self.glyphs = {}  # character -> (advance, strokes) in font units
+        self.shapes = OrderedDict()  # (character, height, width, rotation, mirror) -> (advance, strokes)
+        self.cache_size = cache_size
+
+    def glyph(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            code = ord(char) - 32
+            if not 0 <= code < len(STROKE_GLYPHS):
+                return self.glyphs.setdefault(char, self.glyph(STROKE_MISSING))
+            advance, coords = STROKE_GLYPHS[code]
+            strokes = [[]]
+            for x, y in zip(coords[::2], coords[1::2]):
+                if x == -1 and y == -1:
+                    strokes.append([])
+                else:
+                    strokes[-1].append((x, y))
+            glyph = self.glyphs[char] = (advance, [stroke for stroke in strokes if len(stroke) > 1])
+        return glyph
+
+    def shape(self, char, height, width, rotation, mirror):
+        # the glyph in drawing units around its origin, and the move to the next glyph
+        key = (char, height, width, rotation, mirror)
+        shape = self.shapes.get(key)
+        if shape is None:
+            advance, strokes = self.glyph(char)
+            sx = (-width if mirror else width) / STROKE_CAP
+            sy = height / STROKE_CAP
+            c, s = cos(radians(rotation)), sin(radians(rotation))
+            shape = self.shapes[key] = (
+                (advance * sx * c, advance * sx * s),
+                [[(x * sx * c - y * sy * s, x * sx * s + y * sy * c) for x, y in stroke] for stroke in strokes])
+            if len(self.shapes) > self.cache_size:
+                self.shapes.popitem(last=False)
+        return shape
+
+    def add_text(self, dxf, text, insert=(0, 0), height=1., width=1., align="LEFT", rotation=0., mirror=False,
+                 layer="0", color=None):
+        halign, valign = TEXT_ALIGN_FLAGS[align.upper()]
+        # the insert is on the baseline (LEFT, CENTER, RIGHT), the bottom,
+        # the middle or the top of the text
+        length = sum(self.glyph(char)[0] for char in text) * width / STROKE_CAP
+        ox = -length * halign / 2.
+        oy = (0., height * STROKE_DESCENT / STROKE_CAP, -height / 2., -height)[valign]
+        if mirror:
+            ox = -ox
+        c, s = cos(radians(rotation)), sin(radians(rotation))
+        x = insert[0] + ox * c - oy * s
+        y = insert[1] + ox * s + oy * c
+        for char in text:
+            (dx, dy), strokes = self.shape(char, height, width, rotation, mirror)
+            for stroke in strokes:
+                if len(stroke) == 2:
+                    (x0, y0), (x1, y1) = stroke
+                    dxf.add_line((x + x0, y + y0), (x + x1, y + y1), layer, color)
+                else:
+                    dxf.add_polyline([(x + px, y + py) for px, py in stroke], layer, color)
+            x += dx
+            y += dy
+
+###################################################################
+## entity store
+# the entities of a board kept between conversion and writing in typed
+# columns rather than one python object each: the coordinates of lines,
+# circles, arcs and points in array('d'), one small int style code per
+# entity in array('H') indexing a table of (layer, color, linetype);
+# texts, polylines and inserts, few, as __slots__ records. Passes over the
+# whole board work on the columns; finish() writes them layer by layer,
+# the lines, circles and arcs of a style in bulk.
+# Memory per entity (64 bit CPython 3.11, tracemalloc), against a tuple
+# (kind, layer, color, coordinates...) of float objects per entity:
+#   line 34 bytes (tuple 201), circle 27 (169), arc 43 (233), text with
+#   its string 223 (247)
+
+STORE_COLUMNS = (('line', 4), ('circle', 3), ('arc', 5), ('point', 2))  # kind -> doubles per entity
+STORE_CODES = 1 << 16  # styles of a store (array('H') codes)
+
+
+class StoredText(object):
+    __slots__ = ('text', 'x', 'y', 'height', 'width', 'align', 'rotation', 'oblique', 'font', 'code')
+
+    def __init__(self, text, x, y, height, width, align, rotation, oblique, font, code):
+        self.text = text
+        self.x = x
+        self.y = y
+        self.height = height
+        self.width = width
+        self.align = align
+        self.rotation = rotation
+        self.oblique = oblique
+        self.font = font
+        self.code = code
+
+
+class StoredPolyline(object):
+    __slots__ = ('vertices', 'bulges', 'closed', 'code')
+
+    def __init__(self, vertices, bulges, closed, code):
+        self.vertices = vertices  # array('d') of x, y
+        self.bulges = bulges  # array('d') or None
+        self.closed = closed
+        self.code = code
+
+
+class StoredInsert(object):
+    __slots__ = ('name', 'x', 'y', 'rotation', 'xscale', 'yscale', 'code')
+
+    def __init__(self, name, x, y, rotation, xscale, yscale, code):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.rotation = rotation
+        self.xscale = xscale
+        self.yscale = yscale
+        self.code = code
+
+
+class EntityStore(object):
+    # writer wrapper keeping the entities until finish(); everything that is
+    # not an entity goes to the writer
+    bulk_lines = True
+
+    def __init__(self, dxf):
+        self.dxf = dxf
+        self.styles = []  # code -> (layer, color, linetype)
+        self._codes = {}
+        self.columns = dict((kind, (array('d'), array('H'))) for kind, n in STORE_COLUMNS)  # kind -> (coordinates, codes)
+        self.texts = []
+        self.polylines = []
+        self.inserts = []
+        self.passes = []  # called with the store by finish(), before it writes
+
+    def __getattr__(self, name):
+        return getattr(self.dxf, name)
+
+    def __len__(self):
+        return sum(len(codes) for coords, codes in self.columns.values()) + \
+            len(self.texts) + len(self.polylines) + len(self.inserts)
+
+    def code(self, layer, color=None, linetype=None):
+        key = (layer, color, linetype)
+        code = self._codes.get(key)
+        if code is None:
+            if len(self.styles) == STORE_CODES:
+                raise ValueError("more than %d layer and color pairs." % STORE_CODES)
+            code = self._codes[key] = len(self.styles)
+            self.styles.append(key)
+        return code
+
+    def add_line(self, start, end, layer="0", color=None, linetype=None):
+        coords, codes = self.columns['line']
+        coords.extend((start[0], start[1], end[0], end[1]))
+        codes.append(self.code(layer, color, linetype))
+
+    def add_circle(self, center, radius, layer="0", color=None, linetype=None):
+        coords, codes = self.columns['circle']
+        coords.extend((center[0], center[1], radius))
+        codes.append(self.code(layer, color, linetype))
+
+    def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        coords, codes = self.columns['arc']
+        coords.extend((center[0], center[1], radius, start, end))
+        codes.append(self.code(layer, color, linetype))
+
+    def add_point(self, location, layer="0", color=None, linetype=None):
+        coords, codes = self.columns['point']
+        coords.extend((location[0], location[1]))
+        codes.append(self.code(layer, color, linetype))
+
+    def add_text(self, text, insert=(0, 0), height=1., width=1., align="LEFT", rotation=0., oblique=0.,
+                 style='STANDARD', layer="0", color=None):
+        self.texts.append(StoredText(text, insert[0], insert[1], height, width, align, rotation, oblique, style,
+                                     self.code(layer, color)))
+
+    def add_polyline(self, vertices, layer="0", color=None, linetype=None, closed=False, bulges=None):
+        self.polylines.append(StoredPolyline(array('d', chain.from_iterable((v[0], v[1]) for v in vertices)),
+                                             array('d', bulges) if bulges else None, closed,
+                                             self.code(layer, color, linetype)))
+
+    def add_insert(self, name, insert=(0, 0), rotation=0., xscale=1., yscale=1., layer="0", color=None):
+        self.inserts.append(StoredInsert(name, insert[0], insert[1], rotation, xscale, yscale, self.code(layer, color)))
+
+    def add_lines(self, starts, ends, layer="0", color=None, linetype=None):
+        self._add_bulk('line', ((starts, 2), (ends, 2)), layer, color, linetype)
+
+    def add_circles(self, centers, radii, layer="0", color=None, linetype=None):
+        self._add_bulk('circle', ((centers, 2), (radii, 1)), layer, color, linetype)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, layer="0", color=None, linetype=None):
+        self._add_bulk('arc', ((centers, 2), (radii, 1), (start_angles, 1), (end_angles, 1)), layer, color, linetype)
+
+    def _add_bulk(self, kind, fields, layer, color, linetype):
+        # fields: (points or numbers, columns kept) in column order
+        coords, codes = self.columns[kind]
+        if numpy is not None:
+            rows = numpy.hstack([numpy.asarray(values, dtype=numpy.float64).reshape(len(values), -1)[:, :n]
+                                 for values, n in fields])
+            coords.frombytes(rows.tobytes())
+        else:
+            rows = list(zip(*[[tuple(v[:n]) if n > 1 else (v,) for v in values] for values, n in fields]))
+            for parts in rows:
+                for part in parts:
+                    coords.extend(part)
+        codes.extend(repeat(self.code(layer, color, linetype), len(rows)))
+
+    def rows(self, kind):
+        # the coordinates of kind, one row per entity: a numpy view (no copy)
+        # or a list of tuples
+        coords, codes = self.columns[kind]
+        n = dict(STORE_COLUMNS)[kind]
+        if numpy is not None:
+            return numpy.frombuffer(coords, dtype=numpy.float64).reshape(-1, n) if coords else \
+                numpy.empty((0, n))
+        return list(zip(*[iter(coords)] * n))
+
+    def set_rows(self, kind, rows, codes):
+        # replaces the entities of kind: coordinate rows and their style codes
+        self.columns[kind] = (array('d', chain.from_iterable(rows)), array('H', codes))
+
+    def groups(self, kind):
+        # style code -> indices of the entities of kind with it, in order
+        codes = self.columns[kind][1]
+        if numpy is not None:
+            if not codes:
+                return {}
+            codes = numpy.frombuffer(codes, dtype=numpy.uint16)
+            order = numpy.argsort(codes, kind='stable')
+            ordered = codes[order]
+            starts = numpy.flatnonzero(numpy.r_[True, ordered[1:] != ordered[:-1]])
+            ends = numpy.r_[starts[1:], len(order)]
+            return dict((int(ordered[a]), order[a:b]) for a, b in zip(starts, ends))
+        groups = {}
+        for i, code in enumerate(codes):
+            groups.setdefault(code, []).append(i)
+        return groups
+
+    def layer_order(self):
+        # style codes, those of a layer together, layers as they came
+        first = {}
+        for code, (layer, color, linetype) in enumerate(self.styles):
+            first.setdefault(str(layer), code)  # Dwgs is 0, as the layer "0"
+        return sorted(range(len(self.styles)), key=lambda code: (first[str(self.styles[code][0])], code))
+
+    def finish(self):
+        # writes the entities to the writer layer by layer, and empties the
+        # store
+        dxf = self.dxf
+        passes = self.passes
+        for run in passes:
+            run(self)
+        groups = dict((kind, self.groups(kind)) for kind, n in STORE_COLUMNS)
+        rows = dict((kind, self.rows(kind)) for kind, n in STORE_COLUMNS)
+        records = {}
+        for record in chain(self.polylines, self.texts, self.inserts):
+            records.setdefault(record.code, []).append(record)
+        for code in self.layer_order():
+            layer, color, linetype = self.styles[code]
+            for kind, n in STORE_COLUMNS:
+                indices = groups[kind].get(code)
+                if indices is not None:
+                    self._write_rows(kind, rows[kind], indices, layer, color, linetype)
+            for record in records.get(code, ()):
+                if type(record) is StoredText:
+                    dxf.add_text(record.text, (record.x, record.y), record.height, record.width, record.align,
+                                 record.rotation, record.oblique, record.font, layer, color)
+                elif type(record) is StoredPolyline:
+                    vertices = record.vertices
+                    dxf.add_polyline(list(zip(vertices[::2], vertices[1::2])), layer, color, linetype,
+                                     closed=record.closed, bulges=record.bulges and list(record.bulges))
+                else:
+                    dxf.add_insert(record.name, (record.x, record.y), record.rotation, record.xscale,
+                                   record.yscale, layer, color)
+        rows = groups = None  # the numpy views, before the columns are dropped
+        self.__init__(dxf)
+        self.passes = passes
+        finish = getattr(dxf, 'finish', None)
+        if finish is not None:
+            finish()
+
+    def _write_rows(self, kind, rows, indices, layer, color, linetype):
+        dxf = self.dxf
+        if numpy is not None:
+            rows = rows[indices]
+            if kind == 'line':
+                dxf.add_lines(rows[:, :2], rows[:, 2:], layer, color, linetype)
+            elif kind == 'circle':
+                dxf.add_circles(rows[:, :2], rows[:, 2], layer, color, linetype)
+            elif kind == 'arc':
+                dxf.add_arcs(rows[:, :2], rows[:, 2], rows[:, 3], rows[:, 4], layer, color, linetype)
+            else:
+                for x, y in rows.tolist():
+                    dxf.add_point((x, y), layer, color, linetype)
+            return
+        for i in indices:
+            row = rows[i]
+            if kind == 'line':
+                dxf.add_line(row[:2], row[2:], layer, color, linetype)
+            elif kind == 'circle':
+                dxf.add_circle(row[:2], row[2], layer, color, linetype)
+            elif kind == 'arc':
+                dxf.add_arc(row[:2], row[2], row[3], row[4], layer, color, linetype)
+            else:
+                dxf.add_point(row, layer, color, linetype)
+
+###################################################################
+## geometry optimizer
+# a pass over an EntityStore before it is written: entities whose
+# coordinates are all within the tolerance of an earlier one of the same
+# style are duplicates, lines shorter than the tolerance, circles and arcs
+# smaller than it are dropped, and lines of a style on the same straight
+# line that overlap or touch are merged into one. The kept entities are in
+# a hashed grid by one of their points, cells of twice the tolerance so that
+# a point within tolerance is in one of the 2x2 cells nearest to it: near
+# duplicates across a cell boundary are found too. Lines are bucketed by
+# direction and distance to the origin (hashed) and a line is merged only
+# when both its ends are within the tolerance of the longest line not merged
+# yet of its bucket or of the 8 around it (collinear lines rounded to
+# neighbouring buckets), so the pass is near linear. Directions are taken
+# in a half turn cut at an odd angle, so that the frequent horizontal and
+# vertical lines are never split between its two ends.
+
+OPTIMIZE_TOLERANCE = 1e-4  # mm
+COLLINEAR_ANGLE = 1e-3  # radians, direction buckets of the collinear lines
+COLLINEAR_OFFSET = 1e-1  # mm, distance to the origin buckets of the collinear lines
+_DIRECTION_CUT = (cos(0.3), sin(0.3))  # directions kept within 90 degrees of this one
+
+
+class _NearGrid(object):
+    # coordinate tuples by group and by the cell of a point, cells of twice
+    # the tolerance: a point within tolerance is in one of the 2x2 cells
+    # nearest to it
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.inv = .5 / tolerance
+        self.cells = {}
+
+    def add(self, group, x, y, coords):
+        self.cells.setdefault((group, int(floor(x * self.inv)), int(floor(y * self.inv))), []).append(coords)
+
+    def first(self, group, x, y, coords):
+        # False if coords are within tolerance of ones added with a point
+        # within tolerance of x, y, else adds them and True
+        x *= self.inv
+        y *= self.inv
+        cx = int(floor(x))
+        cy = int(floor(y))
+        nx = cx + 1 if x - cx >= .5 else cx - 1
+        ny = cy + 1 if y - cy >= .5 else cy - 1
+        tolerance = self.tolerance
+        cells = self.cells
+        key = (group, cx, cy)
+        for near in (key, (group, nx, cy), (group, cx, ny), (group, nx, ny)):
+            for other in cells.get(near, ()):
+                if max(map(abs, map(sub, coords, other))) <= tolerance:
+                    return False
+        cells.setdefault(key, []).append(coords)
+        return True
+
+
+class GeometryOptimizer(object):
+    # EntityStore pass; duplicates, degenerate and merged count the
+    # entities it removed
+    def __init__(self, tolerance=OPTIMIZE_TOLERANCE):
+        self.tolerance = tolerance
+        self.duplicates = 0
+        self.degenerate = 0
+        self.merged = 0
+
+    @property
+    def removed(self):
+        return self.duplicates + self.degenerate + self.merged
+
+    def __call__(self, store):
+        rows = dict((kind, self._rows(store, kind)) for kind in ('circle', 'arc', 'point'))
+        store.set_rows('line', *self.lines(store.rows('line'), store.columns['line'][1]))
+        store.set_rows('circle', *self.circles(*rows['circle']))
+        store.set_rows('arc', *self.arcs(*rows['arc']))
+        store.set_rows('point', *self.unique(*rows['point']))
+        store.texts = self.records(store.texts, lambda t: (t.code, t.text, t.height, t.width, t.align, t.rotation,
+                                                          t.oblique, t.font), lambda t: (t.x, t.y))
+        store.polylines = self.records(store.polylines, lambda p: (p.code, p.closed, len(p.vertices),
+                                                                   tuple(p.bulges or ())), lambda p: p.vertices)
+
+    @staticmethod
+    def _rows(store, kind):
+        rows = store.rows(kind)
+        return (rows.tolist() if numpy is not None else rows), store.columns[kind][1]
+
+    def unique(self, rows, codes):
+        # rows: (x, y, ...) of points or circles
+        seen = _NearGrid(self.tolerance)
+        kept, kept_codes = [], []
+        for row, code in zip(rows, codes):
+            if not seen.first(code, row[0], row[1], row):
+                self.duplicates += 1
+                continue
+            kept.append(row)
+            kept_codes.append(code)
+        return kept, kept_codes
+
+    def records(self, records, key, coords):
+        # key: the exact fields of a record, coords: its coordinates, the
+        # first two a point
+        seen = _NearGrid(self.tolerance)
+        kept = []
+        for record in records:
+            k, c = key(record), coords(record)
+            if not seen.first(k, c[0], c[1], c):
+                self.duplicates += 1
+                continue
+            kept.append(record)
+        return kept
+
+    def circles(self, rows, codes):
+        tolerance = self.tolerance
+        kept = [(row, code) for row, code in zip(rows, codes) if row[2] > tolerance]
+        self.degenerate += len(rows) - len(kept)
+        return self.unique([row for row, code in kept], [code for row, code in kept])
+
+    def arcs(self, rows, codes):
+        # the same arc has the same center, radius and ends
+        tolerance = self.tolerance
+        seen = _NearGrid(tolerance)
+        kept, kept_codes = [], []
+        for (cx, cy, r, start, end), code in zip(rows, codes):
+            sweep = (end - start) % 360.
+            if r <= tolerance or 0. < radians(sweep) * r <= tolerance:
+                self.degenerate += 1
+                continue
+            a0, a1 = radians(start), radians(end)
+            values = (cx, cy, r, cx + r * cos(a0), cy + r * sin(a0), cx + r * cos(a1), cy + r * sin(a1))
+            if not seen.first(code, cx, cy, values):
+                self.duplicates += 1
+                continue
+            kept.append((cx, cy, r, start, end))
+            kept_codes.append(code)
+        return kept, kept_codes
+
+    def lines(self, rows, codes):
+        # rows: numpy array or list of (x0, y0, x1, y1)
+        tolerance = self.tolerance
+        keys = self._line_keys_numpy(rows) if numpy is not None else self._line_keys(rows)
+        if numpy is not None:
+            rows = rows.tolist()
+        seen = _NearGrid(tolerance)  # by both ends, the one at x, y first
+        buckets = {}  # (code, direction, offset) -> [(length, x0, y0, x1, y1)]
+        for row, code, length, direction, offset in zip(rows, codes, *keys):
+            if length <= tolerance:
+                self.degenerate += 1
+                continue
+            x0, y0, x1, y1 = row
+            if not seen.first(code, x0, y0, row):
+                self.duplicates += 1
+                continue
+            seen.add(code, x1, y1, (x1, y1, x0, y0))
+            buckets.setdefault((code, direction, offset), []).append((length,) + tuple(row))
+        count = sum(len(lines) for lines in buckets.values())
+        kept, kept_codes = self.merge(buckets)
+        self.merged += count - len(kept)
+        return kept, kept_codes
+
+    def _line_keys(self, rows):
+        # lengths, direction and distance to the origin buckets of the lines
+        cut_x, cut_y = _DIRECTION_CUT
+        lengths, directions, offsets = [], [], []
+        for x0, y0, x1, y1 in rows:
+            dx, dy = x1 - x0, y1 - y0
+            length = hypot(dx, dy) or 1.
+            if dx * cut_x + dy * cut_y < 0.:
+                dx, dy = -dx, -dy
+            ux, uy = dx / length, dy / length
+            lengths.append(hypot(dx, dy))
+            directions.append(int(round(atan2(uy, ux) / COLLINEAR_ANGLE)))
+            offsets.append(int(round((ux * y0 - uy * x0) / COLLINEAR_OFFSET)))
+        return lengths, directions, offsets
+
+    def _line_keys_numpy(self, rows):
+        # as _line_keys, vectorized
+        rows = numpy.asarray(rows, dtype=numpy.float64).reshape(-1, 4)
+        d = rows[:, 2:] - rows[:, :2]
+        lengths = numpy.hypot(d[:, 0], d[:, 1])
+        d[d.dot(_DIRECTION_CUT) < 0.] *= -1.
+        u = d / numpy.where(lengths > 0., lengths, 1.)[:, None]
+        directions = numpy.rint(numpy.arctan2(u[:, 1], u[:, 0]) / COLLINEAR_ANGLE).astype(numpy.int64)
+        offsets = numpy.rint((u[:, 0] * rows[:, 1] - u[:, 1] * rows[:, 0]) / COLLINEAR_OFFSET).astype(numpy.int64)
+        return lengths.tolist(), directions.tolist(), offsets.tolist()
+
+    def merge(self, buckets):
+        # buckets: (code, direction, offset) -> [(length, x0, y0, x1, y1)]
+        # (emptied) -> lines (x0, y0, x1, y1) and their codes, with the
+        # overlapping and touching collinear ones joined, line by line from
+        # the longest. A line takes the lines on it from its bucket and the
+        # 8 around it, so collinear lines rounded to neighbouring directions
+        # or offsets are joined too
+        tolerance = self.tolerance
+        out, codes = [], []
+        near = {}  # bucket -> the buckets around it, itself included
+        longest = []
+        for key, lines in buckets.items():
+            code, d, o = key
+            around = [k for k in ((code, d - 1, o - 1), (code, d - 1, o), (code, d - 1, o + 1), (code, d, o - 1), key,
+                                  (code, d, o + 1), (code, d + 1, o - 1), (code, d + 1, o), (code, d + 1, o + 1))
+                      if k in buckets]
+            if len(lines) == 1 and len(around) == 1:
+                out.append(lines[0][1:])  # nothing to join
+                codes.append(code)
+                continue
+            near[key] = around
+            longest.extend((line[0], key, line) for line in lines)
+        longest.sort(key=itemgetter(0), reverse=True)
+        taken = set()  # id() of the lines joined
+        for length, key, line in longest:
+            if id(line) in taken:
+                continue
+            code = key[0]
+            length, x0, y0, x1, y1 = line
+            ux, uy = (x1 - x0) / length, (y1 - y0) / length
+            spans = []
+            for k in near[key]:
+                rest = []
+                for other in buckets[k]:
+                    length, sx, sy, ex, ey = other
+                    if abs((sx - x0) * uy - (sy - y0) * ux) > tolerance or \
+                            abs((ex - x0) * uy - (ey - y0) * ux) > tolerance:
+                        rest.append(other)  # not on the line of the longest one
+                        continue
+                    taken.add(id(other))
+                    t0 = (sx - x0) * ux + (sy - y0) * uy
+                    t1 = (ex - x0) * ux + (ey - y0) * uy
+                    spans.append((t0, (sx, sy), t1, (ex, ey)) if t0 <= t1 else (t1, (ex, ey), t0, (sx, sy)))
+                buckets[k] = rest
+            spans.sort()
+            run = None
+            for t0, p0, t1, p1 in spans:
+                if run is not None and t0 <= run[2] + tolerance:
+                    if t1 > run[2]:
+                        run[2:] = [t1, p1]
+                    continue
+                if run is not None:
+                    out.append(run[1] + run[3])
+                    codes.append(code)
+                run = [t0, p0, t1, p1]
+            out.append(run[1] + run[3])
+            codes.append(code)
+        return out, codes
+
+###################################################################
+## outline chaining
+# loose LINE and ARC segments of a layer joined end to end: the endpoints go
+# in a hashed grid of tolerance sized cells, a point within tolerance is in
+# one of the 3x3 cells around it, so every chain step is a constant time
+# lookup and chaining is linear in the number of segments.
+
+CHAIN_TOLERANCE = 1e-3  # mm, endpoints closer than this are joined
+
+
+def chain_segments(ends, tolerance=CHAIN_TOLERANCE):
+    # ends: (x0, y0, x1, y1) of each segment -> list of (closed, chain),
+    # chain a list of (segment index, reversed) walked end to end
+    inv = 1. / tolerance
+    tol2 = tolerance * tolerance
+    grid = {}
+    for i, (x0, y0, x1, y1) in enumerate(ends):
+        grid.setdefault((int(floor(x0 * inv)), int(floor(y0 * inv))), []).append((i, 0))
+        grid.setdefault((int(floor(x1 * inv)), int(floor(y1 * inv))), []).append((i, 1))
+    used = [False] * len(ends)
+
+    def take(x, y):
+        # an unused segment with an endpoint at x, y: (index, 0 start / 1 end)
+        cx = int(floor(x * inv))
+        cy = int(floor(y * inv))
+        for key in ((cx, cy), (cx - 1, cy - 1), (cx, cy - 1), (cx + 1, cy - 1), (cx - 1, cy),
+                    (cx + 1, cy), (cx - 1, cy + 1), (cx, cy + 1), (cx + 1, cy + 1)):
+            cell = grid.get(key)
+            if not cell:
+                continue
+            for i, end in cell:
+                if not used[i]:
+                    seg = ends[i]
+                    px, py = seg[2 * end], seg[2 * end + 1]
+                    if (px - x) * (px - x) + (py - y) * (py - y) <= tol2:
+                        used[i] = True
+                        return i, end
+        return None
+
+    def near(ax, ay, bx, by):
+        return (ax - bx) * (ax - bx) + (ay - by) * (ay - by) <= tol2
+
+    chains = []
+    for i, (sx, sy, x, y) in enumerate(ends):
+        if used[i]:
+            continue
+        used[i] = True
+        if near(sx, sy, x, y):  # zero length or a full circle, never chained
+            chains.append((False, [(i, False)]))
+            continue
+        chain = deque([(i, False)])
+        closed = False
+        while True:  # forward from the end point
+            if len(chain) > 1 and near(x, y, sx, sy):
+                closed = True
+                break
+            hit = take(x, y)
+            if hit is None:
+                break
+            j, end = hit
+            chain.append((j, end == 1))
+            x, y = (ends[j][0], ends[j][1]) if end else (ends[j][2], ends[j][3])
+        while not closed:  # backward from the start point
+            hit = take(sx, sy)
+            if hit is None:
+                break
+            j, end = hit
+            chain.appendleft((j, end == 0))
+            sx, sy = (ends[j][2], ends[j][3]) if end == 0 else (ends[j][0], ends[j][1])
+        chains.append((closed, list(chain)))
+    return chains
+
+
+def _tolist(values):
+    # numpy arrays of the bulk methods -> lists of python floats
+    return values.tolist() if hasattr(values, 'tolist') else values
+
+
+class ContourChainer(object):
+    # writer wrapper: LINE and ARC entities of the chained layers are kept
+    # and written by finish() as POLYLINE entities with arc bulges, one per
+    # chain of touching segments; everything else goes to the writer
+    def __init__(self, dxf, layers, tolerance=CHAIN_TOLERANCE):
+        self.dxf = dxf
+        self.layers = set(layers)
+        self.tolerance = tolerance
+        self.segments = {}  # (layer, color, linetype) -> [(ends, bulge, entity)]
+
+    def __getattr__(self, name):
+        return getattr(self.dxf, name)
+
+    def add_line(self, start, end, layer="0", color=None, linetype=None):
+        if layer not in self.layers:
+            return self.dxf.add_line(start, end, layer, color, linetype)
+        self.segments.setdefault((layer, color, linetype), []).append(
+            ((start[0], start[1], end[0], end[1]), 0., ('add_line', (start, end))))
+
+    def add_lines(self, starts, ends, layer="0", color=None, linetype=None):
+        if layer not in self.layers:
+            return self.dxf.add_lines(starts, ends, layer, color, linetype)
+        for start, end in zip(_tolist(starts), _tolist(ends)):
+            self.add_line(tuple(start), tuple(end), layer, color, linetype)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, layer="0", color=None, linetype=None):
+        if layer not in self.layers:
+            return self.dxf.add_arcs(centers, radii, start_angles, end_angles, layer, color, linetype)
+        for center, radius, start, end in zip(_tolist(centers), _tolist(radii), _tolist(start_angles),
+                                              _tolist(end_angles)):
+            self.add_arc(tuple(center), radius, start, end, layer, color, linetype)
+
+    def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        if layer not in self.layers:
+            return self.dxf.add_arc(center, radius, start, end, layer, color, linetype)
+        sweep = (end - start) % 360.
+        a0 = radians(start)
+        a1 = radians(end)
+        ends = (center[0] + radius * cos(a0), center[1] + radius * sin(a0),
+                center[0] + radius * cos(a1), center[1] + radius * sin(a1))
+        self.segments.setdefault((layer, color, linetype), []).append(
+            (ends, tan(radians(sweep) / 4.), ('add_arc', (center, radius, start, end))))
+
+    def finish(self):
+        # writes the kept segments: chains as polylines, lone segments as
+        # they came
+        for (layer, color, linetype), segments in self.segments.items():
+            for closed, chain in chain_segments([seg[0] for seg in segments], self.tolerance):
+                if len(chain) == 1:
+                    method, args = segments[chain[0][0]][2]
+                    getattr(self.dxf, method)(*args, layer=layer, color=color, linetype=linetype)
+                    continue
+                vertices = []
+                bulges = []
+                for i, rev in chain:
+                    ends, bulge, entity = segments[i]
+                    if rev:
+                        vertices.append((ends[2], ends[3]))
+                        bulges.append(-bulge)
+                    else:
+                        vertices.append((ends[0], ends[1]))
+                        bulges.append(bulge)
+                if not closed:
+                    ends = segments[chain[-1][0]][0]
+                    vertices.append((ends[0], ends[1]) if chain[-1][1] else (ends[2], ends[3]))
+                    bulges.append(0.)
+                self.dxf.add_polyline(vertices, layer, color, linetype, closed=closed, bulges=bulges)
+        self.segments = {}
+        finish = getattr(self.dxf, 'finish', None)
+        if finish is not None:
+            finish()
+
+###################################################################
+## region clipping
+# only what lies in one or more rectangular regions is written. The regions
+# are in a uniform grid index: an entity looks up the cells its bounding
+# box covers and is tested against the regions found there only. Entities
+# inside a region are passed on as they are, entities outside every region
+# are dropped before being formatted, and lines, circles, arcs and polyline
+# segments crossing a region border are cut on it. Texts, points and
+# inserts are kept or dropped whole, by their insertion point.
+
+CLIP_EPSILON = 1e-9  # mm, tolerance of the inside tests
+
+
+def arc_bounds(cx, cy, r, start=0., end=360.):
+    # (x0, y0, x1, y1) of the arc from start to end degrees, ccw
+    span = (end - start) % 360. or 360.
+    a0, a1 = radians(start), radians(start + span)
+    xs = [cx + r * cos(a0), cx + r * cos(a1)]
+    ys = [cy + r * sin(a0), cy + r * sin(a1)]
+    for quadrant, x, y in ((0., cx + r, cy), (90., cx, cy + r), (180., cx - r, cy), (270., cx, cy - r)):
+        if (quadrant - start) % 360. <= span:
+            xs.append(x)
+            ys.append(y)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def clip_segment(x0, y0, x1, y1, rect):
+    # the part of the segment inside rect (Liang-Barsky), None if outside
+    rx0, ry0, rx1, ry1 = rect
+    dx = x1 - x0
+    dy = y1 - y0
+    t0, t1 = 0., 1.
+    for p, q in ((-dx, x0 - rx0), (dx, rx1 - x0), (-dy, y0 - ry0), (dy, ry1 - y0)):
+        if p == 0.:
+            if q < -CLIP_EPSILON:
+                return None
+            continue
+        t = q / p
+        if p < 0.:
+            if t > t1:
+                return None
+            if t > t0:
+                t0 = t
+        else:
+            if t < t0:
+                return None
+            if t < t1:
+                t1 = t
+    if t1 <= t0 and (dx or dy):  # touches a corner only
+        return None
+    return (x0 + t0 * dx, y0 + t0 * dy), (x0 + t1 * dx, y0 + t1 * dy)
+
+
+def clip_arc(cx, cy, r, start, end, rect):
+    # the parts of the arc inside rect, as (start, end) degrees
+    span = (end - start) % 360. or 360.
+    rx0, ry0, rx1, ry1 = rect
+    cuts = [0., span]
+    for x in (rx0, rx1):
+        d = (x - cx) / r
+        if -1. < d < 1.:
+            a = degrees(acos(d))
+            cuts += [(a - start) % 360., (-a - start) % 360.]
+    for y in (ry0, ry1):
+        d = (y - cy) / r
+        if -1. < d < 1.:
+            a = degrees(asin(d))
+            cuts += [(a - start) % 360., (180. - a - start) % 360.]
+    cuts = sorted(set(c for c in cuts if 0. <= c <= span))
+    parts = []
+    for u, v in zip(cuts, cuts[1:]):
+        mid = radians(start + (u + v) / 2.)
+        x = cx + r * cos(mid)
+        y = cy + r * sin(mid)
+        if rx0 - CLIP_EPSILON <= x <= rx1 + CLIP_EPSILON and ry0 - CLIP_EPSILON <= y <= ry1 + CLIP_EPSILON:
+            if parts and parts[-1][1] == start + u:
+                parts[-1] = (parts[-1][0], start + v)
+            else:
+                parts.append((start + u, start + v))
+    return parts
+
+
+def bulge_arc(start, end, bulge):
+    # polyline segment with a bulge -> (center, radius, start, end degrees)
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    chord = hypot(dx, dy)
+    h = chord / 2. * (1. - bulge * bulge) / (2. * bulge)  # chord middle -> center
+    cx = (start[0] + end[0]) / 2. - dy / chord * h
+    cy = (start[1] + end[1]) / 2. + dx / chord * h
+    r = chord / 2. * (1. + bulge * bulge) / (2. * abs(bulge))
+    a0 = degrees(atan2(start[1] - cy, start[0] - cx))
+    a1 = degrees(atan2(end[1] - cy, end[0] - cx))
+    return ((cx, cy), r, a0, a1) if bulge > 0. else ((cx, cy), r, a1, a0)
+
+
+class RegionIndex(object):
+    # uniform grid of cells over the regions (x0, y0, x1, y1), about as many
+    # cells as regions; find() gives the regions a bounding box may touch
+    def __init__(self, regions):
+        self.regions = [(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)) for x0, y0, x1, y1 in regions]
+        if not self.regions:
+            raise ValueError("no region to clip to.")
+        self.x0 = min(r[0] for r in self.regions)
+        self.y0 = min(r[1] for r in self.regions)
+        x1 = max(r[2] for r in self.regions)
+        y1 = max(r[3] for r in self.regions)
+        self.n = max(1, int(sqrt(len(self.regions))))
+        self.cell_x = max(x1 - self.x0, CLIP_EPSILON) / self.n
+        self.cell_y = max(y1 - self.y0, CLIP_EPSILON) / self.n
+        self.cells = {}
+        for i, region in enumerate(self.regions):
+            for key in self._keys(*region):
+                self.cells.setdefault(key, []).append(i)
+
+    def _keys(self, x0, y0, x1, y1):
+        n = self.n - 1
+        i0 = max(0, int((x0 - self.x0) / self.cell_x))
+        i1 = min(n, int((x1 - self.x0) / self.cell_x))
+        j0 = max(0, int((y0 - self.y0) / self.cell_y))
+        j1 = min(n, int((y1 - self.y0) / self.cell_y))
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def find(self, x0, y0, x1, y1):
+        # -> (True, None) inside a region, else (False, regions it overlaps)
+        if len(self.regions) == 1:
+            found = self.regions
+        else:
+            found = set()
+            for key in self._keys(x0, y0, x1, y1):
+                found.update(self.cells.get(key, ()))
+            found = [self.regions[i] for i in sorted(found)]
+        touched = []
+        e = CLIP_EPSILON
+        for region in found:
+            rx0, ry0, rx1, ry1 = region
+            if x1 < rx0 - e or x0 > rx1 + e or y1 < ry0 - e or y0 > ry1 + e:
+                continue
+            if x0 >= rx0 - e and x1 <= rx1 + e and y0 >= ry0 - e and y1 <= ry1 + e:
+                return True, None
+            touched.append(region)
+        return False, touched
+
+
+class RegionClipper(object):
+    # writer wrapper writing only what is inside the regions (dxf
+    # coordinates); outside counts the dropped entities, clipped the ones
+    # cut on a region border
+    bulk_lines = True
+
+    def __init__(self, dxf, regions):
+        self.dxf = dxf
+        self.index = RegionIndex(regions)
+        self.outside = 0
+        self.clipped = 0
+
+    def __getattr__(self, name):
+        return getattr(self.dxf, name)
+
+    def finish(self):
+        finish = getattr(self.dxf, 'finish', None)
+        if finish is not None:
+            finish()
+
+    def add_line(self, start, end, layer="0", color=None, linetype=None):
+        x0, y0, x1, y1 = start[0], start[1], end[0], end[1]
+        inside, regions = self.index.find(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        if inside:
+            return self.dxf.add_line(start, end, layer, color, linetype)
+        self._count(self._line_parts(x0, y0, x1, y1, regions, layer, color, linetype))
+
+    def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        inside, regions = self.index.find(*arc_bounds(center[0], center[1], radius, start, end))
+        if inside:
+            return self.dxf.add_arc(center, radius, start, end, layer, color, linetype)
+        self._count(self._arc_parts(center, radius, start, end, regions, layer, color, linetype))
+
+    def add_circle(self, center, radius, layer="0", color=None, linetype=None):
+        cx, cy = center[0], center[1]
+        inside, regions = self.index.find(cx - radius, cy - radius, cx + radius, cy + radius)
+        if inside:
+            return self.dxf.add_circle(center, radius, layer, color, linetype)
+        self._count(self._arc_parts(center, radius, 0., 360., regions, layer, color, linetype))
+
+    def _count(self, parts):
+        # an entity cut into parts (dropped without any)
+        if parts:
+            self.clipped += 1
+        else:
+            self.outside += 1
+
+    def _line_parts(self, x0, y0, x1, y1, regions, layer, color, linetype):
+        parts = 0
+        for region in regions:
+            part = clip_segment(x0, y0, x1, y1, region)
+            if part is not None:
+                self.dxf.add_line(part[0], part[1], layer, color, linetype)
+                parts += 1
+        return parts
+
+    def _arc_parts(self, center, radius, start, end, regions, layer, color, linetype):
+        parts = 0
+        for region in regions:
+            for a0, a1 in clip_arc(center[0], center[1], radius, start, end, region):
+                self.dxf.add_arc(center, radius, a0, a1, layer, color, linetype)
+                parts += 1
+        return parts
+
+    def _kept(self, location):
+        x, y = location[0], location[1]
+        if self.index.find(x, y, x, y)[0]:
+            return True
+        self.outside += 1
+        return False
+
+    def add_text(self, text, insert=(0, 0), *args, **kwargs):
+        if self._kept(insert):
+            return self.dxf.add_text(text, insert, *args, **kwargs)
+
+    def add_point(self, location, *args, **kwargs):
+        if self._kept(location):
+            return self.dxf.add_point(location, *args, **kwargs)
+
+    def add_insert(self, name, insert=(0, 0), *args, **kwargs):
+        if self._kept(insert):
+            return self.dxf.add_insert(name, insert, *args, **kwargs)
+
+    def add_polyline(self, vertices, layer="0", color=None, linetype=None, closed=False, bulges=None):
+        # kept whole inside a region, else cut into its lines and arcs
+        vertices = list(vertices)
+        pairs = list(zip(vertices, vertices[1:]))
+        if closed and len(vertices) > 2:
+            pairs.append((vertices[-1], vertices[0]))
+        segments = []
+        boxes = [(v[0], v[1], v[0], v[1]) for v in vertices]
+        for i, (s, e) in enumerate(pairs):
+            bulge = bulges[i] if bulges and i < len(bulges) else 0.
+            if bulge and (s[0] != e[0] or s[1] != e[1]):
+                arc = bulge_arc(s, e, bulge)
+                segments.append(arc)
+                boxes.append(arc_bounds(arc[0][0], arc[0][1], arc[1], arc[2], arc[3]))
+            else:
+                segments.append((s, e))
+        inside, regions = self.index.find(min(b[0] for b in boxes), min(b[1] for b in boxes),
+                                          max(b[2] for b in boxes), max(b[3] for b in boxes))
+        if inside:
+            return self.dxf.add_polyline(vertices, layer, color, linetype, closed=closed, bulges=bulges)
+        parts = 0
+        for segment in segments:
+            if len(segment) == 4:
+                center, r, a0, a1 = segment
+                parts += self._arc_parts(center, r, a0, a1, regions, layer, color, linetype)
+            else:
+                s, e = segment
+                parts += self._line_parts(s[0], s[1], e[0], e[1], regions, layer, color, linetype)
+        self._count(parts)
+
+    def add_lines(self, starts, ends, layer="0", color=None, linetype=None):
+        if numpy is not None and len(self.index.regions) == 1:
+            starts = numpy.asarray(starts, dtype=float)
+            ends = numpy.asarray(ends, dtype=float)
+            rx0, ry0, rx1, ry1 = self.index.regions[0]
+            e = CLIP_EPSILON
+            x0 = numpy.minimum(starts[:, 0], ends[:, 0])
+            x1 = numpy.maximum(starts[:, 0], ends[:, 0])
+            y0 = numpy.minimum(starts[:, 1], ends[:, 1])
+            y1 = numpy.maximum(starts[:, 1], ends[:, 1])
+            inside = (x0 >= rx0 - e) & (x1 <= rx1 + e) & (y0 >= ry0 - e) & (y1 <= ry1 + e)
+            outside = (x1 < rx0 - e) | (x0 > rx1 + e) | (y1 < ry0 - e) | (y0 > ry1 + e)
+            if inside.any():
+                self.dxf.add_lines(starts[inside], ends[inside], layer, color, linetype)
+            self.outside += int(outside.sum())
+            cut = ~(inside | outside)
+            starts, ends = starts[cut].tolist(), ends[cut].tolist()
+        for start, end in zip(starts, ends):
+            self.add_line(start, end, layer, color, linetype)
+
+    def add_circles(self, centers, radii, layer="0", color=None, linetype=None):
+        for center, radius in zip(centers, radii):
+            self.add_circle(center, float(radius), layer, color, linetype)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, layer="0", color=None, linetype=None):
+        for center, radius, start, end in zip(centers, radii, start_angles, end_angles):
+            self.add_arc(center, float(radius), float(start), float(end), layer, color, linetype)
+
+
+class Bounds(object):
+    # writer stand-in collecting the bounding box (x0, y0, x1, y1) of what is
+    # drawn into it, None while empty
+    def __init__(self):
+        self.rect = None
+
+    def _extend(self, x0, y0, x1, y1):
+        r = self.rect
+        self.rect = (x0, y0, x1, y1) if r is None else (min(r[0], x0), min(r[1], y0), max(r[2], x1), max(r[3], y1))
+
+    def add_line(self, start, end, *args, **kwargs):
+        self._extend(min(start[0], end[0]), min(start[1], end[1]), max(start[0], end[0]), max(start[1], end[1]))
+
+    def add_circle(self, center, radius, *args, **kwargs):
+        self._extend(center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius)
+
+    def add_arc(self, center, radius, start=0, end=360, *args, **kwargs):
+        self._extend(*arc_bounds(center[0], center[1], radius, start, end))
+
+    def add_text(self, text, insert=(0, 0), *args, **kwargs):
+        self._extend(insert[0], insert[1], insert[0], insert[1])
+
+    def add_polyline(self, vertices, *args, **kwargs):
+        for v in vertices:
+            self._extend(v[0], v[1], v[0], v[1])
+
+
+_REFERENCE_RE_B = re.compile(br'\((?:fp_text\s+reference|property\s+"Reference")\s+("(?:[^"\\]|\\.)*"|[^\s()]+)')
+
+
+def footprint_regions(mm, refs, layers=None, layer_map=None):
+    # reference -> dxf bounding box of the exported geometry of the
+    # footprint(s) with that reference, on the memory mapped board mm
+    wanted = set(refs)
+    regions = {}
+    for start, stop, tokens in iter_mmap_elements(mm, None, FOOTPRINT_HEADS):
+        if start is None:
+            continue
+        m = _REFERENCE_RE_B.search(mm, start, stop)
+        if m is None:
+            continue
+        ref = m.group(1).decode('utf-8', 'replace')
+        if ref[0] == '"':
+            ref = _unquote(ref)
+        if ref not in wanted:
+            continue
+        bounds = Bounds()
+        converter = PcbDxfConverter(bounds, layers=layers, layer_map=layer_map)
+        converter.convert(SexprEventParser().feed(['(', 'kicad_pcb'] + tokens() + [')']))
+        if bounds.rect is None:
+            continue
+        if ref in regions:  # the same reference twice
+            bounds._extend(*regions[ref])
+        regions[ref] = bounds.rect
+    missing = wanted - set(regions)
+    if missing:
+        raise ValueError("footprint not found (or without exported geometry): %s" % ", ".join(sorted(missing)))
+    return regions
+
+
+def board_region(x0, y0, x1, y1):
+    # board coordinates (pcbnew, y down) -> dxf region
+    return (min(x0, x1), -max(y0, y1), max(x0, x1), -min(y0, y1))
+
+###################################################################
+## panels
+# a panel repeats the board columns x rows times at a pitch: the board is
+# converted once into the PANEL_BLOCK block and placed by one array INSERT
+# (MINSERT) or one INSERT per copy, so the dxf stays the size of a single
+# board. Rails (top and bottom) and a frame around the copies are closed
+# polylines on the board outline layer, away from the copies by the gap
+# the pitch leaves between two of them.
+
+PANEL_BLOCK = 'BOARD'
+PANEL_OUTLINE = 'Edge.Cuts'  # kicad layer giving the board size and the layer of rails and frame
+
+
+class PanelOutline(object):
+    # writer wrapper collecting the bounding box of every layer on the way
+    # to the writer; rect is the one of the outline layer, of all layers
+    # for a board without outline
+    bulk_lines = True
+
+    def __init__(self, dxf, layer):
+        self.dxf = dxf
+        self.layer = layer
+        self.layers = {}  # dxf layer -> Bounds
+
+    def __getattr__(self, name):
+        return getattr(self.dxf, name)
+
+    def finish(self):
+        finish = getattr(self.dxf, 'finish', None)
+        if finish is not None:
+            finish()
+
+    @property
+    def rect(self):
+        if self.layer in self.layers:
+            return self.layers[self.layer].rect
+        bounds = Bounds()
+        for layer in self.layers.values():
+            if layer.rect is not None:
+                bounds._extend(*layer.rect)
+        return bounds.rect
+
+    def _extend(self, name, layer, *args):
+        bounds = self.layers.get(layer)
+        if bounds is None:
+            bounds = self.layers[layer] = Bounds()
+        getattr(bounds, name)(*args)
+
+    def add_line(self, start, end, layer="0", color=None, linetype=None):
+        self._extend('add_line', layer, start, end)
+        return self.dxf.add_line(start, end, layer, color, linetype)
+
+    def add_circle(self, center, radius, layer="0", color=None, linetype=None):
+        self._extend('add_circle', layer, center, radius)
+        return self.dxf.add_circle(center, radius, layer, color, linetype)
+
+    def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        self._extend('add_arc', layer, center, radius, start, end)
+        return self.dxf.add_arc(center, radius, start, end, layer, color, linetype)
+
+    def add_polyline(self, vertices, layer="0", color=None, linetype=None, closed=False, bulges=None):
+        vertices = list(vertices)
+        if bulges and any(bulges):
+            for i, bulge in enumerate(bulges):
+                if bulge and (closed or i + 1 < len(vertices)):
+                    center, r, a0, a1 = bulge_arc(vertices[i], vertices[(i + 1) % len(vertices)], bulge)
+                    self._extend('add_arc', layer, center, r, a0, a1)
+        self._extend('add_polyline', layer, vertices)
+        return self.dxf.add_polyline(vertices, layer, color, linetype, closed, bulges)
+
+    def add_text(self, text, insert=(0, 0), height=1., width=1., align="LEFT", rotation=0., oblique=0.,
+                 style='STANDARD', layer="0", color=None):
+        self._extend('add_text', layer, text, insert)
+        return self.dxf.add_text(text, insert, height, width, align, rotation, oblique, style, layer, color)
+
+    def add_lines(self, starts, ends, layer="0", color=None, linetype=None):
+        for start, end in zip(starts, ends):
+            self._extend('add_line', layer, start, end)
+        return self.dxf.add_lines(starts, ends, layer, color, linetype)
+
+    def add_circles(self, centers, radii, layer="0", color=None, linetype=None):
+        for center, radius in zip(centers, radii):
+            self._extend('add_circle', layer, center, radius)
+        return self.dxf.add_circles(centers, radii, layer, color, linetype)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, layer="0", color=None, linetype=None):
+        for arc in zip(centers, radii, start_angles, end_angles):
+            self._extend('add_arc', layer, *arc)
+        return self.dxf.add_arcs(centers, radii, start_angles, end_angles, layer, color, linetype)
+
+
+def panel_copies(columns, rows, pitch):
+    # dxf insertion points of the copies, row by row from the board place;
+    # pitch in board coordinates (pcbnew, y down)
+    dx, dy = pitch
+    return [(i * dx, -j * dy) for j in range(rows) for i in range(columns)]
+
+
+def panel_frames(rect, columns, rows, pitch, rails=0., frame=0.):
+    # dxf rectangles (x0, y0, x1, y1) of the rails and the frame around the
+    # copies of a board of extents rect
+    ox, oy = (columns - 1) * pitch[0], -(rows - 1) * pitch[1]  # last copy
+    x0, y0, x1, y1 = rect[0] + min(ox, 0.), rect[1] + min(oy, 0.), rect[2] + max(ox, 0.), rect[3] + max(oy, 0.)
+    gap_x = max(abs(pitch[0]) - (rect[2] - rect[0]), 0.) if columns > 1 else 0.
+    gap_y = max(abs(pitch[1]) - (rect[3] - rect[1]), 0.) if rows > 1 else 0.
+    rects = []
+    if rails:
+        rects.append((x0, y1 + gap_y, x1, y1 + gap_y + rails))
+        rects.append((x0, y0 - gap_y - rails, x1, y0 - gap_y))
+        y0, y1 = y0 - gap_y - rails, y1 + gap_y + rails
+    if frame:
+        x0, y0, x1, y1 = x0 - gap_x, y0 - gap_y, x1 + gap_x, y1 + gap_y
+        rects.append((x0, y0, x1, y1))
+        rects.append((x0 - frame, y0 - frame, x1 + frame, y1 + frame))
+    return rects
+
+
+def write_panel(dxf, name, columns, rows, pitch, inserts=False):
+    # the copies of block name: one array INSERT, or one INSERT each
+    if inserts:
+        for insert in panel_copies(columns, rows, pitch):
+            dxf.add_insert(name, insert)
+    else:
+        dxf.add_insert(name, (0., 0.), columns=columns, rows=rows,
+                       column_spacing=pitch[0], row_spacing=-pitch[1])
+
+
+def write_rectangles(dxf, rects, layer, color=None):
+    for x0, y0, x1, y1 in rects:
+        dxf.add_polyline([(x0, y0), (x1, y0), (x1, y1), (x0, y1)], layer, color, closed=True)
+
+###################################################################
+## arc tessellation
+# circles and arcs as polylines of straight segments, for the tools that
+# read nothing else (laser and plotter software, some viewers): no segment
+# strays more than the tolerance from the arc. A full turn of n segments is
+# a table of the n + 1 unit vectors (cos, sin) at its vertices, computed
+# once per n; the vertices of a circle or an arc are that table scaled by
+# the radius, turned to the start angle and moved to the center, the end of
+# an arc closing a last shorter segment. From TESSELLATE_NUMPY segments the
+# tables and vertices are numpy arrays (when installed), formatted by the
+# writer as one table; below, python lists cost less than the numpy calls.
+
+TESSELLATE_TOLERANCE = 0.01  # mm, chord error
+TESSELLATE_SEGMENTS = (8, 1 << 12)  # segments of a full turn, at least and at most
+TESSELLATE_NUMPY = 32  # segments of a full turn from which the vertices are numpy arrays
+
+_TRIG_TABLES = {}  # segments of a full turn -> unit vectors
+
+
+def trig_table(n):
+    # unit vectors at k * 360 / n degrees, k from 0 to n: (n + 1, 2) array or list of (cos, sin)
+    table = _TRIG_TABLES.get(n)
+    if table is None:
+        if numpy is not None and n >= TESSELLATE_NUMPY:
+            angles = numpy.arange(n + 1) * (2. * pi / n)
+            table = numpy.column_stack((numpy.cos(angles), numpy.sin(angles)))
+            table.flags.writeable = False
+        else:
+            table = [(cos(2. * pi * k / n), sin(2. * pi * k / n)) for k in range(n + 1)]
+        _TRIG_TABLES[n] = table
+    return table
+
+
+def turn_segments(radius, tolerance=TESSELLATE_TOLERANCE):
+    # segments of a full turn with a chord error under tolerance, a multiple of 4
+    low, high = TESSELLATE_SEGMENTS
+    if radius <= tolerance:
+        return low
+    n = int(ceil(pi / acos(1. - tolerance / radius)))
+    return min(max((n + 3) // 4 * 4, low), high)
+
+
+def circle_vertices(center, radius, tolerance=TESSELLATE_TOLERANCE):
+    # vertices of the closed polyline of a circle, from angle 0
+    n = turn_segments(radius, tolerance)
+    cx, cy = center[0], center[1]
+    table = trig_table(n)[:n]
+    if not isinstance(table, list):
+        return table * radius + (cx, cy)
+    return [(cx + radius * c, cy + radius * s) for c, s in table]
+
+
+def arc_vertices(center, radius, start=0., end=360., tolerance=TESSELLATE_TOLERANCE):
+    # vertices of an arc, counterclockwise from start to end degrees, both ends included
+    n = turn_segments(radius, tolerance)
+    sweep = (end - start) % 360. or 360.
+    steps = max(int(ceil(sweep * n / 360. - 1e-6)), 1)  # segments; no sliver for a sweep of whole segments
+    cx, cy = center[0], center[1]
+    c0, s0 = cos(radians(start)), sin(radians(start))
+    a1 = radians(start + sweep)
+    last = (cx + radius * cos(a1), cy + radius * sin(a1))
+    table = trig_table(n)[:steps]
+    if not isinstance(table, list):
+        vertices = numpy.empty((steps + 1, 2))
+        vertices[:steps, 0] = cx + radius * (c0 * table[:, 0] - s0 * table[:, 1])
+        vertices[:steps, 1] = cy + radius * (s0 * table[:, 0] + c0 * table[:, 1])
+        vertices[steps] = last
+        return vertices
+    vertices = [(cx + radius * (c0 * c - s0 * s), cy + radius * (s0 * c + c0 * s)) for c, s in table]
+    vertices.append(last)
+    return vertices
+
+
+class ArcTessellator(object):
+    # writer wrapper: circles and arcs go to the writer as polylines, the
+    # bulges of polylines as their vertices; everything else goes through
+    bulk_lines = True
+
+    def __init__(self, dxf, tolerance=TESSELLATE_TOLERANCE):
+        if not tolerance > 0.:
+            raise ValueError("the tessellation tolerance must be positive.")
+        self.dxf = dxf
+        self.tolerance = tolerance
+
+    def __getattr__(self, name):
+        return getattr(self.dxf, name)
+
+    def finish(self):
+        finish = getattr(self.dxf, 'finish', None)
+        if finish is not None:
+            finish()
+
+    def add_circle(self, center, radius, layer="0", color=None, linetype=None):
+        return self.dxf.add_polyline(circle_vertices(center, radius, self.tolerance), layer, color, linetype,
+                                     closed=True)
+
+    def add_arc(self, center, radius, start=0, end=360, layer="0", color=None, linetype=None):
+        return self.dxf.add_polyline(arc_vertices(center, radius, start, end, self.tolerance), layer, color,
+                                     linetype)
+
+    def add_polyline(self, vertices, layer="0", color=None, linetype=None, closed=False, bulges=None):
+        if not bulges or not any(bulges):
+            return self.dxf.add_polyline(vertices, layer, color, linetype, closed)
+        vertices = list(vertices)
+        points = []
+        for i, (vertex, bulge) in enumerate(zip(vertices, bulges)):
+            points.append(vertex)
+            if bulge and (closed or i + 1 < len(vertices)):
+                center, r, a0, a1 = bulge_arc(vertex, vertices[(i + 1) % len(vertices)], bulge)
+                arc = _tolist(arc_vertices(center, r, a0, a1, self.tolerance))
+                points.extend(arc[1:-1] if bulge > 0. else arc[-2:0:-1])  # clockwise for a negative bulge
+        return self.dxf.add_polyline(points, layer, color, linetype, closed)
+
+    def add_circles(self, centers, radii, layer="0", color=None, linetype=None):
+        for center, radius in zip(_tolist(centers), _tolist(radii)):
+            self.add_circle(center, radius, layer, color, linetype)
+
+    def add_arcs(self, centers, radii, start_angles, end_angles, layer="0", color=None, linetype=None):
+        for center, radius, start, end in zip(_tolist(centers), _tolist(radii), _tolist(start_angles),
+                                              _tolist(end_angles)):
+            self.add_arc(center, radius, start, end, layer, color, linetype)
+
+###################################################################
+## one dxf per layer
+# the board is parsed once and every entity goes to the writer of its
+# layer. The writers format in the converting thread; the chunks they flush
+# are encoded and written by a thread pool, so the disk writes of all the
+# layer files run while the next entities are formatted.
+
+SPLIT_TEMPLATE = '{name}_{layer}.dxf'  # per layer file names, in the folder of the dxf
+SPLIT_THREADS = 4  # threads writing the layer files
+
+
+def layer_file_name(layer):
+    # dxf layer -> the name used in the file name (Dwgs for layer 0)
+    for alias, value in LAYER_ALIASES.items():
+        if value == layer:
+            return alias
+    return str(layer)
+
+
+class LayerSplitter(object):
+    # writer stand-in routing the add_* calls to one writer per dxf layer;
+    # path(layer) gives the file name, opened on the first entity of the
+    # layer (layers without entities get no file); compress as r12writer
+    def __init__(self, path, fixed_tables=False, buffer_size=WRITE_BUFFER_SIZE, number_format=None,
+                 binary=False, threads=SPLIT_THREADS, compress=None, level=None):
+        self.path = path
+        self.writer_args = (fixed_tables, buffer_size, number_format)
+        self.binary = binary
+        self.compress = compress
+        self.level = level
+        self.writers = OrderedDict()  # dxf layer -> writer
+        self.files = OrderedDict()  # dxf layer -> file name
+        self._streams = []
+        self._pool = ThreadPoolExecutor(threads)
+        self.opened = None  # called with every new layer writer
+
+    def writer(self, layer):
+        writer = self.writers.get(layer)
+        if writer is None:
+            path = self.path(layer)
+            stream = _QueuedFile(path, self._pool, self.binary, self.compress or compression_of(path), self.level)
+            self._streams.append(stream)
+            writer_class = R12BinaryStreamWriter if self.binary else R12FastStreamWriter
+            writer = self.writers[layer] = writer_class(stream, *self.writer_args)
+            self.files[layer] = path
+            if self.opened is not None:
+                self.opened(writer)
+        return writer
+
+    def __getattr__(self, name):
+        method = getattr(R12FastStreamWriter, name, None)
+        if not name.startswith('add_') or method is None:
+            raise AttributeError(name)
+        index = _layer_index(R12FastStreamWriter, name)
+        methods = {}  # layer -> bound method of its writer
+
+        def route(*args, **kwargs):
+            layer = kwargs['layer'] if 'layer' in kwargs else args[index] if len(args) > index else "0"
+            method = methods.get(layer)
+            if method is None:
+                method = methods[layer] = getattr(self.writer(layer), name)
+            return method(*args, **kwargs)
+        setattr(self, name, route)
+        return route
+
+    @property
+    def counts(self):
+        counts = Counter()
+        for writer in self.writers.values():
+            counts.update(writer.counts)
+        return counts
+
+    def close(self, finish=True):
+        # finish=False (after an error) closes the files without the tails
+        try:
+            for writer in self.writers.values() if finish else ():
+                writer.close()
+        finally:
+            try:
+                for stream in self._streams:
+                    stream.close()
+            finally:
+                self._pool.shutdown()
+
+
+@contextmanager
+def split_writer(dst, template=SPLIT_TEMPLATE, fixed_tables=False, buffer_size=WRITE_BUFFER_SIZE,
+                 number_format=None, binary=False, compress=None, level=None):
+    # LayerSplitter writing the layer files named by template ({name}: dst
+    # without extensions, {layer}: the layer) in the folder of dst
+    if not _is_path(dst):
+        raise ValueError("one dxf per layer needs a file name as dst.")
+    folder, name = os.path.split(os.path.abspath(os.path.expanduser(dst)))
+    if compression_of(name):
+        name = os.path.splitext(name)[0]
+    name = os.path.splitext(name)[0]
+
+    def path(layer):
+        path = os.path.join(folder, template.format(name=name, layer=layer_file_name(layer)))
+        if not os.path.isdir(os.path.dirname(path)):  # template with sub folders
+            os.makedirs(os.path.dirname(path))
+        return path
+    splitter = LayerSplitter(path, fixed_tables, buffer_size, number_format, binary, SPLIT_THREADS, compress,
+                             level)
+    try:
+        yield splitter
+    except BaseException:
+        try:
+            splitter.close(False)
+        finally:
+            _remove_files(splitter.files.values())
+        raise
+    splitter.close()
+
+###################################################################
+## entity cache
+# the dxf of every top level element of a memory mapped board (footprint,
+# graphic item) is kept with a hash of the element source and of the
+# conversion options as key: on the next run an element that did not change
+# is copied from the cache, not parsed nor formatted again, and an unchanged
+# board (same hash of the whole file) is copied without being scanned.
+# One store file per board in the cache folder; the least recently used
+# entries, then the least recently used stores, go over the size cap.
+
+CACHE_SIZE = 1 << 28  # bytes of cached dxf kept in a cache folder
+CACHE_VERSION = 1  # part of every key, to bump when the dxf of an element changes
+_CACHE_SUFFIX = '.dxfcache'
+
+
+class EntityCache(object):
+    # store file: a pickled header, the pickled index of the entries (least
+    # recently used first) and the dxf of the entries in index order. The
+    # elements of the last board converted come last and in board order, so
+    # the dxf of that board, unchanged, is one slice of the file.
+    # folder None keeps the entries in memory only, for the conversions made
+    # with this cache object.
+    def __init__(self, folder, board, max_bytes=CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.entries = None  # key -> (dxf bytes, ((dxf type, count), ...), footprints), read on first use
+        self.board = None  # (board key, element keys, counts, footprints) of the run
+        self.hits = 0
+        self.misses = 0
+        self._header = None  # (version, board key, counts, footprints, elements, index size, board offset, board size)
+        self._changed = False
+        if folder is None:
+            self.folder = self.path = None
+            return
+        self.folder = os.path.expanduser(folder)
+        name = hashlib.sha1(os.path.abspath(board).encode('utf-8')).hexdigest()
+        self.path = os.path.join(self.folder, name + _CACHE_SUFFIX)
+        try:
+            with open(self.path, 'rb') as f:
+                header = pickle.load(f)
+                self._index_offset = f.tell()
+        except (IOError, OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return  # no cache yet, or unreadable: start empty
+        if isinstance(header, tuple) and len(header) == 8 and header[0] == CACHE_VERSION:
+            self._header = header
+
+    def board_dxf(self, board_key):
+        # (dxf, counts, footprints) of the unchanged board, None if it changed
+        header = self._header
+        if header is None or header[1] != board_key or header[6] is None:
+            return None
+        version, key, counts, footprints, elements, index_size, offset, size = header
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._index_offset + index_size + offset)
+                data = f.read(size)
+        except (IOError, OSError):
+            return None
+        if len(data) != size:
+            return None
+        self.hits += elements
+        return data, counts, footprints
+
+    def _load(self):
+        self.entries = OrderedDict()
+        if self._header is None:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._index_offset)
+                index = pickle.load(f)
+                data = f.read()
+        except (IOError, OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return
+        offset = 0
+        for key, size, counts, footprints in index:
+            self.entries[key] = (data[offset:offset + size], counts, footprints)
+            offset += size
+
+    def get(self, key):
+        if self.entries is None:
+            self._load()
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries[key] = entry  # most recently used
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        if self.entries is None:
+            self._load()
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        self._changed = True
+
+    def save(self):
+        # written to a temporary file renamed over the store, so a
+        # concurrent run reads the old or the new store, never half of one
+        if self.path is None:
+            self._evict()
+            return
+        if not self._changed and self.entries is None:  # unchanged board
+            os.utime(self.path, None)
+            return
+        if self.entries is None:
+            self._load()
+        entries = self.entries
+        board_key = counts = footprints = None
+        offset = size = None
+        elements = 0
+        if self.board is not None:
+            board_key, keys, counts, footprints = self.board
+            elements = len(keys)
+            for key in keys:  # board order, last
+                entry = entries.pop(key, None)
+                if entry is not None:
+                    entries[key] = entry
+            board_size = sum(len(entries[key][0]) for key in keys if key in entries)
+        total = self._evict()
+        if self.board is not None and len(set(keys)) == len(keys) and all(key in entries for key in keys):
+            offset, size = total - board_size, board_size
+        index = pickle.dumps([(key, len(data), c, n) for key, (data, c, n) in entries.items()], 2)
+        header = (CACHE_VERSION, board_key, counts, footprints, elements, len(index), offset, size)
+        head = pickle.dumps(header, 2)
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        fd, tmp = tempfile.mkstemp(_CACHE_SUFFIX, dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(head)
+                f.write(index)
+                for data, c, n in entries.values():
+                    f.write(data)
+            if hasattr(os, 'replace'):
+                os.replace(tmp, self.path)
+            else:
+                os.rename(tmp, self.path)
+        except Exception:
+            os.remove(tmp)
+            raise
+        self._header = header
+        self._index_offset = len(head)
+        self._changed = False
+        self._prune()
+
+    def _evict(self):
+        # least recently used entries over the size cap -> bytes left
+        entries = self.entries or {}
+        total = sum(len(entry[0]) for entry in entries.values())
+        while total > self.max_bytes and entries:
+            key, entry = entries.popitem(last=False)
+            total -= len(entry[0])
+        return total
+
+    def _prune(self):
+        # the least recently written stores of the folder over the size cap
+        stores = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.endswith(_CACHE_SUFFIX) and path != self.path:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stores.append((st.st_mtime, st.st_size, path))
+        total = os.path.getsize(self.path)
+        for mtime, size, path in sorted(stores, reverse=True):
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def _cache_options_key(converter, opts):
+    # the options that change the dxf of an element
+    options = (CACHE_VERSION, opts['precision'], opts['fixed_point'], opts['binary'],
+               opts['quote_layer'], opts['quote_color'], sorted(converter.classes.items(), key=repr),
+               opts['stroke_text'])
+    return repr(options).encode('utf-8')
+
+
+def _convert_cached(mm, converter, dxf, cache, options_key):
+    # converts the mapped board element by element through the cache
+    options_hash = hashlib.sha1(options_key)
+    board_key = options_hash.copy()
+    board_key.update(mm)
+    board_key = board_key.digest()
+    entry = cache.board_dxf(board_key)
+    if entry is not None:
+        _write_cached(dxf, converter, entry)
+        cache.save()
+        return
+    counts = dict(dxf.counts)
+    footprints = converter.footprints
+    keys = []
+    complete = True  # every entity written is in a cache entry
+    parser = SexprEventParser()
+    for start, stop, tokens in iter_mmap_elements(mm, converter.classify):
+        if start is None:
+            written = sum(dxf.counts.values())
+            converter.convert(parser.feed(tokens()))
+            complete = complete and written == sum(dxf.counts.values())
+            continue
+        key = options_hash.copy()
+        key.update(mm[start:stop])
+        key = key.digest()
+        keys.append(key)
+        entry = cache.get(key)
+        if entry is not None:
+            _write_cached(dxf, converter, entry)
+            continue
+        element_counts = dict(dxf.counts)
+        element_footprints = converter.footprints
+        dxf.begin_capture()
+        converter.convert(parser.feed(tokens()))
+        data = dxf.end_capture()
+        if not isinstance(data, bytes):
+            data = data.encode(DXF_ENCODING)
+        cache.put(key, (data, _counts_since(dxf.counts, element_counts), converter.footprints - element_footprints))
+    if complete:
+        cache.board = (board_key, keys, _counts_since(dxf.counts, counts), converter.footprints - footprints)
+    cache.save()
+
+
+def _counts_since(counts, before):
+    return tuple((dxftype, n - before.get(dxftype, 0)) for dxftype, n in counts.items()
+                 if n != before.get(dxftype, 0))
+
+
+def _write_cached(dxf, converter, entry):
+    data, counts, footprints = entry
+    dxf.write(data if isinstance(dxf.EMPTY, bytes) else data.decode(DXF_ENCODING))
+    dxf.counts.update(dict(counts))
+    converter.footprints += footprints
+
+###################################################################
+## instrumentation
+# with the stats option the time of a conversion is split in phases, each
+# function of a phase timed without the nested functions of other phases
+# (the writes done by a flush count as write, not format):
+#   read       board bytes -> s-expression events
+#   classify   events -> layers and drawers, what no other phase covers
+#   transform  placement transforms of the primitive runs
+#   format     entities -> dxf text or binary (writer add_*, flush, close)
+#   write      dxf chunks -> the output (or its compression queue)
+# the writer methods are wrapped on the instance, at about a microsecond a
+# call: the times of a run with stats are a bit longer than without.
+
+PHASES = ('read', 'classify', 'transform', 'format', 'write')
+PROFILE_LINES = 20  # functions of a --profile printed, by internal time
+ENTITY_TYPES = {  # writer method -> dxf type counted by it
+    'add_line': 'LINE', 'add_lines': 'LINE', 'add_circle': 'CIRCLE', 'add_circles': 'CIRCLE',
+    'add_arc': 'ARC', 'add_arcs': 'ARC', 'add_text': 'TEXT', 'add_polyline': 'POLYLINE',
+    'add_point': 'POINT', 'add_insert': 'INSERT', 'add_3dface': '3DFACE', 'add_solid': 'SOLID',
+}
+
+
+def _layer_index(cls, name):
+    # position of the layer argument of cls.name, without self
+    method = getattr(cls, name)
+    code = getattr(method, '__func__', method).__code__
+    return code.co_varnames[:code.co_argcount].index('layer') - 1
+
+
+class PhaseTimer(object):
+    def __init__(self):
+        self.totals = dict((phase, 0.) for phase in PHASES)
+        self._local = threading.local()  # stack of the nested phase times
+
+    def call(self, phase, function, *args, **kwargs):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.)
+        t0 = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.totals[phase] += elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+
+    def wrap(self, phase, function):
+        return partial(self.call, phase, function)
+
+    def iterate(self, phase, items):
+        # items, the time of each next() going to phase
+        items = iter(items)
+        step = partial(next, items, _END)
+        while True:
+            item = self.call(phase, step)
+            if item is _END:
+                return
+            yield item
+
+    def finish(self, elapsed):
+        # classify: the time of the conversion no other phase took
+        self.totals['classify'] = max(0., elapsed - sum(self.totals[phase] for phase in PHASES
+                                                         if phase != 'classify'))
+        return dict(self.totals)
+
+
+_END = object()
+
+
+def instrument_writer(writer, timer, stats):
+    # times the methods of writer (on the instance) and counts its entities
+    # by (dxf layer, dxf type) in stats.layers, its output in stats.bytes_written
+    layers = stats.layers
+    counts = writer.counts
+
+    def counted(name, method):
+        kind = ENTITY_TYPES[name]
+        index = _layer_index(type(writer), name)
+        call = timer.call
+
+        def add(*args, **kwargs):
+            layer = kwargs['layer'] if 'layer' in kwargs else args[index] if len(args) > index else "0"
+            before = counts[kind]
+            result = call('format', method, *args, **kwargs)
+            layers[layer, kind] += counts[kind] - before
+            return result
+        return add
+
+    for name in dir(type(writer)):
+        if name in ENTITY_TYPES:
+            setattr(writer, name, counted(name, getattr(writer, name)))
+    for name in ('flush', 'close'):
+        setattr(writer, name, timer.wrap('format', getattr(writer, name)))
+    output = writer._write
+
+    def write(data):
+        stats.bytes_written += len(data)
+        return timer.call('write', output, data)
+    writer._write = write
+
+
+def peak_memory():
+    # peak resident memory of the process in bytes, None where unknown
+    try:
+        import resource
+    except ImportError:  # windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def format_optimized(stats):
+    optimized = stats.optimized
+    return "optimized: %d entities removed, %d duplicates, %d degenerate, %d merged into collinear lines" % (
+        sum(optimized.values()), optimized['duplicates'], optimized['degenerate'], optimized['merged'])
+
+
+def format_stats(stats):
+    # report of a conversion run with the stats option, as lines
+    mb = float(1 << 20)
+    lines = ["%s -> %s" % (stats.src, stats.dst),
+             "%d entities, %d footprints, %.3fs" % (stats.total, stats.footprints, stats.elapsed)]
+    if stats.phases:
+        lines.append("phases: " + ", ".join("%s %.3fs" % (phase, stats.phases[phase]) for phase in PHASES))
+    layers = {}
+    for (layer, kind), n in stats.layers.items():
+        if n:
+            layers.setdefault(layer, []).append("%s %d" % (kind, n))
+    for layer in sorted(layers, key=lambda layer: (layer is None, str(layer))):
+        name = "(cached)" if layer is None else layer_file_name(layer)
+        lines.append("  layer %-8s %s" % (name, ", ".join(sorted(layers[layer]))))
+    if not layers:
+        lines.append("  " + ", ".join("%s %d" % item for item in sorted(stats.entities.items())))
+    if stats.skipped:
+        lines.append("skipped (layer not exported): " +
+                     ", ".join("%s %d" % item for item in sorted(stats.skipped.items())))
+    if stats.outside or stats.clipped:
+        lines.append("clipped: %d entities outside the regions, %d cut on a border" % (stats.outside, stats.clipped))
+    if stats.optimized:
+        lines.append(format_optimized(stats))
+    if stats.cached:
+        lines.append("%d elements from the cache" % stats.cached)
+    sizes = []
+    if stats.bytes_read is not None:
+        sizes.append("read %.2f MB" % (stats.bytes_read / mb))
+    if stats.bytes_written is not None:
+        sizes.append("written %.2f MB" % (stats.bytes_written / mb))
+    if stats.peak_memory is not None:
+        sizes.append("peak memory %.0f MB" % (stats.peak_memory / mb))
+    if sizes:
+        lines.append(", ".join(sizes))
+    if stats.profile:
+        lines.append("profile: %s" % stats.profile)
+    return lines
+
+###################################################################
+## api
+
+DEFAULT_OPTIONS = {
+    'quote_layer': False,  # True to move all quote on special layer
+    'quote_color': 127,
+    'fixed_tables': False,  # write the HEADER and TABLES preface
+    'chunk_size': READ_CHUNK_SIZE,
+    'mmap': False,  # memory map file names and skip ahead on bytes
+    'write_buffer': WRITE_BUFFER_SIZE,  # characters collected before each write
+    'raw_output': False,  # write dxf file names as bytes to the file descriptor
+    'precision': 6,  # decimals of the coordinates
+    'fixed_point': False,  # round coordinates through integer nanometres (10**-precision)
+    'binary': False,  # binary DXF, coordinates with full double precision
+    'chain_edges': False,  # join the Edge.Cuts segments into polylines
+    'blocks': False,  # footprints as INSERT of one BLOCK per distinct footprint geometry
+    'chain_tolerance': CHAIN_TOLERANCE,
+    'store': False,  # keep the entities in an EntityStore, written layer by layer after the board
+    'optimize': False,  # drop duplicate and degenerate entities, merge collinear lines (with the store)
+    'optimize_tolerance': OPTIMIZE_TOLERANCE,  # mm
+    'tessellate': None,  # chord tolerance in mm: circles and arcs written as polylines; None keeps them
+    'stroke_text': False,  # texts drawn with lines in a stroke font instead of TEXT entities
+    'layer_map': None,  # kicad layer -> (dxf layer, color) dict or map file, None for LAYER_MAP
+    'cache': None,  # folder of the entity cache or an EntityCache, None for no cache
+    'cache_size': CACHE_SIZE,  # bytes kept in the cache folder
+    'split_layers': None,  # file name template of one dxf per layer (SPLIT_TEMPLATE), None for one dxf
+    'compress': None,  # 'gzip', 'xz' or 'zstd'; None: from the dxf file name (.dxf.gz, .dxf.xz, .dxf.zst)
+    'compress_level': None,  # None for the codec default
+    'bbox': None,  # (x0, y0, x1, y1) in board coordinates (pcbnew, y down), or a list of them: clip to them
+    'footprint_refs': None,  # references of footprints whose bounds are regions to clip to
+    'panel': None,  # (columns, rows): the board repeated as a panel, converted once into a block
+    'pitch': None,  # (dx, dy) in board mm from a panel copy to the next one
+    'panel_rails': 0.,  # mm, width of rails above and below the panel, 0 for none
+    'panel_frame': 0.,  # mm, width of a frame around the panel, 0 for none
+    'panel_inserts': False,  # one INSERT per panel copy instead of one array INSERT (MINSERT)
+    'stats': False,  # True to time the phases and count the entities by layer (ConversionStats)
+    'profile': None,  # file name of a cProfile dump of the conversion
+}
+
+
+class ConversionStats(object):
+    # result of convert(): entity counts and timings
+    def __init__(self, src=None, dst=None):
+        self.src = src
+        self.dst = dst
+        self.entities = Counter()  # dxf type -> count
+        self.footprints = 0
+        self.cached = 0  # elements copied from the cache
+        self.elapsed = 0.  # seconds
+        self.skipped = Counter()  # head -> elements on layers not exported
+        self.outside = 0  # entities outside the clip regions, not written
+        self.clipped = 0  # entities cut on a clip region border
+        self.optimized = Counter()  # 'duplicates', 'degenerate', 'merged' -> entities removed by the optimizer
+        self.bytes_read = None  # size of the board file
+        self.bytes_written = None  # size of the dxf file(s), or the output counted with stats
+        self.peak_memory = None  # peak resident memory of the process, bytes
+        # with the stats option
+        self.phases = {}  # phase (PHASES) -> seconds
+        self.layers = Counter()  # (dxf layer, dxf type) -> entities, layer None for cached ones
+        self.profile = None  # cProfile dump, with the profile option
+
+    @property
+    def total(self):
+        return sum(self.entities.values())
+
+    def __repr__(self):
+        return "ConversionStats(%s -> %s, %d entities, %d footprints, %.3fs)" % (
+            self.src, self.dst, self.total, self.footprints, self.elapsed)
+
+
+def _options(options):
+    opts = dict(DEFAULT_OPTIONS)
+    if options:
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError("unknown options: %s" % ", ".join(sorted(unknown)))
+        opts.update(options)
+    return opts
+
+
+def _is_path(src):
+    return isinstance(src, (str, bytes)) or hasattr(src, '__fspath__')
+
+
+def dxf_filename(src, compress=None):
+    # board.kicad_pcb -> board.dxf (board.dxf.gz...), in the folder of the board
+    path = os.path.abspath(os.path.expanduser(src))
+    return os.path.splitext(path)[0] + ".dxf" + (COMPRESSIONS[compress] if compress else "")
+
+
+def convert(src, dst=None, layers=None, options=None):
+    # converts the kicad board src to the dxf dst; src and dst are file
+    # names or file objects, dst defaults to the board name with .dxf
+    # (.dxf.gz... with the compress option).
+    # src is streamed: it may also be a pipe, text or binary (utf-8), or an
+    # iterable of str/bytes chunks; entities reach dst as soon as they are
+    # complete
+    opts = _options(options)
+    if dst is None:
+        if not _is_path(src):
+            raise ValueError("dst is required when src is not a file name.")
+        dst = dxf_filename(src, opts['compress'])
+    stats = ConversionStats(getattr(src, 'name', src), getattr(dst, 'name', dst))
+    timer = PhaseTimer() if opts['stats'] else None
+    profiler = None
+    if opts['profile']:
+        import cProfile
+        profiler = cProfile.Profile()
+    t0 = time.time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        if _is_path(src):
+            with io.open(os.path.expanduser(src), "rb") as txtFile:
+                _convert_stream(txtFile, dst, layers, opts, stats, timer)
+        else:
+            _convert_stream(src, dst, layers, opts, stats, timer)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    stats.elapsed = time.time() - t0
+    if profiler is not None:
+        profiler.dump_stats(opts['profile'])
+        stats.profile = opts['profile']
+    if timer is not None:
+        stats.phases = timer.finish(stats.elapsed)
+    if _is_path(src):
+        stats.bytes_read = os.path.getsize(os.path.expanduser(src))
+    files = stats.dst if isinstance(stats.dst, list) else [dst] if _is_path(dst) else []
+    if files and all(os.path.isfile(f) for f in files):
+        stats.bytes_written = sum(os.path.getsize(f) for f in files)
+    stats.peak_memory = peak_memory()
+    return stats
+
+
+def _map_file(txtFile):
+    # read only memory map of the board file, None when it can't be mapped
+    if not hasattr(txtFile, 'fileno'):
+        return None
+    try:
+        return mmap.mmap(txtFile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError, io.UnsupportedOperation):  # empty file, pipe
+        return None
+
+
+def _board_events(txtFile, opts, layer_filter):
+    mm = _map_file(txtFile) if opts['mmap'] else None
+    if mm is None:
+        for event in iter_events(txtFile, opts['chunk_size']):
+            yield event
+        return
+    try:
+        for event in iter_mmap_events(mm, layer_filter):
+            yield event
+    finally:
+        mm.close()
+
+
+def _clip_regions(txtFile, opts, layers, layer_map):
+    # dxf regions of the bbox and footprint_refs options
+    bbox = opts['bbox']
+    if bbox is not None and len(bbox) == 4 and not isinstance(bbox[0], (list, tuple)):
+        bbox = [bbox]
+    regions = [board_region(*box) for box in bbox or ()]
+    if opts['footprint_refs']:
+        mm = _map_file(txtFile)
+        if mm is None:
+            raise ValueError("footprint_refs needs a board file.")
+        try:
+            regions += footprint_regions(mm, opts['footprint_refs'], layers, layer_map).values()
+        finally:
+            mm.close()
+    return regions
+
+
+def _convert_stream(txtFile, dst, layers, opts, stats, timer=None):
+    number_format = NumberFormat(opts['precision'], opts['fixed_point'])
+    layer_map = opts['layer_map']
+    if _is_path(layer_map):
+        layer_map = load_layer_map(layer_map)
+    regions = _clip_regions(txtFile, opts, layers, layer_map)
+    if regions and opts['blocks']:
+        raise ValueError("blocks are not clipped to regions.")
+    panel = opts['panel']
+    if panel is not None:
+        if opts['pitch'] is None:
+            raise ValueError("a panel needs the pitch of its copies.")
+        if min(panel) < 1:
+            raise ValueError("a panel has at least one column and one row.")
+        if regions or opts['split_layers']:
+            raise ValueError("panels are not clipped to regions nor written with one dxf per layer.")
+    if opts['split_layers']:
+        if opts['blocks']:
+            raise ValueError("blocks are not written with one dxf per layer.")
+        output = split_writer(dst, opts['split_layers'], opts['fixed_tables'], opts['write_buffer'],
+                              number_format, opts['binary'], opts['compress'], opts['compress_level'])
+    else:
+        output = r12writer(dst, opts['fixed_tables'], opts['write_buffer'], opts['raw_output'], number_format,
+                           opts['binary'], opts['blocks'] or panel is not None, opts['compress'],
+                           opts['compress_level'])
+    with output as dxf:
+        converter = PcbDxfConverter(dxf, opts['quote_layer'], opts['quote_color'], layers, layer_map,
+                                    opts['blocks'])
+        if timer is not None:
+            stats.bytes_written = 0
+            if isinstance(dxf, LayerSplitter):
+                dxf.opened = partial(instrument_writer, timer=timer, stats=stats)
+            else:
+                instrument_writer(dxf, timer, stats)
+            converter.timer = timer
+        if opts['stroke_text']:
+            converter.font = StrokeFont()
+        if opts['tessellate'] is not None:  # next to the writer: clipped arcs and chained bulges too
+            converter.dxf = converter.writer = ArcTessellator(dxf, opts['tessellate'])
+        clipper = outline = None
+        if regions:
+            clipper = converter.dxf = RegionClipper(converter.dxf, regions)
+        if panel is not None:
+            converter._block_names.add(PANEL_BLOCK)
+            dxf.begin_block(PANEL_BLOCK)
+            outline_layer = classify_layer(PANEL_OUTLINE, layer_map) or ('Edge', None)
+            if opts['panel_rails'] or opts['panel_frame']:
+                outline = converter.dxf = PanelOutline(converter.dxf, outline_layer[0])
+        edge = converter.classify('Edge.Cuts')
+        if opts['chain_edges'] and edge is not None:
+            converter.dxf = ContourChainer(converter.dxf, [edge[0]], opts['chain_tolerance'])
+        optimizer = None
+        if opts['store'] or opts['optimize']:  # before chaining: the passes see the loose segments
+            converter.dxf = EntityStore(converter.dxf)
+            if opts['optimize']:
+                optimizer = GeometryOptimizer(opts['optimize_tolerance'])
+                converter.dxf.passes.append(optimizer)
+        mm = None
+        # the cache keeps what each element writes to dxf: not with blocks
+        # or chained edges, written after the elements
+        if opts['cache'] and not opts['blocks'] and not opts['split_layers'] and converter.dxf is dxf and \
+                hasattr(txtFile, 'name'):
+            mm = _map_file(txtFile)
+        if mm is not None:
+            try:
+                cache = opts['cache']
+                if not isinstance(cache, EntityCache):
+                    cache = EntityCache(cache, txtFile.name, opts['cache_size'])
+                hits = cache.hits
+                _convert_cached(mm, converter, dxf, cache, _cache_options_key(converter, opts))
+                stats.cached = cache.hits - hits
+            finally:
+                mm.close()
+        else:
+            events = _board_events(txtFile, opts, converter.classify)
+            converter.convert(events if timer is None else timer.iterate('read', events))
+        if converter.dxf is not dxf:
+            converter.dxf.finish()
+        if clipper is not None:
+            stats.outside = clipper.outside
+            stats.clipped = clipper.clipped
+        if optimizer is not None:
+            stats.optimized.update(duplicates=optimizer.duplicates, degenerate=optimizer.degenerate,
+                                   merged=optimizer.merged)
+        if panel is not None:
+            dxf.end_block()
+            write_panel(dxf, PANEL_BLOCK, panel[0], panel[1], opts['pitch'], opts['panel_inserts'])
+            if outline is not None and outline.rect is not None:
+                write_rectangles(dxf, panel_frames(outline.rect, panel[0], panel[1], opts['pitch'],
+                                                   opts['panel_rails'], opts['panel_frame']), *outline_layer)
+    stats.entities.update(dxf.counts)
+    stats.footprints = converter.footprints
+    stats.skipped = converter.skipped
+    if timer is not None:  # what was not counted by layer came from the cache
+        for kind, n in stats.entities.items():
+            n -= sum(count for (layer, counted), count in stats.layers.items() if counted == kind)
+            if n:
+                stats.layers[None, kind] += n
+    if opts['split_layers']:
+        stats.dst = list(dxf.files.values())
+
+###################################################################
+## batch conversion
+
+
+def collect_boards(patterns, recursive=False):
+    # file names, globs and folders -> sorted list of .kicad_pcb files
+    boards = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if os.path.isdir(pattern):
+            if recursive:
+                for root, dirs, files in os.walk(pattern):
+                    boards.extend(os.path.join(root, f) for f in files if f.endswith('.kicad_pcb'))
+            else:
+                boards.extend(os.path.join(pattern, f) for f in os.listdir(pattern) if f.endswith('.kicad_pcb'))
+        elif glob.has_magic(pattern):
+            boards.extend(glob.glob(pattern, recursive=recursive))
+        else:
+            boards.append(pattern)
+    seen = set()
+    unique = []
+    for board in sorted(boards):
+        key = os.path.abspath(board)
+        if key not in seen:
+            seen.add(key)
+            unique.append(board)
+    return unique
+
+
+class BatchResult(object):
+    def __init__(self, board, stats=None, error=None):
+        self.board = board
+        self.stats = stats  # ConversionStats, None on error
+        self.error = error  # error message, None on success
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _batch_worker(board, layers, options):
+    # runs in a pool process: every board streams into its own r12writer and
+    # an exception only fails its own board
+    try:
+        return BatchResult(board, convert(board, None, layers, options))
+    except Exception as e:
+        return BatchResult(board, error="%s: %s" % (type(e).__name__, e))
+
+
+def convert_batch(boards, jobs=None, layers=None, options=None):
+    # converts every board next to its source, spread over a process pool of
+    # `jobs` workers (default: one per cpu); results are in board order
+    _options(options)  # fail early on bad options, not once per board
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(boards)))
+    if jobs == 1:
+        return [_batch_worker(board, layers, options) for board in boards]
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = dict((pool.submit(_batch_worker, board, layers, options), board) for board in boards)
+        for future in as_completed(futures):
+            board = futures[future]
+            try:
+                results[board] = future.result()
+            except Exception as e:  # the worker process died
+                results[board] = BatchResult(board, error="%s: %s" % (type(e).__name__, e))
+    return [results[board] for board in boards]
+
+
+def format_summary(results, elapsed=None):
+    # summary table of a batch, one line per board
+    width = max([len(r.board) for r in results] + [5])
+    lines = ["%-*s %10s %9s  %s" % (width, "board", "entities", "time", "status")]
+    for r in results:
+        if r.ok:
+            lines.append("%-*s %10d %8.3fs  ok" % (width, r.board, r.stats.total, r.stats.elapsed))
+        else:
+            lines.append("%-*s %10s %9s  %s" % (width, r.board, "-", "-", r.error))
+    failed = len([r for r in results if not r.ok])
+    total = "%d boards, %d failed" % (len(results), failed)
+    if elapsed is not None:
+        total += ", %.3fs" % elapsed
+    lines.append(total)
+    return lines
+
+###################################################################
+## watch mode
+# the board is exported again after every save. pcbnew writes the file in a
+# burst (often a new file renamed over the old one), so the folder is
+# watched, with inotify on linux or by polling the file stat elsewhere, and
+# the export starts once the board has been quiet for WATCH_DEBOUNCE
+# seconds. The dxf goes to a temporary file renamed over the old one: a
+# viewer reloading it never reads half a drawing. Elements that did not
+# change come from an entity cache kept between the exports.
+
+WATCH_DEBOUNCE = 0.25  # seconds without writes that end a save
+WATCH_POLL = 0.5  # seconds between two stat() of the board without inotify
+
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len of the name
+
+
+def export_atomic(src, dst, layers=None, options=None):
+    # convert() to a temporary file in the folder of dst, renamed over dst
+    folder, name = os.path.split(os.path.abspath(dst))
+    fd, tmp = tempfile.mkstemp('.dxf' + COMPRESSIONS.get(compression_of(name), ''), '.' + name + '.', folder)
+    os.close(fd)
+    try:
+        stats = convert(src, tmp, layers, options)
+        try:
+            mode = os.stat(dst).st_mode & 0o7777
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp, mode)
+        if hasattr(os, 'replace'):
+            os.replace(tmp, dst)
+        else:
+            os.rename(tmp, dst)
+    except BaseException:
+        _remove_files([tmp])  # convert() may have removed it already
+        raise
+    stats.dst = dst
+    return stats
+
+
+def _inotify_wait(folder, name):
+    # wait(timeout) -> time of a write to folder/name, None after timeout
+    # seconds (None: forever); None if inotify is not available
+    try:
+        import ctypes, ctypes.util, select
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK)
+        if fd < 0:
+            return None
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(fd, folder.encode(sys.getfilesystemencoding()), mask) < 0:
+            os.close(fd)
+            return None
+    except (ImportError, OSError, AttributeError):  # not linux
+        return None
+    target = name.encode(sys.getfilesystemencoding())
+
+    def wait(timeout=None):
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            left = None if end is None else max(0., end - time.time())
+            if not select.select([fd], [], [], left)[0]:
+                return None
+            try:
+                data = os.read(fd, 1 << 16)
+            except OSError:  # EAGAIN
+                continue
+            pos = 0
+            while pos < len(data):
+                wd, event, cookie, size = _IN_EVENT.unpack_from(data, pos)
+                pos += _IN_EVENT.size
+                if data[pos:pos + size].rstrip(b'\0') == target:
+                    return time.time()
+                pos += size
+    return wait
+
+
+def _poll_wait(path, interval=WATCH_POLL):
+    # wait(timeout) as _inotify_wait, from the stat() of path
+    def signature():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size, st.st_ino
+
+    state = [signature()]
+
+    def wait(timeout=None):
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            current = signature()
+            if current != state[0]:
+                state[0] = current
+                return time.time()
+            if end is not None and time.time() >= end:
+                return None
+            time.sleep(interval if end is None else max(0., min(interval, end - time.time())))
+    return wait
+
+
+def iter_board_changes(board, debounce=WATCH_DEBOUNCE, poll=WATCH_POLL):
+    # time of the last write of every burst of writes to board, forever
+    path = os.path.abspath(os.path.expanduser(board))
+    folder, name = os.path.split(path)
+    wait = _inotify_wait(folder, name) if poll is None or poll > 0 else None
+    if wait is None:
+        wait = _poll_wait(path, poll or WATCH_POLL)
+    while True:
+        last = wait(None)
+        while True:
+            changed = wait(debounce)
+            if changed is None:
+                break
+            last = changed
+        yield last
+
+
+def watch(board, dst=None, layers=None, options=None, log=None, debounce=WATCH_DEBOUNCE, poll=WATCH_POLL):
+    # exports board now and after every save until interrupted; poll=0
+    # forces polling instead of inotify
+    log = log or say
+    opts = _options(options)
+    if not isinstance(opts['cache'], EntityCache):
+        opts['cache'] = EntityCache(opts['cache'], board, opts['cache_size'])
+    dst = dst or dxf_filename(board, opts['compress'])
+    try:
+        stats = export_atomic(board, dst, layers, opts)
+        log("--> %s written, %d entities, %.3fs" % (dst, stats.total, stats.elapsed))
+    except Exception as e:  # a half saved board: the next save exports it
+        log("%s: %s: %s" % (board, type(e).__name__, e))
+    log("watching %s (ctrl+c to stop)" % board)
+    for saved in iter_board_changes(board, debounce, poll):
+        try:
+            stats = export_atomic(board, dst, layers, opts)
+        except Exception as e:  # only ctrl+c stops watching
+            log("%s: %s: %s" % (board, type(e).__name__, e))
+            continue
+        log("--> %s written %.3fs after save (export %.3fs, %d entities, %d items from cache)" % (
+            dst, time.time() - saved, stats.elapsed, stats.total, stats.cached))
+
+###################################################################
+## command line
+
+
+def say(msg):
+    #FreeCAD.Console.PrintMessage(msg)
+    #FreeCAD.Console.PrintMessage('\n')
+    print(msg)
+
+
+def _numbers_arg(text, form, separator=',', number=float):
+    # 'x0,y0,...' -> tuple of as many numbers as form has fields
+    try:
+        numbers = tuple(number(v) for v in text.split(separator))
+    except ValueError:
+        numbers = ()
+    if len(numbers) != len(form.split(separator)):
+        raise argparse.ArgumentTypeError("expected %s: %s" % (form, text))
+    return numbers
+
+
+def _bbox_arg(text):
+    return _numbers_arg(text, 'x0,y0,x1,y1')
+
+
+def _pitch_arg(text):
+    return _numbers_arg(text, 'dx,dy')
+
+
+def _panel_arg(text):
+    return _numbers_arg(text.lower(), 'NxM', 'x', int)
+
+
+def _say_stderr(msg):  # when the dxf goes to stdout
+    sys.stderr.write(msg + "\n")
+
+
+def report(stats, args, log=say, profile_lines=PROFILE_LINES):
+    # --stats and --profile output of a conversion
+    if args['stats']:
+        for line in format_stats(stats):
+            log(line)
+    elif stats.optimized:
+        log(format_optimized(stats))
+    if stats.profile:
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(stats.profile, stream=out).sort_stats('tottime').print_stats(profile_lines)
+        for line in out.getvalue().rstrip().splitlines():
+            log(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='kicadpcb2dxf converter')
+    parser.add_argument('-f','--file', nargs='+', help='.kicad_pcb file names, globs or folders, - for stdin', required=False)
+    parser.add_argument('-o','--output', help='.dxf file name of a single board, - for stdout')
+    parser.add_argument('-r','--recursive', action='store_true', help='search folders and ** globs recursively')
+    parser.add_argument('-j','--jobs', type=int, default=None, help='parallel conversions (default: one per cpu)')
+    parser.add_argument('--mmap', action='store_true', help='memory map the boards and skip zones, tracks and vias on bytes')
+    parser.add_argument('--precision', type=int, default=6, help='decimals of the coordinates (default: 6)')
+    parser.add_argument('--fixed-point', action='store_true', help='round coordinates through integer units of 10**-precision')
+    parser.add_argument('--binary', action='store_true', help='write a binary DXF')
+    parser.add_argument('--chain-edges', action='store_true', help='join the board outline into closed polylines')
+    parser.add_argument('--blocks', action='store_true', help='write each distinct footprint once, as a block')
+    parser.add_argument('--store', action='store_true', help='keep the entities in compact columns, written layer by layer after the board')
+    parser.add_argument('--optimize', action='store_true', help='drop duplicate and zero length entities, merge collinear lines')
+    parser.add_argument('--optimize-tolerance', type=float, default=OPTIMIZE_TOLERANCE, metavar='MM',
+                        help='distance under which points are the same (default: %g)' % OPTIMIZE_TOLERANCE)
+    parser.add_argument('--tessellate', nargs='?', type=float, const=TESSELLATE_TOLERANCE, metavar='MM',
+                        help='write circles and arcs as polylines, MM the chord error (default: %g)' % TESSELLATE_TOLERANCE)
+    parser.add_argument('--stroke-text', action='store_true', help='draw the texts with lines (stroke font) instead of TEXT entities')
+    parser.add_argument('--layer-map', help='layer map file: kicad_layer dxf_layer [color] per line')
+    parser.add_argument('--split-layers', nargs='?', const=SPLIT_TEMPLATE, metavar='TEMPLATE',
+                        help='one dxf per layer, named by TEMPLATE (default: %s)' % SPLIT_TEMPLATE.replace('%', '%%'))
+    parser.add_argument('--compress', choices=sorted(COMPRESSIONS), help='compress the dxf as it is written (default: from the .dxf.gz/.xz/.zst name)')
+    parser.add_argument('--compress-level', type=int, help='compression level (default: the codec default)')
+    parser.add_argument('--bbox', action='append', type=_bbox_arg, metavar='X0,Y0,X1,Y1',
+                        help='only what is inside this board region (mm, as in pcbnew); repeatable')
+    parser.add_argument('--footprint-ref', nargs='+', metavar='REF', help='only what is inside these footprints (by reference)')
+    parser.add_argument('--panel', type=_panel_arg, metavar='NxM', help='the board repeated N times along x, M times along y, as one block')
+    parser.add_argument('--pitch', type=_pitch_arg, metavar='DX,DY', help='mm from a panel copy to the next one')
+    parser.add_argument('--rails', type=float, default=0., metavar='WIDTH', help='rails of WIDTH mm above and below the panel')
+    parser.add_argument('--frame', type=float, default=0., metavar='WIDTH', help='frame of WIDTH mm around the panel')
+    parser.add_argument('--panel-inserts', action='store_true', help='one INSERT per panel copy instead of one array INSERT')
+    parser.add_argument('--stats', action='store_true', help='print phase timings, entities by layer, sizes and peak memory')
+    parser.add_argument('--profile', metavar='FILE', help='dump a cProfile of the conversion to FILE (python -m pstats FILE)')
+    parser.add_argument('--watch', action='store_true', help='export the board again after every save, until ctrl+c')
+    parser.add_argument('--cache', metavar='FOLDER', help='reuse the dxf of unchanged footprints from a cache folder')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE >> 20, help='size cap of the cache folder in MB (default: %d)' % (CACHE_SIZE >> 20))
+    #parser.add_argument('-c','--color', help='--color blue', required=False)
+    args = vars(parser.parse_args(argv))
+    options = {'mmap': args['mmap'], 'precision': args['precision'], 'fixed_point': args['fixed_point'],
+               'binary': args['binary'], 'chain_edges': args['chain_edges'], 'blocks': args['blocks'],
+               'store': args['store'], 'optimize': args['optimize'], 'optimize_tolerance': args['optimize_tolerance'],
+               'tessellate': args['tessellate'], 'stroke_text': args['stroke_text'],
+               'cache': args['cache'], 'cache_size': args['cache_size'] << 20,
+               'split_layers': args['split_layers'], 'compress': args['compress'],
+               'compress_level': args['compress_level'], 'stats': args['stats'], 'profile': args['profile'],
+               'bbox': args['bbox'], 'footprint_refs': args['footprint_ref'],
+               'panel': args['panel'], 'pitch': args['pitch'], 'panel_rails': args['rails'],
+               'panel_frame': args['frame'], 'panel_inserts': args['panel_inserts']}
+    if args['compress'] and args['split_layers'] == SPLIT_TEMPLATE:
+        options['split_layers'] += COMPRESSIONS[args['compress']]
+    if args['blocks'] and (args['bbox'] or args['footprint_ref']):
+        say("--bbox and --footprint-ref do not clip --blocks")
+        return 1
+    if args['panel'] and not args['pitch']:
+        say("--panel needs --pitch")
+        return 1
+    if args['tessellate'] is not None and not args['tessellate'] > 0.:
+        say("--tessellate needs a tolerance above 0")
+        return 1
+    if args['panel'] and (args['bbox'] or args['footprint_ref'] or args['split_layers']):
+        say("--panel is not clipped nor split by layer")
+        return 1
+    if args['layer_map']:
+        try:
+            options['layer_map'] = load_layer_map(args['layer_map'])
+        except (IOError, ValueError) as e:
+            say("layer map: %s" % e)
+            return 1
+    if args['file'] == None:
+        say ("...\n   launch:\n          kicadpcb3dxf -f pcbfile_name.kicad_pcb")
+        say("version "+str(___version___))
+        return 0
+    if args['file'] == ['-']:
+        out = args['output'] or '-'
+        if out == '-' and args['split_layers']:
+            say("--split-layers needs a .dxf file name")
+            return 1
+        if out == '-':
+            report(convert(sys.stdin.buffer, sys.stdout, options=options), args, log=_say_stderr)
+        else:
+            stats = convert(sys.stdin.buffer, out, options=options)
+            say("--> "+out+" written")
+            report(stats, args)
+        return 0
+    boards = collect_boards(args['file'], args['recursive'])
+    if not boards:
+        say("no .kicad_pcb file found")
+        return 1
+    if args['watch']:
+        if len(boards) > 1 or args['output'] == '-' or args['split_layers']:
+            say("--watch needs a single board and one .dxf file name")
+            return 1
+        try:
+            watch(boards[0], args['output'], options=options)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if len(boards) > 1:
+        if args['profile']:
+            say("--profile needs a single board")
+            return 1
+        t0 = time.time()
+        results = convert_batch(boards, args['jobs'], options=options)
+        for line in format_summary(results, time.time() - t0):
+            say(line)
+        for r in results:
+            if r.ok:
+                report(r.stats, args)
+        return 0 if all(r.ok for r in results) else 1
+    filename=boards[0]
+    if args['output'] == '-':
+        if args['split_layers']:
+            say("--split-layers needs a .dxf file name")
+            return 1
+        try:
+            stats = convert(filename, sys.stdout, options=options)
+        except Exception as e:  # malformed board: the message, not a traceback
+            _say_stderr("%s: %s: %s" % (filename, type(e).__name__, e))
+            return 1
+        report(stats, args, log=_say_stderr)
+        return 0
+    say(filename)
+    say ("reading from "+ os.path.abspath(os.path.expanduser(filename)))
+    out_filename=args['output'] or dxf_filename(filename, args['compress'])
+    say("writing to "+out_filename)
+    try:
+        stats = convert(filename, out_filename, options=options)
+    except Exception as e:  # the writers removed the partial dxf
+        say("%s: %s: %s" % (filename, type(e).__name__, e))
+        return 1
+    for written in stats.dst if args['split_layers'] else [out_filename]:
+        say("--> "+written+" written")
+    report(stats, args)
+    return 0
+
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# the binary DXF holds the same tags as the ASCII one: a board converted in
+# both modes, the binary stream decoded with iter_binary_tags() and its
+# (group code, value) tags compared with the parsed ASCII output, numbers
+# to the ASCII precision
+
+import io, os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import kicadpcb2dxf
+from benchmark import boards
+
+OPTIONS = ({}, {'blocks': True}, {'chain_edges': True}, {'store': True, 'optimize': True},
+           {'tessellate': 0.05}, {'stroke_text': True}, {'fixed_tables': True})
+
+
+def ascii_tags(text):
+    lines = text.splitlines()
+    return [(int(lines[i]), lines[i + 1]) for i in range(0, len(lines) - 1, 2)]
+
+
+def board(folder, kicad):
+    path = os.path.join(str(folder), 'board_k%d.kicad_pcb' % kicad)
+    boards.generate(path, kicad, 0, footprints=20, fp_primitives=8, gr_primitives=200, texts=10, dimensions=2,
+                    zones=2, zone_points=50, tracks=100)
+    return path
+
+
+@pytest.mark.parametrize('kicad', (5, 6))
+@pytest.mark.parametrize('options', OPTIONS, ids=lambda options: '-'.join(options) or 'plain')
+def test_round_trip(tmp_path, kicad, options):
+    src = board(tmp_path, kicad)
+    text, binary = os.path.join(str(tmp_path), 'text.dxf'), os.path.join(str(tmp_path), 'binary.dxf')
+    kicadpcb2dxf.convert(src, text, options=dict(options))
+    kicadpcb2dxf.convert(src, binary, options=dict(options, binary=True))
+    with io.open(text, encoding=kicadpcb2dxf.DXF_ENCODING) as f:
+        expected = ascii_tags(f.read())
+    with open(binary, 'rb') as f:
+        tags = list(kicadpcb2dxf.iter_binary_tags(f.read()))
+    assert len(tags) == len(expected)
+    for i, ((code, value), (ascii_code, ascii_value)) in enumerate(zip(tags, expected)):
+        assert code == ascii_code, (i, code, ascii_code)
+        if isinstance(value, float):
+            assert value == pytest.approx(float(ascii_value), abs=1e-6), (i, code)
+        elif isinstance(value, int):
+            assert value == int(ascii_value), (i, code)
+        else:
+            assert value == ascii_value, (i, code)
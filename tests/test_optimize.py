@@ -0,0 +1,57 @@
+# the geometry optimizer buckets collinear lines by rounded direction and
+# distance to the origin: two pieces of one straight line rounded to
+# neighbouring buckets are merged all the same, with and without numpy
+
+import math, os, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import kicadpcb2dxf
+
+STEP = 2e-5  # mm, each piece this far on its side of the boundary, under the tolerance
+ANGLE = kicadpcb2dxf.COLLINEAR_ANGLE / 2.  # a direction bucket boundary
+OFFSET = kicadpcb2dxf.COLLINEAR_OFFSET / 2.  # an offset bucket boundary
+DIRECTION = (math.cos(ANGLE), math.sin(ANGLE))
+
+STRADDLING = {
+    'offset': [(0., OFFSET - STEP, 10., OFFSET - STEP), (10., OFFSET + STEP, 20., OFFSET + STEP)],
+    'direction': [(0., 0., 10. * DIRECTION[0], 10. * DIRECTION[1]),
+                  (10. * DIRECTION[0], 10. * DIRECTION[1], 20. * DIRECTION[0], 20. * DIRECTION[1] + STEP)],
+}
+
+
+def optimize(rows, use_numpy):
+    optimizer = kicadpcb2dxf.GeometryOptimizer()
+    if use_numpy:
+        rows = kicadpcb2dxf.numpy.array(rows, dtype=float)
+    lines, codes = optimizer.lines(rows, [0] * len(rows))
+    return lines, optimizer
+
+
+@pytest.mark.parametrize('use_numpy', (True, False), ids=('numpy', 'python'))
+@pytest.mark.parametrize('boundary', sorted(STRADDLING))
+def test_merge_across_buckets(monkeypatch, boundary, use_numpy):
+    if use_numpy and kicadpcb2dxf.numpy is None:
+        pytest.skip('numpy not installed')
+    if not use_numpy:
+        monkeypatch.setattr(kicadpcb2dxf, 'numpy', None)
+    lines, optimizer = optimize(STRADDLING[boundary], use_numpy)
+    assert optimizer.merged == 1
+    (x0, y0, x1, y1), = lines
+    start, end = STRADDLING[boundary][0][:2], STRADDLING[boundary][-1][2:]
+    assert (x0, y0) == pytest.approx(start, abs=1e-9) and (x1, y1) == pytest.approx(end, abs=1e-9)
+
+
+@pytest.mark.parametrize('use_numpy', (True, False), ids=('numpy', 'python'))
+def test_parallel_lines_kept(monkeypatch, use_numpy):
+    if use_numpy and kicadpcb2dxf.numpy is None:
+        pytest.skip('numpy not installed')
+    if not use_numpy:
+        monkeypatch.setattr(kicadpcb2dxf, 'numpy', None)
+    rows = [(0., 0., 10., 0.), (0., OFFSET, 10., OFFSET), (5., 0., 15., 0.)]
+    lines, optimizer = optimize(rows, use_numpy)
+    assert optimizer.merged == 1
+    assert sorted(lines) == [(0., 0., 15., 0.), (0., OFFSET, 10., OFFSET)]
@@ -0,0 +1,75 @@
+# a board fed to convert() as a chunk iterable is never held whole: the
+# peak memory of the conversion stays under a fixed ceiling whatever the
+# board size. Each size converts in a child process of its own, so the
+# peak RSS is the one of that conversion; the 1 GB board (about 80 s) runs
+# with KICADPCB2DXF_SLOW=1
+
+import io, json, os, subprocess, sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import kicadpcb2dxf
+from benchmark import boards
+
+CEILING = 32 << 20  # bytes of peak RSS the conversion may add
+SLOW = bool(os.environ.get('KICADPCB2DXF_SLOW'))
+
+
+class NullSink(io.RawIOBase):  # the dxf, counted and dropped
+    def __init__(self):
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def board_chunks(size, seed=0):
+    # a synthetic kicad 6 board of at least size characters: the items of
+    # one generated board (footprints, graphics, texts, zones, tracks)
+    # repeated, one chunk per repetition
+    board = io.StringIO()
+    boards.generate(board, 6, seed, footprints=10, fp_primitives=12, gr_primitives=100, texts=10, dimensions=2,
+                    zones=2, zone_points=2000, tracks=3000)
+    text = board.getvalue()
+    start = text.index('(net 1 "GND")\n') + len('(net 1 "GND")\n')
+    body = text[start:text.rstrip().rindex(')')]
+    yield text[:start]
+    written = 0
+    while written < size:
+        yield body
+        written += len(body)
+    yield ')\n'
+
+
+def convert_peak(size):
+    # runs in the child: peak RSS before and after converting the board
+    before = kicadpcb2dxf.peak_memory()
+    stats = kicadpcb2dxf.convert(board_chunks(size), NullSink())
+    return {'before': before, 'after': kicadpcb2dxf.peak_memory(), 'entities': stats.total}
+
+
+def child_peak(size):
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), str(size)], cwd=ROOT)
+    return json.loads(out.decode('utf-8'))
+
+
+@pytest.mark.skipif(kicadpcb2dxf.peak_memory() is None, reason="no peak RSS on this platform")
+@pytest.mark.parametrize('size', [
+    64 << 20,
+    pytest.param(1 << 30, marks=pytest.mark.skipif(not SLOW, reason="1 GB board: KICADPCB2DXF_SLOW=1")),
+])
+def test_memory_ceiling(size):
+    result = child_peak(size)
+    assert result['entities'] > size // (1 << 20) * 300  # the board was converted, not skipped
+    assert result['after'] - result['before'] < CEILING
+
+
+if __name__ == '__main__':
+    print(json.dumps(convert_peak(int(sys.argv[1]))))